@@ -4,25 +4,102 @@ Rabbi Moshe Benovitz Content Generator API
 FastAPI REST API for generating content in Rabbi Moshe Benovitz's voice.
 """
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.requests import ClientDisconnect
+from typing import List, Literal, Optional
+import asyncio
+import json
 import os
+import signal
+import threading
 
 from benovitz_content_generator import (
     ContentFormat,
-    BenovitzVoiceProfile,
-    generate_content_with_claude,
+    CompiledPrompts,
+    GenerationResult,
+    MAX_COMPILED_PROFILES,
+    aclose_clients,
+    estimate_generation,
+    generate_batch_async,
+    get_compiled_prompts,
     generate_content_prompt_only,
-    get_system_prompt,
-    get_format_instructions
+    generate_variants_async,
+    json_escape,
+    stream_content_with_claude_async,
+    warm_clients,
 )
+from generation_archive import close_archive, export_lines, get_archive
+from generation_cache import get_generation_cache
+from length_guard import get_length_policy, get_length_stats
+from batch_jobs import get_job_manager
+from metrics import CLIENT_DISCONNECTS, MetricsMiddleware, render_metrics, server_timing
+from model_routing import get_routes, resolve_route
+from rate_limiter import UpstreamOverloaded, get_scheduler
+from similarity_index import get_similarity_index
+
+
+# Pooled upstream connections to open at startup
+WARM_CONNECTIONS = int(os.environ.get("BENOVITZ_WARM_CONNECTIONS", "2"))
+
+# Seconds to keep serving after SIGTERM while /ready reports draining, so load
+# balancers stop routing here before the listener closes
+DRAIN_DELAY = float(os.environ.get("BENOVITZ_DRAIN_DELAY", "0"))
+
+# Readiness, reported by /ready: warmed up and not shutting down
+server_state = {"ready": False, "draining": False}
+
+
+def install_drain_handlers() -> None:
+    """
+    Wrap the server's SIGTERM/SIGINT handlers so readiness flips to draining the
+    moment a shutdown signal arrives; SIGTERM is passed on after DRAIN_DELAY.
+    """
+
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            server_state["draining"] = True
+            if signum == signal.SIGTERM and DRAIN_DELAY > 0:
+                loop.call_soon_threadsafe(loop.call_later, DRAIN_DELAY, previous, signum, frame)
+            else:
+                previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pre-warm prompts, upstream connections and the archive; release them and commit the archive on shutdown."""
+    get_compiled_prompts()
+    get_routes()
+    await asyncio.to_thread(get_archive)
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if api_key:
+        await warm_clients(api_key, WARM_CONNECTIONS)
+    install_drain_handlers()
+    server_state["ready"] = True
+    yield
+    server_state["ready"] = False
+    await aclose_clients()
+    await asyncio.to_thread(close_archive)
+
 
 app = FastAPI(
     title="Rabbi Moshe Benovitz Content Generator API",
     description="Generate content in the distinctive voice of Rabbi Moshe Benovitz, NCSY International Managing Director",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -32,7 +109,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(UpstreamOverloaded)
+async def upstream_overloaded(request: Request, exc: UpstreamOverloaded):
+    """Shed load with 503 and a Retry-After hint instead of queueing without bound."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Error: {exc}"},
+        headers={"Retry-After": str(int(exc.retry_after))}
+    )
+
+# Status recorded for requests the client abandoned; nobody receives it
+CLIENT_CLOSED_REQUEST = 499
+
+
+@app.exception_handler(ClientDisconnect)
+async def client_disconnected(request: Request, exc: ClientDisconnect):
+    """The client has gone; log the request as 499 rather than as a server error."""
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Return once the client closes the connection; the request body must already be read."""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def cancel_on_disconnect(request: Request, awaitable):
+    """
+    Await `awaitable`, cancelling it and the upstream calls it waits on if the
+    client disconnects first, in which case ClientDisconnect is raised.
+    """
+
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait((work, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        work.cancel()
+    if work not in done:
+        CLIENT_DISCONNECTS.inc(route=request.scope["route"].path)
+        raise ClientDisconnect()
+    return work.result()
+
+
+# Upper bound on concurrent upstream generations per worker process
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("BENOVITZ_MAX_CONCURRENT_GENERATIONS", "32"))
+generation_slots = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+
+# Limits for POST /generate/batch
+MAX_BATCH_ITEMS = int(os.environ.get("BENOVITZ_MAX_BATCH_ITEMS", "1000"))
+MAX_BATCH_CONCURRENCY = int(os.environ.get("BENOVITZ_MAX_BATCH_CONCURRENCY", "16"))
+
+# Upper bound on GenerateRequest.variants
+MAX_VARIANTS = int(os.environ.get("BENOVITZ_MAX_VARIANTS", "5"))
 
 
 class GenerateRequest(BaseModel):
@@ -40,12 +175,107 @@ class GenerateRequest(BaseModel):
     format: str = "article"
     additional_context: Optional[str] = ""
     prompt_only: bool = False
+    # With BENOVITZ_CACHE_BACKEND set, "use" may answer with a generation up to BENOVITZ_CACHE_TTL old
+    cache: Literal["use", "bypass", "refresh"] = "use"
+    # Answer with a cached generation for a paraphrase of this request, if one is close enough
+    reuse_similar: bool = False
+    variants: int = Field(default=1, ge=1)
+    # Per-request overrides of the format's model route
+    model: Optional[str] = None
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+    temperature: Optional[float] = Field(default=None, ge=0, le=1)
+    timeout: Optional[float] = Field(default=None, gt=0)
+
+
+class EstimateRequest(BaseModel):
+    # May be empty while the topic is still being typed
+    topic: str = ""
+    format: str = "article"
+    additional_context: Optional[str] = ""
+    model: Optional[str] = None
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+
+
+class BatchItem(GenerateRequest):
+    id: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: int = 8
+
+
+class JobItem(BaseModel):
+    # The Message Batches API runs each item once, uncached and without a
+    # client timeout, so other generation options are rejected (422), not dropped
+    model_config = ConfigDict(extra="forbid")
+
+    topic: str
+    format: str = "article"
+    additional_context: Optional[str] = ""
+    model: Optional[str] = None
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+    temperature: Optional[float] = Field(default=None, ge=0, le=1)
+    id: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    items: List[JobItem]
+
+
+class Usage(BaseModel):
+    input_tokens: int
+    output_tokens: int
+    cache_creation_input_tokens: int
+    cache_read_input_tokens: int
+
+
+class Variant(BaseModel):
+    content: str
+    usage: Usage
+    cached: bool
+    latency_ms: float
+
+
+class Route(BaseModel):
+    model: str
+    max_tokens: int
+    temperature: Optional[float] = None
+    timeout: float
+    fallback_model: Optional[str] = None
+
+
+class SimilarGeneration(BaseModel):
+    topic: str
+    format: str
+    additional_context: str
+    score: float
+    created_at: float
+
+
+class LengthReport(BaseModel):
+    words: int
+    min_words: Optional[int] = None
+    max_words: Optional[int] = None
+    overrun_words: int
+    # "over_length" or "complete" when the guard stopped the generation early
+    stopped: Optional[str] = None
+    missing_sections: List[str]
+    hashtags: Optional[int] = None
 
 
 class GenerateResponse(BaseModel):
     content: str
     format: str
     topic: str
+    usage: Optional[Usage] = None
+    cached: bool = False
+    coalesced: bool = False
+    route: Optional[Route] = None
+    variants: Optional[List[Variant]] = None
+    similar: Optional[List[SimilarGeneration]] = None
+    reused_from: Optional[SimilarGeneration] = None
+    length: Optional[LengthReport] = None
 
 
 class FormatInfo(BaseModel):
@@ -63,10 +293,25 @@ async def root():
         "description": "Generate content in the voice of Rabbi Moshe Benovitz",
         "endpoints": {
             "/generate": "POST - Generate content",
+            "/generate/stream": "POST - Generate content as Server-Sent Events",
+            "/generate/batch": "POST - Generate many items concurrently, streamed back as NDJSON",
+            "/estimate": "POST - Estimated input and output tokens, cost and latency, without generating",
+            "/jobs": "POST - Submit an offline Message Batches job",
+            "/jobs/{job_id}": "GET - Job status and progress",
+            "/jobs/{job_id}/results": "GET - Completed job results as JSONL",
             "/formats": "GET - List available formats",
+            "/routes": "GET - Model route (model, max_tokens, temperature, timeout) per format",
             "/voice-profile": "GET - Get voice profile details",
             "/system-prompt": "GET - Get the full system prompt",
-            "/health": "GET - Health check"
+            "/cache/stats": "GET - Response cache statistics",
+            "/length/stats": "GET - Output length against each format's target, early stops and missing sections",
+            "/similar": "GET - Prior generations resembling a topic",
+            "/archive/search": "GET - Full-text search of past generations, ranked, with snippets",
+            "/archive/export": "GET - Export past generations as NDJSON",
+            "/archive/stats": "GET - Archive size and write backlog",
+            "/metrics": "GET - Prometheus metrics",
+            "/health": "GET - Health check",
+            "/ready": "GET - Readiness probe (503 while starting or draining)"
         }
     }
 
@@ -77,6 +322,16 @@ async def health_check():
     return {"status": "healthy", "service": "benovitz-content-api"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until startup warm-up finishes and again once draining for shutdown."""
+    if server_state["draining"]:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    if not server_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+
 @app.get("/formats")
 async def list_formats():
     """List all available content formats."""
@@ -110,33 +365,95 @@ async def list_formats():
     return {"formats": formats}
 
 
-@app.get("/voice-profile")
-async def get_voice_profile():
-    """Get the full voice profile for Rabbi Moshe Benovitz."""
-    voice = BenovitzVoiceProfile()
+@app.get("/routes")
+async def list_routes():
+    """Model routing table: the model, output cap, temperature and timeout per format."""
+    routes = get_routes()
     return {
-        "name": voice.name,
-        "tone": voice.tone.strip(),
-        "style_patterns": voice.style_patterns.strip(),
-        "themes": voice.themes.strip(),
-        "influences": voice.influences.strip(),
-        "hebrew_vocabulary": voice.hebrew_vocabulary.strip(),
-        "transitions": voice.transitions.strip()
+        "routes": {
+            f.value: routes.get(f.value, routes["default"]).to_dict()
+            for f in ContentFormat
+        }
     }
 
 
+# Encoded JSON bodies for the voice-profile endpoints, keyed by (endpoint, prompt hash)
+_precomputed_bodies = {}
+
+
+def precomputed_json(request: Request, name: str, compiled: CompiledPrompts, payload: dict) -> Response:
+    """Serve a JSON body that only changes with the compiled prompts, honouring If-None-Match."""
+
+    headers = {"ETag": compiled.etag, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == compiled.etag:
+        return Response(status_code=304, headers=headers)
+
+    key = (name, compiled.prompt_hash)
+    body = _precomputed_bodies.get(key)
+    if body is None:
+        body = json.dumps(payload).encode("utf-8")
+        if len(_precomputed_bodies) >= 2 * MAX_COMPILED_PROFILES:
+            _precomputed_bodies.clear()
+        _precomputed_bodies[key] = body
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Pre-encoded GenerateResponse envelopes for prompt_only, keyed by (prompt hash, format)
+_prompt_only_envelopes = {}
+
+
+def prompt_only_response(format_type: ContentFormat, topic: str, additional_context: str) -> Response:
+    """
+    Serialize a prompt_only GenerateResponse straight from the format's
+    pre-escaped prompt fragments, skipping response-model validation and
+    re-encoding of the static prompt text.
+    """
+
+    compiled = get_compiled_prompts()
+    template = compiled.prompt_templates[format_type]
+    key = (compiled.prompt_hash, format_type)
+    envelope = _prompt_only_envelopes.get(key)
+    if envelope is None:
+        envelope = (
+            b'{"content":"',
+            b'","format":"' + json_escape(format_type.value) + b'","topic":"',
+            b'","usage":null,"cached":false,"coalesced":false,"route":null,"variants":null,'
+            b'"similar":null,"reused_from":null,"length":null}'
+        )
+        if len(_prompt_only_envelopes) >= MAX_COMPILED_PROFILES * len(ContentFormat):
+            _prompt_only_envelopes.clear()
+        _prompt_only_envelopes[key] = envelope
+
+    start, middle, end = envelope
+    body = b"".join((
+        start, *template.json_fragments(topic, additional_context), middle, json_escape(topic), end
+    ))
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/voice-profile")
+async def get_voice_profile(request: Request):
+    """Get the full voice profile for Rabbi Moshe Benovitz."""
+    compiled = get_compiled_prompts()
+    return precomputed_json(request, "voice-profile", compiled, compiled.voice_profile)
+
+
 @app.get("/system-prompt")
-async def get_full_system_prompt():
+async def get_full_system_prompt(request: Request):
     """Get the complete system prompt used for content generation."""
-    voice = BenovitzVoiceProfile()
-    return {
-        "system_prompt": get_system_prompt(voice)
-    }
+    compiled = get_compiled_prompts()
+    return precomputed_json(request, "system-prompt", compiled, {
+        "system_prompt": compiled.system_prompt
+    })
 
 
 @app.post("/generate", response_model=GenerateResponse)
-async def generate_content(request: GenerateRequest):
-    """Generate content in Rabbi Moshe Benovitz's voice."""
+async def generate_content(request: GenerateRequest, response: Response, http_request: Request):
+    """
+    Generate content in Rabbi Moshe Benovitz's voice.
+
+    If the client disconnects first, the upstream generation is cancelled.
+    """
 
     # Validate format
     try:
@@ -148,13 +465,18 @@ async def generate_content(request: GenerateRequest):
             detail=f"Invalid format '{request.format}'. Valid formats: {valid_formats}"
         )
 
+    usage = None
+    cached = False
+    coalesced = False
+    route = None
+    variants = None
+    similar = None
+    reused_from = None
+    length = None
+
     # Check for API key if not prompt_only
     if request.prompt_only:
-        content = generate_content_prompt_only(
-            topic=request.topic,
-            format_type=format_type,
-            additional_context=request.additional_context or ""
-        )
+        return prompt_only_response(format_type, request.topic, request.additional_context or "")
     else:
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
@@ -163,23 +485,375 @@ async def generate_content(request: GenerateRequest):
                 detail="ANTHROPIC_API_KEY not configured on server"
             )
 
-        content = generate_content_with_claude(
+        if request.variants > MAX_VARIANTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_VARIANTS} variants can be requested"
+            )
+
+        model_route = resolve_route(
+            format_type.value, request.model, request.max_tokens, request.temperature, request.timeout
+        )
+        results = await cancel_on_disconnect(http_request, generate_variants_async(
             topic=request.topic,
             format_type=format_type,
             api_key=api_key,
-            additional_context=request.additional_context or ""
-        )
+            additional_context=request.additional_context or "",
+            variants=request.variants,
+            cache=request.cache,
+            limiter=generation_slots,
+            route=model_route,
+            reuse_similar=request.reuse_similar
+        ))
+
+        for result in results:
+            if result.content.startswith("Error:"):
+                raise HTTPException(status_code=500, detail=result.content)
 
-        if content.startswith("Error:"):
-            raise HTTPException(status_code=500, detail=content)
+        result = results[0]
+        response.headers["Server-Timing"] = server_timing(result)
+        content = result.content
+        usage = Usage(**result.usage())
+        cached = result.cached
+        coalesced = result.coalesced
+        route = Route(**model_route.to_dict())
+        similar = result.similar
+        reused_from = result.reused_from
+        length = result.length
+
+        if request.variants > 1:
+            variants = [
+                Variant(
+                    content=variant.content,
+                    usage=Usage(**variant.usage()),
+                    cached=variant.cached,
+                    latency_ms=variant.latency_ms
+                )
+                for variant in results
+            ]
 
     return GenerateResponse(
         content=content,
         format=request.format,
-        topic=request.topic
+        topic=request.topic,
+        usage=usage,
+        cached=cached,
+        coalesced=coalesced,
+        route=route,
+        variants=variants,
+        similar=similar,
+        reused_from=reused_from,
+        length=length
+    )
+
+
+@app.post("/estimate")
+async def estimate(request: EstimateRequest):
+    """
+    Offline input/output token, cost and latency estimate for a request, after
+    context compaction. Cheap enough to call on every keystroke.
+    """
+    try:
+        format_type = ContentFormat(request.format)
+    except ValueError:
+        valid_formats = [f.value for f in ContentFormat]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format '{request.format}'. Valid formats: {valid_formats}"
+        )
+
+    route = resolve_route(format_type.value, request.model, request.max_tokens)
+    return estimate_generation(request.topic, format_type, request.additional_context or "", route)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit rate and size."""
+    generation_cache = get_generation_cache()
+    if generation_cache is None:
+        return {"backend": "off"}
+    if generation_cache.blocking:
+        return await asyncio.to_thread(generation_cache.stats)
+    return generation_cache.stats()
+
+
+@app.get("/length/stats")
+async def length_stats():
+    """Per-format output length against target, early stops and missing sections since startup."""
+    policy = get_length_policy()
+    if policy is None:
+        return {"mode": "off", "formats": {}}
+    return {"mode": "stop" if policy.stop else "flag", "formats": get_length_stats().stats()}
+
+
+@app.get("/similar")
+async def similar_generations(
+    topic: str,
+    format: str = "article",
+    additional_context: str = "",
+    threshold: Optional[float] = None,
+    limit: int = 3
+):
+    """Prior generations of the same format whose request resembles this one, closest first."""
+    try:
+        format_type = ContentFormat(format)
+    except ValueError:
+        valid_formats = [f.value for f in ContentFormat]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format '{format}'. Valid formats: {valid_formats}"
+        )
+
+    index = get_similarity_index()
+    if index is None:
+        return {"enabled": False, "similar": []}
+    matches = index.search(topic, format_type.value, additional_context, threshold, max(1, min(limit, 20)))
+    return {"enabled": True, "similar": [match.to_dict() for match in matches], **index.stats()}
+
+
+def archive_or_404():
+    """The generation archive, or a 404 if archiving is off."""
+    archive = get_archive()
+    if archive is None:
+        raise HTTPException(status_code=404, detail="The archive is off (set BENOVITZ_ARCHIVE_PATH to enable it)")
+    return archive
+
+
+def archive_format(format: Optional[str]) -> Optional[str]:
+    """Validate an optional format filter."""
+    if format is not None and format not in {f.value for f in ContentFormat}:
+        valid_formats = [f.value for f in ContentFormat]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format '{format}'. Valid formats: {valid_formats}"
+        )
+    return format
+
+
+@app.get("/archive/search")
+async def search_archive(
+    q: str,
+    format: Optional[str] = None,
+    limit: int = Query(default=10, ge=1, le=100),
+    offset: int = Query(default=0, ge=0)
+):
+    """Past generations containing every word of `q`, best match first, with highlighted snippets."""
+    archive = archive_or_404()
+    results = await asyncio.to_thread(archive.search, q, archive_format(format), limit, offset)
+    return {
+        "query": q,
+        "results": results,
+        "next_offset": offset + limit if len(results) == limit else None
+    }
+
+
+@app.get("/archive/export")
+async def export_archive(q: Optional[str] = None, format: Optional[str] = None, after: int = 0):
+    """Stream past generations (optionally only those matching `q` or of one format) as NDJSON in id order.
+
+    Pass the last `id` received as `after` to resume an interrupted export.
+    """
+    archive = archive_or_404()
+    documents = archive.export(q, archive_format(format), after)
+    return StreamingResponse(export_lines(documents), media_type="application/x-ndjson")
+
+
+@app.get("/archive/stats")
+async def archive_stats():
+    """Archived generations, file size and documents waiting to be written."""
+    archive = get_archive()
+    if archive is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(archive.stats)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Latency, token and error metrics in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Encode a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_content_stream(request: GenerateRequest):
+    """Stream content in Rabbi Moshe Benovitz's voice as Server-Sent Events.
+
+    Emits `delta` events carrying `{"text": ...}` as tokens arrive, then a final
+    `done` event, or an `error` event if generation fails mid-stream. If the
+    client disconnects, the upstream generation is cancelled.
+    """
+
+    # Validate format
+    try:
+        format_type = ContentFormat(request.format)
+    except ValueError:
+        valid_formats = [f.value for f in ContentFormat]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format '{request.format}'. Valid formats: {valid_formats}"
+        )
+
+    additional_context = request.additional_context or ""
+
+    if request.prompt_only:
+        async def events():
+            content = generate_content_prompt_only(
+                topic=request.topic,
+                format_type=format_type,
+                additional_context=additional_context
+            )
+            yield sse_event("delta", {"text": content})
+            yield sse_event("done", {"format": request.format, "topic": request.topic})
+    else:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise HTTPException(
+                status_code=500,
+                detail="ANTHROPIC_API_KEY not configured on server"
+            )
+
+        # Shed before the 200 status line is sent; later overloads arrive as error events
+        scheduler = get_scheduler()
+        if scheduler.saturated():
+            raise UpstreamOverloaded("Upstream queue is full", scheduler.retry_after_hint())
+
+        model_route = resolve_route(
+            format_type.value, request.model, request.max_tokens, request.temperature, request.timeout
+        )
+
+        async def events():
+            result = GenerationResult("")
+            first = True
+            try:
+                async for text in stream_content_with_claude_async(
+                    topic=request.topic,
+                    format_type=format_type,
+                    api_key=api_key,
+                    additional_context=additional_context,
+                    result=result,
+                    cache=request.cache,
+                    limiter=generation_slots,
+                    route=model_route,
+                    reuse_similar=request.reuse_similar
+                ):
+                    if first and text.startswith("Error:"):
+                        yield sse_event("error", {"detail": text})
+                        return
+                    first = False
+                    yield sse_event("delta", {"text": text})
+            except asyncio.CancelledError:
+                # The response is cancelled when the client disconnects
+                CLIENT_DISCONNECTS.inc(route="/generate/stream")
+                raise
+            except UpstreamOverloaded as exc:
+                yield sse_event("error", {"detail": f"Error: {exc}", "retry_after": exc.retry_after})
+                return
+            except Exception as exc:
+                yield sse_event("error", {"detail": f"Error: {exc}"})
+                return
+            yield sse_event("done", {
+                "format": request.format,
+                "topic": request.topic,
+                "usage": result.usage(),
+                "cached": result.cached,
+                "coalesced": result.coalesced,
+                "route": model_route.to_dict(),
+                "similar": result.similar,
+                "reused_from": result.reused_from,
+                "length": result.length,
+                "server_timing": server_timing(result)
+            })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+@app.post("/generate/batch")
+async def generate_batch(request: BatchRequest):
+    """Generate many items concurrently, streaming NDJSON result lines as each completes.
+
+    Each line carries the item's `index` and `id`, and either `status: "ok"` with
+    the content or `status: "error"` with a message; failed items never abort the batch.
+    """
+
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch has {len(request.items)} items; the maximum is {MAX_BATCH_ITEMS}"
+        )
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key and not all(item.prompt_only for item in request.items):
+        raise HTTPException(
+            status_code=500,
+            detail="ANTHROPIC_API_KEY not configured on server"
+        )
+
+    concurrency = max(1, min(request.concurrency, MAX_BATCH_CONCURRENCY))
+
+    async def lines():
+        try:
+            async for record in generate_batch_async(
+                (item.model_dump() for item in request.items),
+                api_key=api_key,
+                concurrency=concurrency,
+                limiter=generation_slots
+            ):
+                yield json.dumps(record) + "\n"
+        except asyncio.CancelledError:
+            # Items still in flight are cancelled along with the response
+            CLIENT_DISCONNECTS.inc(route="/generate/batch")
+            raise
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def job_manager():
+    """The shared job manager, or a 500 if it cannot be configured."""
+    try:
+        return get_job_manager()
+    except ValueError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.post("/jobs")
+async def submit_job(request: JobRequest):
+    """Submit items as an offline job on the Message Batches API."""
+    manager = job_manager()
+    try:
+        return await asyncio.to_thread(manager.submit, [item.model_dump() for item in request.items])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get a job's status, polling the upstream batch if it is still running."""
+    job = await asyncio.to_thread(job_manager().refresh, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job with id {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str):
+    """Stream a completed job's results as JSONL."""
+    manager = job_manager()
+    job = await asyncio.to_thread(manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job with id {job_id}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}")
+    return StreamingResponse(manager.results(job_id), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from serve import main
+    main()
@@ -0,0 +1,379 @@
+"""
+Offline bulk generation jobs for the Rabbi Moshe Benovitz Content Generator.
+
+Jobs are submitted to Anthropic's Message Batches API, which trades interactive
+latency for half-price processing. Job state lives in a local SQLite file so it
+survives restarts, and finished results are written out as JSONL. The upstream
+calls sit behind a small backend interface so a local fake can stand in for
+Anthropic during development and tests.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+
+from benovitz_content_generator import (
+    ContentFormat,
+    batch_params,
+    build_message_request,
+    get_client,
+    item_route,
+)
+
+
+class BatchBackend(ABC):
+    """Interface to an upstream batch service."""
+
+    @abstractmethod
+    def submit(self, requests: List[dict]) -> str:
+        """Submit `{"custom_id", "params"}` requests; return the upstream batch id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> dict:
+        """Return `{"processing_status": "in_progress" | "ended", "request_counts": {...}}`."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Iterator[dict]:
+        """Yield `{"custom_id", "status": "ok" | "error", ...}` for every finished request."""
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Message Batches API backend using the shared pooled client."""
+
+    def __init__(self, api_key: str):
+        self.client = get_client(api_key)
+
+    def submit(self, requests: List[dict]) -> str:
+        batch = self.client.messages.batches.create(requests=requests)
+        return batch.id
+
+    def status(self, batch_id: str) -> dict:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "processing_status": batch.processing_status,
+            "request_counts": {
+                "processing": counts.processing,
+                "succeeded": counts.succeeded,
+                "errored": counts.errored,
+                "canceled": counts.canceled,
+                "expired": counts.expired
+            }
+        }
+
+    def results(self, batch_id: str) -> Iterator[dict]:
+        for entry in self.client.messages.batches.results(batch_id):
+            outcome = entry.result
+            if outcome.type == "succeeded":
+                message = outcome.message
+                usage = message.usage
+                yield {
+                    "custom_id": entry.custom_id,
+                    "status": "ok",
+                    "content": message.content[0].text,
+                    "model": message.model,
+                    "usage": {
+                        "input_tokens": usage.input_tokens or 0,
+                        "output_tokens": usage.output_tokens or 0,
+                        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+                        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0
+                    }
+                }
+            else:
+                error = getattr(outcome, "error", None)
+                detail = getattr(getattr(error, "error", None), "message", None) or outcome.type
+                yield {"custom_id": entry.custom_id, "status": "error", "error": detail}
+
+
+class FakeBatchBackend(BatchBackend):
+    """
+    Local stand-in for the Message Batches API.
+
+    Batches finish after `delay` seconds; each result echoes the request's
+    topic instead of calling a model, so jobs can be exercised offline.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = {}
+
+    def submit(self, requests: List[dict]) -> str:
+        batch_id = f"fakebatch_{uuid.uuid4().hex[:12]}"
+        self.batches[batch_id] = (time.time(), requests)
+        return batch_id
+
+    def status(self, batch_id: str) -> dict:
+        submitted_at, requests = self.batches[batch_id]
+        ended = time.time() - submitted_at >= self.delay
+        return {
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else len(requests),
+                "succeeded": len(requests) if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            }
+        }
+
+    def results(self, batch_id: str) -> Iterator[dict]:
+        for request in self.batches[batch_id][1]:
+            params = request["params"]
+            yield {
+                "custom_id": request["custom_id"],
+                "status": "ok",
+                "content": params["messages"][0]["content"][-1]["text"],
+                "model": params["model"],
+                "usage": {
+                    "input_tokens": 0,
+                    "output_tokens": 0,
+                    "cache_creation_input_tokens": 0,
+                    "cache_read_input_tokens": 0
+                }
+            }
+
+
+class JobStore:
+    """SQLite persistence for jobs and their items."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                upstream_batch_id TEXT,
+                item_count INTEGER NOT NULL,
+                succeeded INTEGER NOT NULL DEFAULT 0,
+                errored INTEGER NOT NULL DEFAULT 0,
+                results_path TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                item TEXT NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+            """
+        )
+
+    def create(self, job_id: str, items: List[dict]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, item_count, created_at, updated_at) VALUES (?, 'submitting', ?, ?, ?)",
+                (job_id, len(items), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, item) VALUES (?, ?, ?)",
+                [(job_id, index, json.dumps(item)) for index, item in enumerate(items)]
+            )
+            self._conn.execute("COMMIT")
+
+    def update(self, job_id: str, **values) -> None:
+        values["updated_at"] = time.time()
+        columns = ", ".join(f"{column} = ?" for column in values)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*values.values(), job_id))
+
+    def complete(self, job_id: str, **values) -> bool:
+        """
+        Mark an in-progress job completed with `values` in one conditional
+        UPDATE; False if another caller completed (or failed) it first.
+        """
+
+        values.update(status="completed", updated_at=time.time())
+        columns = ", ".join(f"{column} = ?" for column in values)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ? AND status = 'in_progress'", (*values.values(), job_id)
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def items(self, job_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [json.loads(row["item"]) for row in rows]
+
+
+# Item fields a batch job honors: the Message Batches API runs each item once,
+# uncached and without a client timeout
+JOB_ITEM_FIELDS = {"id", "topic", "format", "additional_context", "context", "model", "max_tokens", "temperature"}
+
+
+def _custom_id(index: int) -> str:
+    return f"item-{index}"
+
+
+class JobManager:
+    """Submits jobs to a batch backend and tracks them in a JobStore."""
+
+    def __init__(self, store: JobStore, backend: BatchBackend, results_dir: str = "job_results"):
+        self.store = store
+        self.backend = backend
+        self.results_dir = results_dir
+
+    def submit(self, items: List[dict]) -> dict:
+        """
+        Validate and submit items ({"topic", "format", "additional_context"/"context", "id"},
+        plus optional route overrides "model", "max_tokens" and "temperature").
+
+        Raises ValueError if any item is invalid, before anything is submitted.
+        """
+
+        if not items:
+            raise ValueError("A job needs at least one item")
+
+        requests = []
+        for index, item in enumerate(items):
+            if not item.get("topic"):
+                raise ValueError(f"Item {index} is missing a topic")
+            unsupported = sorted(set(item) - JOB_ITEM_FIELDS)
+            if unsupported:
+                raise ValueError(f"Item {index} has fields a job cannot honor: {', '.join(unsupported)}")
+            try:
+                format_type = ContentFormat(item.get("format", "article"))
+            except ValueError:
+                valid_formats = [f.value for f in ContentFormat]
+                raise ValueError(f"Item {index} has invalid format '{item.get('format')}'. Valid formats: {valid_formats}")
+            additional_context = item.get("additional_context") or item.get("context") or ""
+            request = build_message_request(item["topic"], format_type, additional_context, item_route(item, format_type))
+            requests.append({"custom_id": _custom_id(index), "params": batch_params(request)})
+
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, items)
+        try:
+            batch_id = self.backend.submit(requests)
+        except Exception as exc:
+            self.store.update(job_id, status="failed", error=f"{type(exc).__name__}: {exc}")
+        else:
+            self.store.update(job_id, status="in_progress", upstream_batch_id=batch_id)
+        return self.store.get(job_id)
+
+    def refresh(self, job_id: str) -> Optional[dict]:
+        """Poll the upstream batch and, once it has ended, write the results file."""
+
+        job = self.store.get(job_id)
+        if job is None or job["status"] != "in_progress":
+            return job
+
+        status = self.backend.status(job["upstream_batch_id"])
+        counts = status["request_counts"]
+        if status["processing_status"] != "ended":
+            self.store.update(job_id, succeeded=counts["succeeded"], errored=counts["errored"])
+            return self.store.get(job_id)
+
+        self.write_results(job_id, job["upstream_batch_id"])
+        return self.store.get(job_id)
+
+    def write_results(self, job_id: str, batch_id: str) -> bool:
+        """
+        Download the upstream results and write them as JSONL records in item
+        order. Concurrent calls each write their own file and only the first to
+        complete the job keeps it; returns False for the others.
+        """
+
+        items = self.store.items(job_id)
+        by_custom_id = {_custom_id(index): (index, item) for index, item in enumerate(items)}
+
+        records = {}
+        for entry in self.backend.results(batch_id):
+            index, item = by_custom_id[entry.pop("custom_id")]
+            records[index] = {
+                "index": index,
+                "id": item.get("id"),
+                "topic": item.get("topic"),
+                "format": item.get("format", "article"),
+                **entry
+            }
+
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = os.path.join(self.results_dir, f"{job_id}-{uuid.uuid4().hex[:8]}.jsonl")
+        succeeded = errored = 0
+        with open(path, "w") as f:
+            for index in sorted(records):
+                record = records[index]
+                if record["status"] == "ok":
+                    succeeded += 1
+                else:
+                    errored += 1
+                f.write(json.dumps(record) + "\n")
+
+        if self.store.complete(job_id, succeeded=succeeded, errored=errored, results_path=path):
+            return True
+        os.remove(path)
+        return False
+
+    def results(self, job_id: str) -> Iterator[str]:
+        """Yield the JSONL lines of a completed job's results."""
+
+        job = self.store.get(job_id)
+        if job is None or not job["results_path"]:
+            return
+        with open(job["results_path"]) as f:
+            yield from f
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def create_job_manager_from_env(api_key: Optional[str] = None) -> JobManager:
+    """
+    Build a JobManager from the environment.
+
+    BENOVITZ_JOBS_DB and BENOVITZ_JOBS_DIR set the SQLite file and results
+    directory; BENOVITZ_BATCH_BACKEND=fake swaps in the offline fake backend.
+    """
+
+    store = JobStore(os.environ.get("BENOVITZ_JOBS_DB", "benovitz_jobs.sqlite3"))
+    results_dir = os.environ.get("BENOVITZ_JOBS_DIR", "job_results")
+
+    if os.environ.get("BENOVITZ_BATCH_BACKEND", "anthropic").lower() == "fake":
+        backend = FakeBatchBackend()
+    else:
+        api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("No API key provided. Set ANTHROPIC_API_KEY environment variable or pass --api-key")
+        backend = AnthropicBatchBackend(api_key)
+
+    return JobManager(store, backend, results_dir)
+
+
+def get_job_manager(api_key: Optional[str] = None) -> JobManager:
+    """Return the process-wide JobManager, creating it on first use."""
+
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = create_job_manager_from_env(api_key)
+        return _manager
+
+
+def set_job_manager(manager: Optional[JobManager]) -> None:
+    """Replace the process-wide JobManager (used to inject a fake backend)."""
+
+    global _manager
+    with _manager_lock:
+        _manager = manager
@@ -0,0 +1,8 @@
+"""
+Benchmark harness for the Rabbi Moshe Benovitz Content Generator.
+
+Run the scripts as modules from the repository root, for example
+`python -m benchmarks.bench_prompts` or `python -m benchmarks.load_test`.
+Results are written as JSON so runs can be compared across commits with
+`python -m benchmarks.compare`.
+"""
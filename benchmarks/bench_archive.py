@@ -0,0 +1,114 @@
+"""
+Generation archive at scale: write throughput, search latency and export rate.
+
+    python -m benchmarks.bench_archive --documents 200000 --output archive.json
+
+Fills a fresh archive with synthetic generations (Zipf-distributed vocabulary
+around the usual topics), then times record() on the caller's side, the
+background writer's throughput, ranked searches for rare, common and
+multi-word queries, and a full streaming export. Exits non-zero if a search
+case's p99 exceeds --budget-ms.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_similarity import COMMON, FORMATS, vocabulary
+from benchmarks.common import run_metadata, summarize, write_results
+from generation_archive import GenerationArchive
+
+
+def document(words: list, cum_weights: list, rng: random.Random, length: int) -> dict:
+    return {
+        "topic": " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(4, 8))),
+        "format": rng.choice(FORMATS),
+        "content": " ".join(rng.choices(words, cum_weights=cum_weights, k=length)),
+        "model": "claude-sonnet-4-20250514",
+        "input_tokens": 1800,
+        "output_tokens": length * 4 // 3
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generation archive write, search and export benchmark")
+    parser.add_argument("--documents", type=int, default=200000, help="Archived generations (default: %(default)s)")
+    parser.add_argument("--words", type=int, default=150, help="Words of content per document (default: %(default)s)")
+    parser.add_argument("--queries", type=int, default=200, help="Searches per case (default: %(default)s)")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words (default: %(default)s)")
+    parser.add_argument("--rank-window", type=int, default=1000,
+                        help="Newest matches ranked per search (default: %(default)s)")
+    parser.add_argument("--budget-ms", type=float, default=20, help="p99 search budget (default: %(default)s)")
+    parser.add_argument("--path", help="Archive file to create (default: a temporary file)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    directory = tempfile.TemporaryDirectory()
+    path = args.path or os.path.join(directory.name, "archive.sqlite3")
+    archive = GenerationArchive(path, rank_window=args.rank_window)
+    results = {"benchmark": "archive", "meta": run_metadata(args), "cases": {}}
+
+    record_times = []
+    started = time.perf_counter()
+    for _ in range(args.documents):
+        doc = document(words, cum_weights, rng, args.words)
+        before = time.perf_counter()
+        while not archive.record(doc):
+            time.sleep(0.001)
+        record_times.append((time.perf_counter() - before) * 1e6)
+    archive.flush(timeout=None)
+    elapsed = time.perf_counter() - started
+    stats = summarize(record_times)
+    results["record_p99_us"] = stats["p99"]
+    results["documents_per_second"] = args.documents / elapsed
+    results["bytes"] = archive.stats()["bytes"]
+    print(
+        f"archived {args.documents} documents at {args.documents / elapsed:.0f}/s, "
+        f"record() p50 {stats['p50']:.1f} us p99 {stats['p99']:.1f} us, {results['bytes'] / 1e6:.0f} MB"
+    )
+
+    rare = words[len(words) // 2:]
+    cases = {
+        "rare_term": lambda: rng.choice(rare),
+        "common_term": lambda: rng.choice(COMMON),
+        "two_terms": lambda: f"{rng.choice(COMMON)} {rng.choice(words[:2000])}",
+        "prefix": lambda: rng.choice(words[:2000])[:4] + "*",
+        "filtered": lambda: rng.choice(COMMON),
+    }
+    for name, query in cases.items():
+        times = []
+        for _ in range(args.queries):
+            text = query()
+            format_value = rng.choice(FORMATS) if name == "filtered" else None
+            before = time.perf_counter()
+            archive.search(text, format_value, limit=10)
+            times.append((time.perf_counter() - before) * 1000)
+        stats = summarize(times)
+        results["cases"][name] = {"median_ms": stats["p50"], "p95_ms": stats["p95"], "p99_ms": stats["p99"]}
+        print(f"search {name:12} p50 {stats['p50']:7.2f} ms  p95 {stats['p95']:7.2f} ms  p99 {stats['p99']:7.2f} ms")
+
+    started = time.perf_counter()
+    exported = sum(1 for _ in archive.export())
+    elapsed = time.perf_counter() - started
+    results["export_documents_per_second"] = exported / elapsed
+    print(f"exported {exported} documents at {exported / elapsed:.0f}/s")
+
+    archive.close()
+    write_results(args.output, results)
+    worst = max(case["p99_ms"] for case in results["cases"].values())
+    if worst > args.budget_ms:
+        print(f"p99 search {worst:.1f} ms is over the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
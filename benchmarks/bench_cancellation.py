@@ -0,0 +1,171 @@
+"""
+End-to-end cancellation: clients that disconnect mid-generation.
+
+    python -m benchmarks.bench_cancellation --requests 20 -o cancellation.json
+
+Serves api:app and a slow fake Messages API from this process, then sends
+requests one at a time and hangs up on each part-way through: `generate`
+closes a POST /generate after --disconnect-after seconds, `stream` closes a
+POST /generate/stream after --deltas text events, and `before_first_token`
+closes a stream while the upstream call is still waiting for its first
+token. For every request it times how long the upstream stream stays open
+after the hang-up and counts the output tokens the fake upstream streamed,
+against what a full generation would have cost. Exits non-zero if a stream
+outlives --budget-ms after its client has gone.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import metrics
+from benchmarks.common import run_metadata, summarize, write_results
+from benchmarks.fake_anthropic import add_fake_arguments, config_from_args, create_app
+from benchmarks.load_test import ServerThread
+
+SCENARIOS = ("generate", "stream", "before_first_token")
+
+_topics = itertools.count()
+
+
+def fake_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats") as response:
+        return json.loads(response.read())
+
+
+async def hang_up(scenario: str, port: int, args) -> None:
+    """Send one request and close the connection at the scenario's point."""
+
+    path = "/generate" if scenario == "generate" else "/generate/stream"
+    body = json.dumps({
+        "topic": f"Cancellation benchmark topic {next(_topics)}",
+        "format": args.format,
+        "cache": "bypass"
+    }).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+    if scenario == "generate":
+        await asyncio.sleep(args.disconnect_after)
+    elif scenario == "before_first_token":
+        await asyncio.sleep(args.fake_first_token_latency / 2)
+    else:
+        deltas = 0
+        while deltas < args.deltas:
+            line = await reader.readline()
+            if not line:
+                raise RuntimeError("Stream ended before the client hung up")
+            deltas += line.startswith(b"event: delta")
+    writer.close()
+    await writer.wait_closed()
+
+
+def run_scenario(scenario: str, port: int, fake_port: int, args) -> dict:
+    abort_ms = []
+    leaked = 0
+    before = fake_stats(fake_port)
+    cancelled_before = metrics.CANCELLED_GENERATIONS.total()
+
+    for _ in range(args.requests):
+        asyncio.run(hang_up(scenario, port, args))
+        closed = time.perf_counter()
+        deadline = closed + args.budget_ms / 1000 * 4
+        while fake_stats(fake_port)["open_streams"] and time.perf_counter() < deadline:
+            time.sleep(0.002)
+        if fake_stats(fake_port)["open_streams"]:
+            leaked += 1
+            while fake_stats(fake_port)["open_streams"]:
+                time.sleep(0.05)
+        abort_ms.append((time.perf_counter() - closed) * 1000)
+
+    after = fake_stats(fake_port)
+    streamed = after["streamed_tokens"] - before["streamed_tokens"]
+    full = args.requests * args.fake_output_tokens
+    return {
+        "requests": args.requests,
+        "upstream_aborted": after["aborted_streams"] - before["aborted_streams"],
+        "cancelled_generations": metrics.CANCELLED_GENERATIONS.total() - cancelled_before,
+        "leaked_streams": leaked,
+        "abort_ms": summarize(abort_ms),
+        "streamed_tokens": streamed,
+        "full_tokens": full,
+        "tokens_saved_pct": 100 * (1 - streamed / full)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client disconnect to upstream abort benchmark")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Scenario to run; repeat for several (default: all)")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario (default: %(default)s)")
+    parser.add_argument("--format", default="article", help="Content format (default: %(default)s)")
+    parser.add_argument("--disconnect-after", type=float, default=1.0,
+                        help="Seconds before a /generate client hangs up (default: %(default)s)")
+    parser.add_argument("--deltas", type=int, default=20,
+                        help="Text events a /generate/stream client reads before hanging up (default: %(default)s)")
+    parser.add_argument("--budget-ms", type=float, default=250,
+                        help="Longest an upstream stream may outlive its client (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8001, help="Port for the API (default: %(default)s)")
+    parser.add_argument("--fake-port", type=int, default=8765, help="Port for the fake upstream (default: %(default)s)")
+    add_fake_arguments(parser, prefix="fake-")
+    parser.set_defaults(fake_first_token_latency=0.5, fake_tokens_per_second=50, fake_output_tokens=1000)
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{args.fake_port}"
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    for name in ("BENOVITZ_RPM", "BENOVITZ_INPUT_TPM", "BENOVITZ_OUTPUT_TPM"):
+        os.environ.setdefault(name, "1000000000")
+
+    fake = ServerThread(create_app(config_from_args(args, prefix="fake-")), args.fake_port)
+    fake.start_and_wait()
+    from api import app
+
+    server = ServerThread(app, args.port)
+    server.start_and_wait()
+
+    results = {"benchmark": "cancellation", "meta": run_metadata(args), "scenarios": {}}
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            result = run_scenario(scenario, args.port, args.fake_port, args)
+            results["scenarios"][scenario] = result
+            abort = result["abort_ms"]
+            print(
+                f"{scenario:18} aborted {result['upstream_aborted']:3}/{result['requests']}  "
+                f"abort p50 {abort['p50']:6.1f} ms  p99 {abort['p99']:6.1f} ms  "
+                f"streamed {result['streamed_tokens']:6}/{result['full_tokens']} tokens "
+                f"({result['tokens_saved_pct']:.1f}% saved)"
+            )
+    finally:
+        server.stop()
+        fake.stop()
+
+    results["client_disconnects"] = metrics.CLIENT_DISCONNECTS.total()
+    results["cancelled_tokens_saved"] = metrics.CANCELLED_TOKENS_SAVED.total()
+    print(
+        f"api counted {results['client_disconnects']:.0f} disconnects, "
+        f"{results['cancelled_tokens_saved']:.0f} expected output tokens saved"
+    )
+    write_results(args.output, results)
+
+    failed = [
+        name for name, result in results["scenarios"].items()
+        if result["leaked_streams"] or result["abort_ms"]["p99"] > args.budget_ms
+    ]
+    if failed:
+        print(f"upstream streams outlived their clients by more than {args.budget_ms:.0f} ms: {', '.join(failed)}",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Offline estimates and context compaction, as called on every keystroke.
+
+    python -m benchmarks.bench_estimate --output estimate.json
+
+`keystroke_*` cases change the topic on every call while the context stays the
+same, as when the topic field is being typed into (compaction is memoized).
+`cold_*` cases compact a context never seen before. Exits non-zero if a
+keystroke case's median is over --budget-us.
+"""
+
+import argparse
+import itertools
+import sys
+
+from benovitz_content_generator import ContentFormat, estimate_generation
+from benchmarks.bench_prompts import TOPIC, bench
+from benchmarks.common import run_metadata, write_results
+from token_budget import CompactionPolicy, compact_context, estimate_tokens
+
+PARAGRAPH = (
+    "At the Shabbaton the teens kept asking why davening feels like a chore. "
+    "Several advisors said the same thing about their own tefillah growing up, "
+    "and one student said the only time it clicked was singing Lecha Dodi at camp.   "
+)
+
+
+def context_of(size: int) -> str:
+    """About `size` characters of pasted notes, with some paragraphs repeated as pastes tend to be."""
+
+    paragraphs = []
+    for number in itertools.count():
+        paragraphs.append(f"{number % 7}. {PARAGRAPH}")
+        if sum(map(len, paragraphs)) >= size:
+            return "\n\n".join(paragraphs)
+
+
+def cases() -> dict:
+    fmt = ContentFormat.ARTICLE
+    contexts = {"empty": "", "2kb": context_of(2000), "20kb": context_of(20000), "100kb": context_of(100000)}
+    result = {}
+    for name, context in contexts.items():
+        topics = itertools.cycle(TOPIC[:length] for length in range(1, len(TOPIC) + 1))
+        result[f"keystroke_{name}"] = lambda context=context, topics=topics: estimate_generation(next(topics), fmt, context)
+    for name in ("2kb", "20kb", "100kb"):
+        # A fresh character each call defeats the memo, so compaction runs in full
+        fresh = map(contexts[name].__add__, map(chr, itertools.cycle(range(0x2000, 0x3000))))
+        result[f"cold_{name}"] = lambda fresh=fresh: compact_context(next(fresh), CompactionPolicy())
+    result["estimate_tokens_20kb"] = lambda: estimate_tokens(contexts["20kb"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline estimate and context compaction benchmark")
+    parser.add_argument("--rounds", type=int, default=7, help="Timing rounds per case (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per round (default: %(default)s)")
+    parser.add_argument("--budget-us", type=float, default=1000,
+                        help="Median budget for keystroke cases (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {"benchmark": "estimate", "meta": run_metadata(args), "cases": {}}
+    for name, function in cases().items():
+        result = results["cases"][name] = bench(function, args.rounds, args.min_time)
+        print(f"{name:24} best {result['best_us']:10.2f} us   median {result['median_us']:10.2f} us")
+
+    write_results(args.output, results)
+    worst = max(case["median_us"] for name, case in results["cases"].items() if name.startswith("keystroke_"))
+    if worst > args.budget_us:
+        print(f"keystroke estimate {worst:.0f} us is over the {args.budget_us:.0f} us budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Start-up time budget for the CLI and API.
+
+    python -m benchmarks.bench_import --output import.json
+
+Runs each case in a fresh interpreter several times and reports the best wall
+time in milliseconds, net of bare interpreter start-up (`import_ms`). Exits
+non-zero when a budgeted case goes over its budget, or when the network-free
+CLI paths import the Anthropic SDK, so it can gate CI.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import run_metadata, write_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, "benovitz_content_generator.py")
+
+# name -> (interpreter arguments, budget in ms or None)
+CASES = {
+    "import_generator": (["-c", "import benovitz_content_generator"], 100),
+    "cli_prompt_only": ([CLI, "--prompt-only", "Making tefillah meaningful for teens"], 120),
+    "cli_estimate": ([CLI, "--estimate", "Making tefillah meaningful for teens"], 120),
+    "cli_show_voice_profile": ([CLI, "--show-voice-profile"], 120),
+    "cli_help": ([CLI, "--help"], 120),
+    "import_api": (["-c", "import api"], None),
+}
+
+# Paths that must never load the SDK
+SDK_FREE_CHECK = (
+    "import sys, benovitz_content_generator; "
+    "sys.exit('anthropic' in sys.modules)"
+)
+
+
+def best_wall_ms(arguments, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI and API start-up time budget")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh interpreters per case (default: %(default)s)")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="Multiply every budget, e.g. 2 on slow CI machines (default: %(default)s)")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    baseline = best_wall_ms(["-c", "pass"], args.runs)
+    print(f"{'interpreter':28} {baseline:8.1f} ms (subtracted below)")
+
+    results = {"benchmark": "import", "meta": run_metadata(args), "interpreter_ms": baseline, "cases": {}}
+    failures = []
+    for name, (arguments, budget) in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        import_ms = max(0.0, best_wall_ms(arguments, args.runs) - baseline)
+        case = results["cases"][name] = {"import_ms": import_ms}
+        line = f"{name:28} {import_ms:8.1f} ms"
+        if budget is not None:
+            budget *= args.budget_scale
+            case["budget_ms"] = budget
+            line += f"   budget {budget:6.0f} ms"
+            if import_ms > budget:
+                failures.append(name)
+                line += "   OVER"
+        print(line)
+
+    sdk_free = subprocess.run([sys.executable, "-c", SDK_FREE_CHECK], cwd=ROOT).returncode == 0
+    results["sdk_free_import"] = sdk_free
+    if not sdk_free:
+        failures.append("sdk_free_import")
+        print("Importing benovitz_content_generator loaded the anthropic SDK")
+
+    write_results(args.output, results)
+    if failures:
+        print(f"Over budget: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
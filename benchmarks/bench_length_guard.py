@@ -0,0 +1,92 @@
+"""
+Length guard overhead and savings on overrunning generations.
+
+    python -m benchmarks.bench_length_guard --output length_guard.json
+
+Streams synthetic generations that run past their format's target (an article
+of --overrun times 1200 words, a reflection of 600 words, a social post and
+an outline followed by chatter nobody asked for) through a LengthGuard in
+deltas of a few words, as the API delivers them. Reports the guard's cost per
+delta and the share of output tokens it saves by stopping early.
+"""
+
+import argparse
+import time
+
+from benchmarks.common import run_metadata, summarize, write_results
+from length_guard import FORMAT_SPECS, LengthGuard
+from token_budget import estimate_tokens
+
+SENTENCE = "Teens can tell when davening is real and when it is routine, so we start with why it matters. "
+CHATTER = "\n\n---\n\n**Notes for the presenter**\nLet me know if you would like a different tone or a shorter version. "
+
+
+def paragraphs(words: int) -> str:
+    per_paragraph = 4 * len(SENTENCE.split())
+    return "\n\n".join(SENTENCE * 4 for _ in range(max(1, words // per_paragraph)))
+
+
+def samples(overrun: float) -> dict:
+    outline = "\n\n".join(
+        f"**{section}**\n- {SENTENCE}\n- {SENTENCE}" for section in FORMAT_SPECS["shiur_outline"].sections
+    )
+    return {
+        "article": paragraphs(int(1200 * overrun)),
+        "short_reflection": paragraphs(600),
+        "social_media": f"{SENTENCE}\n\n{SENTENCE}\n\n#NCSY #Torah #JewishGrowth" + CHATTER * 10,
+        "shiur_outline": outline + CHATTER * 10,
+    }
+
+
+def deltas(text: str, words_per_delta: int):
+    words = text.split(" ")
+    for start in range(0, len(words), words_per_delta):
+        piece = " ".join(words[start:start + words_per_delta])
+        yield piece if start == 0 else " " + piece
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Length guard overhead and early-stop savings")
+    parser.add_argument("--overrun", type=float, default=1.6, help="Article length over 1200 words (default: %(default)s)")
+    parser.add_argument("--words-per-delta", type=int, default=3, help="Words per streamed delta (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per format (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {"benchmark": "length_guard", "meta": run_metadata(args), "cases": {}}
+    for format_value, text in samples(args.overrun).items():
+        pieces = list(deltas(text, args.words_per_delta))
+        per_delta_us = []
+        for _ in range(args.repeat):
+            guard = LengthGuard(FORMAT_SPECS[format_value])
+            started = time.perf_counter()
+            fed = 0
+            for piece in pieces:
+                guard.feed(piece)
+                fed += 1
+                if guard.stopped:
+                    break
+            guard.close()
+            per_delta_us.append((time.perf_counter() - started) / fed * 1e6)
+
+        full_tokens = estimate_tokens(text)
+        received_tokens = estimate_tokens(guard.received)
+        stats = summarize(per_delta_us)
+        results["cases"][format_value] = case = {
+            "per_delta_us": stats["p50"],
+            "stopped": guard.stopped,
+            "words": guard.report()["words"],
+            "output_tokens": full_tokens,
+            "received_tokens": received_tokens,
+            "saved_fraction": 1 - received_tokens / full_tokens,
+        }
+        print(
+            f"{format_value:18} {case['per_delta_us']:6.2f} us/delta  stopped {str(guard.stopped):12} "
+            f"{case['words']:5d} words kept  {case['saved_fraction']:6.1%} of {full_tokens} output tokens saved"
+        )
+
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+prompt_only rendering: the original f-string path against precompiled templates.
+
+    python -m benchmarks.bench_prompt_only --output prompt_only.json
+
+Each case renders one prompt_only /generate response body. `fstring_response`
+is the original path (f-string prompt, GenerateResponse validation, JSON
+encoding of the whole prompt); `template_response` is what the API does now
+(pre-escaped template fragments joined once). Reports per-call time, calls per
+second and the peak bytes allocated while building one response.
+"""
+
+import argparse
+import json
+import tracemalloc
+
+from api import GenerateResponse, prompt_only_response
+from benovitz_content_generator import ContentFormat, generate_content_prompt_only, get_compiled_prompts
+from benchmarks.bench_prompts import CONTEXT, TOPIC, bench
+from benchmarks.common import run_metadata, write_results
+
+
+def fstring_prompt(topic: str, format_type: ContentFormat, additional_context: str = "") -> str:
+    """The prompt_only renderer as it was before templates, kept as the baseline."""
+
+    compiled = get_compiled_prompts()
+    system_prompt = compiled.system_prompt
+    format_instructions = compiled.format_instructions[format_type]
+
+    return f"""=== SYSTEM INSTRUCTIONS ===
+{system_prompt}
+
+=== FORMAT INSTRUCTIONS ===
+{format_instructions}
+
+=== USER REQUEST ===
+Please write content on the following topic:
+
+**Topic**: {topic}
+
+{f"**Additional Context/Notes**: {additional_context}" if additional_context else ""}
+
+Write this content now in the authentic voice of Rabbi Moshe Benovitz."""
+
+
+def fstring_response(topic: str, format_type: ContentFormat, additional_context: str) -> bytes:
+    """Body FastAPI produced for the original path: validate the response model, then JSON-encode it."""
+
+    model = GenerateResponse(
+        content=fstring_prompt(topic, format_type, additional_context),
+        format=format_type.value,
+        topic=topic
+    )
+    return json.dumps(model.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def cases() -> dict:
+    fmt = ContentFormat.ARTICLE
+    return {
+        "fstring_prompt": lambda: fstring_prompt(TOPIC, fmt, CONTEXT),
+        "template_prompt": lambda: generate_content_prompt_only(TOPIC, fmt, CONTEXT),
+        "fstring_response": lambda: fstring_response(TOPIC, fmt, CONTEXT),
+        "template_response": lambda: prompt_only_response(fmt, TOPIC, CONTEXT).body,
+    }
+
+
+def peak_alloc_bytes(function, calls: int = 50) -> int:
+    """Largest transient allocation, in bytes, seen while building one result."""
+
+    function()
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            function()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        return min(peaks)
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt_only rendering: f-string vs precompiled templates")
+    parser.add_argument("--rounds", type=int, default=7, help="Timing rounds per case (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per round (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    assert fstring_response(TOPIC, ContentFormat.ARTICLE, CONTEXT) == \
+        prompt_only_response(ContentFormat.ARTICLE, TOPIC, CONTEXT).body, "template output differs from f-string path"
+
+    results = {"benchmark": "prompt_only", "meta": run_metadata(args), "cases": {}}
+    for name, function in cases().items():
+        result = bench(function, args.rounds, args.min_time)
+        result["calls_per_second"] = 1e6 / result["best_us"]
+        result["alloc_bytes"] = peak_alloc_bytes(function)
+        results["cases"][name] = result
+        print(
+            f"{name:20} best {result['best_us']:8.2f} us  {result['calls_per_second']:10.0f} calls/s  "
+            f"peak alloc {result['alloc_bytes']:7d} B"
+        )
+
+    for kind in ("prompt", "response"):
+        before, after = results["cases"][f"fstring_{kind}"], results["cases"][f"template_{kind}"]
+        print(
+            f"{kind}: {before['best_us'] / after['best_us']:.1f}x faster, "
+            f"{before['alloc_bytes'] / max(1, after['alloc_bytes']):.1f}x less peak allocation"
+        )
+
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks for prompt assembly.
+
+    python -m benchmarks.bench_prompts --output prompts.json
+
+Each case is timed with timeit over several rounds; per-call times are
+reported in microseconds (best round, median round and p95 across rounds).
+"""
+
+import argparse
+import timeit
+
+from benovitz_content_generator import (
+    BenovitzVoiceProfile,
+    ContentFormat,
+    build_message_request,
+    generate_content_prompt_only,
+    get_format_instructions,
+    get_system_prompt,
+)
+from benchmarks.common import run_metadata, summarize, write_results
+
+TOPIC = "Making tefillah meaningful for teens"
+CONTEXT = "For a Shabbaton audience of public school teens"
+
+
+def cases() -> dict:
+    voice = BenovitzVoiceProfile()
+    return {
+        "get_system_prompt": lambda: get_system_prompt(voice),
+        "get_format_instructions": lambda: get_format_instructions(ContentFormat.SHIUR_OUTLINE),
+        "generate_content_prompt_only": lambda: generate_content_prompt_only(TOPIC, ContentFormat.ARTICLE, CONTEXT),
+        "build_message_request": lambda: build_message_request(TOPIC, ContentFormat.ARTICLE, CONTEXT),
+    }
+
+
+def bench(function, rounds: int, min_time: float) -> dict:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    # Scale each round to take roughly min_time seconds
+    number = max(1, int(number * min_time / 0.2))
+    per_call_us = [total / number * 1e6 for total in timer.repeat(repeat=rounds, number=number)]
+    stats = summarize(per_call_us)
+    return {"calls_per_round": number, "best_us": min(per_call_us), "median_us": stats["p50"], "p95_us": stats["p95"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt assembly micro-benchmarks")
+    parser.add_argument("--rounds", type=int, default=7, help="Timing rounds per case (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per round (default: %(default)s)")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {"benchmark": "prompts", "meta": run_metadata(args), "cases": {}}
+    for name, function in cases().items():
+        if args.filter and args.filter not in name:
+            continue
+        result = results["cases"][name] = bench(function, args.rounds, args.min_time)
+        print(f"{name:32} best {result['best_us']:10.2f} us   median {result['median_us']:10.2f} us")
+
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
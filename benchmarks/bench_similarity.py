@@ -0,0 +1,111 @@
+"""
+Near-duplicate index lookups at scale.
+
+    python -m benchmarks.bench_similarity --entries 100000 --output similarity.json
+
+Fills a SimilarityIndex with synthetic topics (Zipf-distributed vocabulary, so
+common words have long posting lists as in real traffic), then times lookups
+for paraphrases of stored topics and for unseen topics. Exits non-zero if the
+p99 lookup time exceeds --budget-us.
+"""
+
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from benchmarks.common import run_metadata, summarize, write_results
+from similarity_index import TERM_ALIASES, SimilarityIndex
+
+FORMATS = ("article", "social_media", "shiur_outline", "short_reflection", "advisor_training")
+COMMON = ["making", "meaningful", "teens", "growth", "torah", "shabbat", "tefillah", "mentorship",
+          "students", "authentic", "community", "leadership", "learning", "chesed", "emunah"]
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set(COMMON)
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words, key=lambda word: (word not in COMMON, word))
+
+
+def topic(words: list, cum_weights: list, rng: random.Random) -> str:
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(4, 8)))
+
+
+def paraphrase(text: str, rng: random.Random) -> str:
+    """Swap in aliases, drop a word and add a stopword, roughly as people rephrase."""
+
+    reverse = {}
+    for variant, canonical in TERM_ALIASES.items():
+        reverse.setdefault(canonical, []).append(variant)
+    words = [rng.choice(reverse[word]) if word in reverse and rng.random() < 0.7 else word for word in text.split()]
+    if len(words) > 4:
+        words.pop(rng.randrange(len(words)))
+    words.insert(rng.randrange(len(words) + 1), "for")
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate index lookup benchmark")
+    parser.add_argument("--entries", type=int, default=100000, help="Stored requests (default: %(default)s)")
+    parser.add_argument("--queries", type=int, default=5000, help="Lookups to time (default: %(default)s)")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=0.75, help="Cosine threshold (default: %(default)s)")
+    parser.add_argument("--budget-us", type=float, default=1000, help="p99 lookup budget (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    index = SimilarityIndex(threshold=args.threshold, max_entries=args.entries)
+    stored = []
+    started = time.perf_counter()
+    for number in range(args.entries):
+        text = topic(words, cum_weights, rng)
+        format_value = FORMATS[number % len(FORMATS)]
+        index.add(f"key-{number}", text, format_value)
+        stored.append((text, format_value))
+    add_us = (time.perf_counter() - started) / args.entries * 1e6
+
+    results = {"benchmark": "similarity", "meta": run_metadata(args), "add_us": add_us, "cases": {}}
+    print(f"indexed {index.stats()['entries']} entries, {add_us:.1f} us per add")
+
+    for name in ("paraphrase", "unseen"):
+        times = []
+        found = 0
+        for _ in range(args.queries):
+            if name == "paraphrase":
+                text, format_value = rng.choice(stored)
+                text = paraphrase(text, rng)
+            else:
+                text, format_value = topic(words, cum_weights, rng), rng.choice(FORMATS)
+            started = time.perf_counter()
+            matches = index.search(text, format_value)
+            times.append((time.perf_counter() - started) * 1e6)
+            found += bool(matches)
+
+        stats = summarize(times)
+        results["cases"][name] = {
+            "best_us": min(times), "median_us": stats["p50"], "p95_us": stats["p95"], "p99_us": stats["p99"],
+            "max_us": stats["max"], "match_rate": found / args.queries
+        }
+        print(
+            f"{name:12} p50 {stats['p50']:7.1f} us  p95 {stats['p95']:7.1f} us  p99 {stats['p99']:7.1f} us  "
+            f"matched {found / args.queries:.0%}"
+        )
+
+    write_results(args.output, results)
+    worst = max(case["p99_us"] for case in results["cases"].values())
+    if worst > args.budget_us:
+        print(f"p99 lookup {worst:.0f} us is over the {args.budget_us:.0f} us budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files, e.g. from before and after a change.
+
+    python -m benchmarks.compare baseline.json candidate.json
+
+Prints each shared metric with the relative change. For throughput, higher is
+better; for every other metric, lower is better.
+"""
+
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(results: dict) -> Dict[str, float]:
+    """Headline metrics of a result file, keyed by "case.metric"."""
+
+    metrics = {}
+    for name, case in results.get("cases", {}).items():
+        for key in ("best_us", "median_us", "p95_us", "alloc_bytes", "import_ms"):
+            if key in case:
+                metrics[f"{name}.{key}"] = case[key]
+    for name, scenario in results.get("scenarios", {}).items():
+        metrics[f"{name}.throughput_rps"] = scenario["throughput_rps"]
+        for pct in ("p50", "p95", "p99"):
+            metrics[f"{name}.latency_{pct}_ms"] = scenario["latency_ms"][pct]
+        if "server_loop_lag_ms" in scenario:
+            metrics[f"{name}.server_loop_lag_p99_ms"] = scenario["server_loop_lag_ms"]["p99"]
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline {baseline['meta'].get('revision')}  candidate {candidate['meta'].get('revision')}\n")
+    before, after = flatten(baseline), flatten(candidate)
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if key.endswith("throughput_rps") else change < 0
+        marker = "" if abs(change) < 5 else (" better" if better else " WORSE")
+        print(f"{key:48} {old:12.2f} -> {new:12.2f}  {change:+7.1f}%{marker}")
+
+
+if __name__ == "__main__":
+    main()
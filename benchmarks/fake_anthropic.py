@@ -0,0 +1,226 @@
+"""
+Configurable fake of the Anthropic Messages API for benchmarks.
+
+Serves POST /v1/messages (streaming and non-streaming) with a simulated time to
+first token, a steady output token rate, and 429 responses for an optional
+share of calls or for the first few. A slow tail (a share of calls, or the
+first few, whose first token takes --slow-latency) triggers hedging, and
+injected errors (--error-status for a share of calls or the first few) trip
+circuit breakers. Point the generator at it with ANTHROPIC_BASE_URL:
+
+    python -m benchmarks.fake_anthropic --port 8765 --first-token-latency 0.4 --tokens-per-second 80
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=fake uvicorn api:app
+
+GET /_stats reports how many calls were served and rate limited, how many
+output tokens were streamed, and how many streams are still open or were
+abandoned by the caller before they finished.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeConfig:
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 100.0
+    output_tokens: int = 200
+    rate_limit_share: float = 0.0
+    rate_limit_first: int = 0
+    retry_after: float = 1.0
+    jitter: float = 0.1
+    cache_read_input_tokens: int = 1500
+    # Slow tail: these calls wait slow_latency, not first_token_latency, for the first token
+    slow_share: float = 0.0
+    slow_first: int = 0
+    slow_latency: float = 3.0
+    # Injected failures, answered with error_status, or with error_after set,
+    # an error event after streaming that many tokens
+    error_share: float = 0.0
+    error_first: int = 0
+    error_status: int = 500
+    error_after: Optional[int] = None
+
+
+ERROR_TYPES = {500: "api_error", 503: "api_error", 529: "overloaded_error", 400: "invalid_request_error"}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    stats = {
+        "calls": 0, "rate_limited": 0, "errors": 0, "slow": 0, "streams": 0,
+        "open_streams": 0, "aborted_streams": 0, "streamed_tokens": 0, "models": {}
+    }
+
+    def jittered(seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - config.jitter, 1 + config.jitter))
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        stats["calls"] += 1
+        stats["models"][body["model"]] = stats["models"].get(body["model"], 0) + 1
+
+        if stats["calls"] <= config.rate_limit_first or random.random() < config.rate_limit_share:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"type": "error", "error": {"type": "rate_limit_error", "message": "Fake rate limit"}},
+                status_code=429,
+                headers={"retry-after": str(config.retry_after)}
+            )
+
+        fail_after = None
+        if stats["calls"] <= config.error_first or random.random() < config.error_share:
+            stats["errors"] += 1
+            error = {"type": "error", "error": {
+                "type": ERROR_TYPES.get(config.error_status, "api_error"), "message": "Fake failure"
+            }}
+            if config.error_after is None or not body.get("stream"):
+                return JSONResponse(error, status_code=config.error_status)
+            fail_after = config.error_after
+
+        first_token_latency = config.first_token_latency
+        if stats["calls"] <= config.slow_first or random.random() < config.slow_share:
+            stats["slow"] += 1
+            first_token_latency = config.slow_latency
+
+        output_tokens = min(config.output_tokens, body.get("max_tokens", config.output_tokens))
+        words = ["word"] * output_tokens
+        message = {
+            "id": f"msg_fake_{stats['calls']}",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": 50,
+                "output_tokens": 1,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": config.cache_read_input_tokens
+            }
+        }
+        token_delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(jittered(first_token_latency) + token_delay * output_tokens)
+            message.update(
+                content=[{"type": "text", "text": " ".join(words)}],
+                stop_reason="end_turn",
+                usage={**message["usage"], "output_tokens": output_tokens}
+            )
+            return message
+
+        stats["streams"] += 1
+
+        async def events():
+            stats["open_streams"] += 1
+            finished = False
+            try:
+                yield _sse("message_start", {"type": "message_start", "message": message})
+                yield _sse("content_block_start", {
+                    "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+                })
+                await asyncio.sleep(jittered(first_token_latency))
+                for index, word in enumerate(words):
+                    if index == fail_after:
+                        yield _sse("error", error)
+                        finished = True
+                        return
+                    if index:
+                        await asyncio.sleep(token_delay)
+                    yield _sse("content_block_delta", {
+                        "type": "content_block_delta", "index": 0,
+                        "delta": {"type": "text_delta", "text": word if index == 0 else " " + word}
+                    })
+                    stats["streamed_tokens"] += 1
+                yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+                yield _sse("message_delta", {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                    "usage": {"output_tokens": output_tokens}
+                })
+                yield _sse("message_stop", {"type": "message_stop"})
+                finished = True
+            finally:
+                stats["open_streams"] -= 1
+                if not finished:
+                    stats["aborted_streams"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/_stats")
+    async def get_stats():
+        return {**stats, "config": asdict(config)}
+
+    return app
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser, prefix: str = "") -> None:
+    """Add FakeConfig options to a parser (with an optional flag prefix such as "fake-")."""
+
+    defaults = FakeConfig()
+    parser.add_argument(f"--{prefix}first-token-latency", type=float, default=defaults.first_token_latency,
+                        help="Seconds before the first token (default: %(default)s)")
+    parser.add_argument(f"--{prefix}tokens-per-second", type=float, default=defaults.tokens_per_second,
+                        help="Streaming output rate (default: %(default)s)")
+    parser.add_argument(f"--{prefix}output-tokens", type=int, default=defaults.output_tokens,
+                        help="Tokens per response, capped at max_tokens (default: %(default)s)")
+    parser.add_argument(f"--{prefix}rate-limit-share", type=float, default=defaults.rate_limit_share,
+                        help="Share of calls answered with 429 (default: %(default)s)")
+    parser.add_argument(f"--{prefix}retry-after", type=float, default=defaults.retry_after,
+                        help="retry-after seconds sent with 429s (default: %(default)s)")
+    parser.add_argument(f"--{prefix}slow-share", type=float, default=defaults.slow_share,
+                        help="Share of calls in the slow tail (default: %(default)s)")
+    parser.add_argument(f"--{prefix}slow-latency", type=float, default=defaults.slow_latency,
+                        help="Seconds before the first token in the slow tail (default: %(default)s)")
+    parser.add_argument(f"--{prefix}error-share", type=float, default=defaults.error_share,
+                        help="Share of calls answered with --error-status (default: %(default)s)")
+    parser.add_argument(f"--{prefix}error-status", type=int, default=defaults.error_status,
+                        help="Status of injected failures (default: %(default)s)")
+    parser.add_argument(f"--{prefix}error-after", type=int, default=defaults.error_after,
+                        help="Fail streams with an error event after this many tokens (default: reject them)")
+
+
+def config_from_args(args, prefix: str = "") -> FakeConfig:
+    attribute = prefix.replace("-", "_")
+    return FakeConfig(
+        first_token_latency=getattr(args, f"{attribute}first_token_latency"),
+        tokens_per_second=getattr(args, f"{attribute}tokens_per_second"),
+        output_tokens=getattr(args, f"{attribute}output_tokens"),
+        rate_limit_share=getattr(args, f"{attribute}rate_limit_share"),
+        retry_after=getattr(args, f"{attribute}retry_after"),
+        slow_share=getattr(args, f"{attribute}slow_share"),
+        slow_latency=getattr(args, f"{attribute}slow_latency"),
+        error_share=getattr(args, f"{attribute}error_share"),
+        error_status=getattr(args, f"{attribute}error_status"),
+        error_after=getattr(args, f"{attribute}error_after")
+    )
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Open-loop load generator for the API.
+
+Sends requests at a fixed target rate (arrivals do not wait for earlier
+responses), so latency includes any time spent queueing behind a slow server.
+Latency is measured from each request's scheduled send time.
+
+Against a running server:
+
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --rps 50 --duration 20
+
+Or self-contained, with the API and a fake upstream in this process, which
+also reports the API's event-loop lag:
+
+    python -m benchmarks.load_test --in-process --fake-upstream --rps 100 -o load.json
+
+Scenarios: `health` (GET /health), `prompt_only` (POST /generate with
+prompt_only) and `generate` (POST /generate against the upstream).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.common import LoopLagMonitor, run_metadata, summarize, write_results
+from benchmarks.fake_anthropic import add_fake_arguments, config_from_args, create_app
+
+SCENARIOS = ("health", "prompt_only", "generate")
+
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client connection; keeps client overhead out of the numbers."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            return await self._exchange(method, path, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.close()
+            raise
+
+    async def _exchange(self, method: str, path: str, body: Optional[bytes]) -> Tuple[int, bytes]:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        self.writer.write(head.encode("latin-1") + b"\r\n" + (body or b""))
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            payload = b"".join(chunks)
+        else:
+            payload = await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, payload
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def scenario_request(scenario: str, index: int, args) -> Tuple[str, str, Optional[bytes]]:
+    if scenario == "health":
+        return "GET", "/health", None
+    topic_index = index % args.topics if args.topics else index
+    payload = {"topic": f"Benchmark topic {topic_index}", "format": args.format}
+    if scenario == "prompt_only":
+        payload["prompt_only"] = True
+    return "POST", "/generate", json.dumps(payload).encode("utf-8")
+
+
+async def run_scenario(scenario: str, host: str, port: int, args) -> dict:
+    loop = asyncio.get_running_loop()
+    pool = asyncio.Queue()
+    for _ in range(args.connections):
+        pool.put_nowait(Connection(host, port))
+
+    latencies = []
+    statuses = Counter()
+    total = max(1, int(args.rps * args.duration))
+    started = loop.time() + 0.05
+
+    async def send(index: int):
+        scheduled = started + index / args.rps
+        await asyncio.sleep(max(0.0, scheduled - loop.time()))
+        connection = await pool.get()
+        method, path, body = scenario_request(scenario, index, args)
+        try:
+            status, _ = await connection.request(method, path, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            status = type(exc).__name__
+        finally:
+            pool.put_nowait(connection)
+        latencies.append((loop.time() - scheduled) * 1000)
+        statuses[str(status)] += 1
+
+    lag = LoopLagMonitor()
+    lag_task = asyncio.create_task(lag.run())
+    try:
+        await asyncio.gather(*(send(index) for index in range(total)))
+    finally:
+        lag_task.cancel()
+    elapsed = loop.time() - started
+
+    while not pool.empty():
+        pool.get_nowait().close()
+
+    ok = statuses.get("200", 0)
+    return {
+        "requests": total,
+        "ok": ok,
+        "errors": total - ok,
+        "statuses": dict(statuses),
+        "target_rps": args.rps,
+        "throughput_rps": ok / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": summarize(latencies),
+        "client_loop_lag_ms": lag.summary()
+    }
+
+
+class ServerThread(threading.Thread):
+    """Runs an ASGI app under uvicorn on its own event loop, sampling that loop's lag."""
+
+    def __init__(self, app, port: int):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.lag = LoopLagMonitor()
+
+    def run(self):
+        async def serve():
+            lag_task = asyncio.create_task(self.lag.run())
+            try:
+                await self.server.serve()
+            finally:
+                lag_task.cancel()
+
+        asyncio.run(serve())
+
+    def start_and_wait(self) -> None:
+        self.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the content API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL (default: %(default)s)")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Scenario to run; repeat for several (default: all)")
+    parser.add_argument("--rps", type=float, default=50, help="Target requests per second (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario (default: %(default)s)")
+    parser.add_argument("--connections", type=int, default=64,
+                        help="Maximum concurrent connections (default: %(default)s)")
+    parser.add_argument("--format", default="article", help="Content format for /generate (default: %(default)s)")
+    parser.add_argument("--topics", type=int, default=0,
+                        help="Cycle through this many distinct topics (default: every request unique)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Serve api:app from this process and report its event-loop lag")
+    parser.add_argument("--port", type=int, default=8001, help="Port for --in-process (default: %(default)s)")
+    parser.add_argument("--fake-upstream", action="store_true",
+                        help="Serve a fake Messages API from this process and point the API at it")
+    parser.add_argument("--fake-port", type=int, default=8765, help="Port for --fake-upstream (default: %(default)s)")
+    add_fake_arguments(parser, prefix="fake-")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    threads = []
+    if args.fake_upstream:
+        fake = ServerThread(create_app(config_from_args(args, prefix="fake-")), args.fake_port)
+        fake.start_and_wait()
+        threads.append(fake)
+        os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{args.fake_port}"
+        os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+        # Keep the scheduler's account limits out of the way of the fake upstream
+        for name in ("BENOVITZ_RPM", "BENOVITZ_INPUT_TPM", "BENOVITZ_OUTPUT_TPM"):
+            os.environ.setdefault(name, "1000000000")
+
+    server = None
+    if args.in_process:
+        from api import app
+
+        server = ServerThread(app, args.port)
+        server.start_and_wait()
+        threads.append(server)
+        host, port = "127.0.0.1", args.port
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+
+    results = {"benchmark": "load", "meta": run_metadata(args), "scenarios": {}}
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            if server is not None:
+                server.lag.samples.clear()
+            result = asyncio.run(run_scenario(scenario, host, port, args))
+            if server is not None:
+                result["server_loop_lag_ms"] = server.lag.summary()
+            results["scenarios"][scenario] = result
+
+            latency = result["latency_ms"]
+            print(
+                f"{scenario:12} {result['throughput_rps']:8.1f} req/s  "
+                f"p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  p99 {latency['p99']:8.1f} ms  "
+                f"errors {result['errors']}"
+            )
+            if "server_loop_lag_ms" in result:
+                lag = result["server_loop_lag_ms"]
+                print(f"{'':12} server loop lag p50 {lag['p50']:.2f} ms  p99 {lag['p99']:.2f} ms  max {lag['max']:.2f} ms")
+    finally:
+        for thread in reversed(threads):
+            thread.stop()
+
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,16 +12,73 @@ Author: Built with Claude
 """
 
 import argparse
+import contextlib
+import hashlib
+import json
 import os
 import sys
+import threading
+import time
 from enum import Enum
-from dataclasses import dataclass
-from typing import Optional
-
-try:
-    import anthropic
-except ImportError:
-    anthropic = None
+from dataclasses import dataclass, fields, replace
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional, Tuple, Union
+
+import metrics
+from coalescing import SingleFlight
+from generation_archive import get_archive
+from generation_cache import cache_key, get_generation_cache
+from hedging import FALLBACK_CALLS, HedgedStream, get_circuit_breaker, get_hedge_policy
+from lazy_imports import lazy_import
+from length_guard import new_length_guard, record_length
+from model_routing import DEFAULT_MAX_TOKENS, DEFAULT_MODEL, ModelRoute, resolve_route
+from rate_limiter import (
+    BATCH,
+    INTERACTIVE,
+    UpstreamOverloaded,
+    get_scheduler,
+    is_overloaded,
+    is_upstream_failure,
+)
+from similarity_index import SIMILAR_REUSED, get_similarity_index
+from token_budget import (
+    Compaction,
+    compact_context,
+    estimate_tokens,
+    get_compaction_policy,
+    get_usage_model,
+    record_compaction,
+)
+
+# Only generations need the event loop; prompt-only runs never load asyncio
+asyncio = lazy_import("asyncio")
+
+# The Anthropic SDK (with its HTTP and pydantic stack) takes longer to import
+# than everything else here combined, so it is loaded on first real generation;
+# prompt-only, --show-voice-profile and --help runs never pay for it.
+_anthropic = None
+
+
+def load_anthropic():
+    """Import and return the anthropic package on first use, or None when it is not installed."""
+
+    global _anthropic
+    if _anthropic is None:
+        try:
+            import anthropic
+        except ImportError:
+            return None
+        _anthropic = anthropic
+    return _anthropic
+
+
+# Connection pool settings for the shared Anthropic clients
+HTTP_MAX_CONNECTIONS = int(os.environ.get("BENOVITZ_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("BENOVITZ_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("BENOVITZ_HTTP_KEEPALIVE_EXPIRY", "30"))
+
+_sync_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
 
 
 class ContentFormat(Enum):
@@ -163,11 +220,8 @@ def get_system_prompt(voice: BenovitzVoiceProfile) -> str:
 Write as if you ARE Rabbi Moshe Benovitz, drawing from decades of experience running NCSY Kollel, working with Jewish teens, and building the next generation of Jewish leaders. The content should feel like it comes from someone who has seen transformation happen and knows what truly works in Jewish education and kiruv."""
 
 
-def get_format_instructions(format_type: ContentFormat) -> str:
-    """Get specific instructions for each content format."""
-
-    instructions = {
-        ContentFormat.ARTICLE: """
+FORMAT_INSTRUCTIONS = {
+    ContentFormat.ARTICLE: """
 ## FORMAT: Long-Form Article/Essay
 
 Structure your article as follows:
@@ -199,7 +253,7 @@ Structure your article as follows:
 Target length: 800-1200 words
 """,
 
-        ContentFormat.SOCIAL_MEDIA: """
+    ContentFormat.SOCIAL_MEDIA: """
 ## FORMAT: Social Media Post
 
 Create an engaging social media post with:
@@ -218,7 +272,7 @@ Style notes:
 Example hashtags: #NCSY #JewishEducation #Torah #TeenLeadership #JewishGrowth #NCSYKollel
 """,
 
-        ContentFormat.SHIUR_OUTLINE: """
+    ContentFormat.SHIUR_OUTLINE: """
 ## FORMAT: Shiur/Lecture Outline (NCSY Kollel Style)
 
 Structure your shiur outline as follows:
@@ -251,7 +305,7 @@ Structure your shiur outline as follows:
 - One powerful sentence or question to remember
 """,
 
-        ContentFormat.SHORT_REFLECTION: """
+    ContentFormat.SHORT_REFLECTION: """
 ## FORMAT: Short Reflection/Daily Wisdom
 
 Create a brief, impactful reflection:
@@ -270,7 +324,7 @@ Total length: 75-150 words
 Tone: Thoughtful, warm, slightly provocative
 """,
 
-        ContentFormat.ADVISOR_TRAINING: """
+    ContentFormat.ADVISOR_TRAINING: """
 ## FORMAT: Advisor/Educator Training Content
 
 Create training content for NCSY advisors or Jewish educators:
@@ -297,52 +351,1041 @@ Create training content for NCSY advisors or Jewish educators:
 **Your Challenge**
 - Specific action step or mindset shift
 """
+}
+
+
+def get_format_instructions(format_type: ContentFormat) -> str:
+    """Get specific instructions for each content format."""
+
+    return FORMAT_INSTRUCTIONS.get(format_type, FORMAT_INSTRUCTIONS[ContentFormat.ARTICLE])
+
+
+PROMPT_CONTEXT_LABEL = "**Additional Context/Notes**: "
+
+
+def json_escape(text: str) -> bytes:
+    """`text` escaped as the inside of a JSON string (compact, non-ASCII kept as UTF-8)."""
+
+    return json.dumps(text, ensure_ascii=False)[1:-1].encode("utf-8", "replace")
+
+
+_JSON_PARAGRAPH_BREAK = json_escape("\n\n")
+_JSON_CONTEXT_LABEL = json_escape(PROMPT_CONTEXT_LABEL)
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A format's complete prompt_only prompt, rendered once around its two
+    per-request slots. `head` runs up to the topic and `tail` follows the
+    optional context; `json_head` and `json_tail` hold the same text already
+    escaped for a JSON string, so response writers only escape the topic and
+    context per request.
+    """
+
+    head: str
+    tail: str
+    json_head: bytes
+    json_tail: bytes
+
+    @classmethod
+    def build(cls, system_prompt: str, format_instructions: str) -> "PromptTemplate":
+        head = f"""=== SYSTEM INSTRUCTIONS ===
+{system_prompt}
+
+=== FORMAT INSTRUCTIONS ===
+{format_instructions}
+
+=== USER REQUEST ===
+Please write content on the following topic:
+
+**Topic**: """
+        tail = "\n\nWrite this content now in the authentic voice of Rabbi Moshe Benovitz."
+        return cls(head, tail, json_escape(head), json_escape(tail))
+
+    def render(self, topic: str, additional_context: str = "") -> str:
+        context = PROMPT_CONTEXT_LABEL + additional_context if additional_context else ""
+        return "".join((self.head, topic, "\n\n", context, self.tail))
+
+    def json_fragments(self, topic: str, additional_context: str = "") -> List[bytes]:
+        """The rendered prompt as JSON-escaped byte fragments, static parts shared rather than copied."""
+
+        fragments = [self.json_head, json_escape(topic), _JSON_PARAGRAPH_BREAK]
+        if additional_context:
+            fragments += (_JSON_CONTEXT_LABEL, json_escape(additional_context))
+        fragments.append(self.json_tail)
+        return fragments
+
+
+@dataclass(frozen=True)
+class CompiledPrompts:
+    """Prompt strings rendered once for a specific voice profile version."""
+
+    profile_hash: str
+    prompt_hash: str
+    system_prompt: str
+    format_instructions: dict
+    user_prompt_prefixes: dict
+    prompt_templates: dict
+    voice_profile: dict
+    # Estimated tokens of the system prompt and of each format's user prefix
+    system_tokens: int
+    user_prefix_tokens: dict
+
+    @property
+    def etag(self) -> str:
+        # The prompt text changes with template and format-instruction edits, not only with the profile
+        return f'"{self.prompt_hash}"'
+
+
+# Compiled prompts keyed by the voice profile's field values; a changed profile
+# produces a new key, so stale renders are never served.
+MAX_COMPILED_PROFILES = 8
+_compiled_prompts = {}
+_compiled_prompts_lock = threading.Lock()
+_default_voice = BenovitzVoiceProfile()
+
+
+def voice_profile_hash(voice: BenovitzVoiceProfile) -> str:
+    """Stable content hash of a voice profile, used to version compiled prompts."""
+
+    digest = hashlib.sha256()
+    for field in fields(voice):
+        digest.update(field.name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(getattr(voice, field.name)).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def compile_prompts(voice: BenovitzVoiceProfile) -> CompiledPrompts:
+    """Render every prompt string that depends only on the voice profile."""
+
+    system_prompt = get_system_prompt(voice)
+    format_instructions = {fmt: get_format_instructions(fmt) for fmt in ContentFormat}
+    user_prompt_prefixes = {fmt: build_user_prompt_prefix(fmt) for fmt in ContentFormat}
+
+    # Hash of the exact static prompt text, so cached generations are
+    # invalidated by template edits as well as by profile changes
+    prompt_digest = hashlib.sha256(system_prompt.encode("utf-8"))
+    for fmt in ContentFormat:
+        prompt_digest.update(user_prompt_prefixes[fmt].encode("utf-8"))
+
+    return CompiledPrompts(
+        profile_hash=voice_profile_hash(voice),
+        prompt_hash=prompt_digest.hexdigest()[:32],
+        system_prompt=system_prompt,
+        format_instructions=format_instructions,
+        user_prompt_prefixes=user_prompt_prefixes,
+        prompt_templates={
+            fmt: PromptTemplate.build(system_prompt, format_instructions[fmt]) for fmt in ContentFormat
+        },
+        voice_profile={
+            "name": voice.name,
+            "tone": voice.tone.strip(),
+            "style_patterns": voice.style_patterns.strip(),
+            "themes": voice.themes.strip(),
+            "influences": voice.influences.strip(),
+            "hebrew_vocabulary": voice.hebrew_vocabulary.strip(),
+            "transitions": voice.transitions.strip()
+        },
+        system_tokens=estimate_tokens(system_prompt),
+        user_prefix_tokens={fmt: estimate_tokens(user_prompt_prefixes[fmt]) for fmt in ContentFormat}
+    )
+
+
+def get_compiled_prompts(voice: Optional[BenovitzVoiceProfile] = None) -> CompiledPrompts:
+    """Return the compiled prompts for a voice profile, rendering them on first use."""
+
+    voice = voice or _default_voice
+    key = tuple(getattr(voice, field.name) for field in fields(voice))
+
+    compiled = _compiled_prompts.get(key)
+    if compiled is None:
+        compiled = compile_prompts(voice)
+        with _compiled_prompts_lock:
+            if len(_compiled_prompts) >= MAX_COMPILED_PROFILES:
+                _compiled_prompts.pop(next(iter(_compiled_prompts)))
+            _compiled_prompts[key] = compiled
+    return compiled
+
+
+def _connection_limits():
+    """Build connection limits using the same type the SDK uses for its defaults."""
+
+    limits_type = type(load_anthropic().DEFAULT_CONNECTION_LIMITS)
+    return limits_type(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def get_client(api_key: str):
+    """Return the process-wide Anthropic client for an API key, creating it on first use."""
+
+    with _clients_lock:
+        client = _sync_clients.get(api_key)
+        if client is None:
+            anthropic = load_anthropic()
+            client = anthropic.Anthropic(
+                api_key=api_key,
+                http_client=anthropic.DefaultHttpxClient(limits=_connection_limits())
+            )
+            _sync_clients[api_key] = client
+        return client
+
+
+def get_async_client(api_key: str):
+    """Return the process-wide AsyncAnthropic client for an API key, creating it on first use."""
+
+    with _clients_lock:
+        client = _async_clients.get(api_key)
+        if client is None:
+            # Retries are left to the rate-limit scheduler
+            anthropic = load_anthropic()
+            client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                max_retries=0,
+                http_client=anthropic.DefaultAsyncHttpxClient(limits=_connection_limits())
+            )
+            _async_clients[api_key] = client
+        return client
+
+
+async def warm_clients(api_key: str, connections: int = 2, timeout: float = 5.0) -> None:
+    """
+    Create the pooled async client for `api_key` and open up to `connections`
+    keep-alive connections with a cheap model-list call, so the first
+    generations skip the TCP/TLS handshake. Failures are ignored.
+    """
+
+    if load_anthropic() is None:
+        return
+    client = get_async_client(api_key)
+    models = getattr(client, "models", None)
+    if models is None or connections <= 0:
+        return
+    with contextlib.suppress(Exception):
+        await asyncio.wait_for(
+            asyncio.gather(*(models.list(limit=1) for _ in range(connections)), return_exceptions=True),
+            timeout
+        )
+
+
+def close_clients() -> None:
+    """Close every cached sync client."""
+
+    with _clients_lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_clients() -> None:
+    """Close every cached client; call this on application shutdown."""
+
+    with _clients_lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.close()
+    close_clients()
+
+
+# Marks the end of a prompt prefix that Anthropic may cache between requests
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+@dataclass
+class GenerationResult:
+    """Generated text plus the token usage reported by the API."""
+
+    content: str
+    model: str = DEFAULT_MODEL
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cached: bool = False
+    coalesced: bool = False
+    # Close prior generations found on a cache miss, and the one answered with, if any
+    similar: Optional[List[dict]] = None
+    reused_from: Optional[dict] = None
+    # Length guard report for fresh generations: words, target, stop reason, missing sections
+    length: Optional[dict] = None
+    # Stage timings in milliseconds; ttft_ms stays None until a text delta arrives
+    latency_ms: float = 0.0
+    prompt_ms: float = 0.0
+    queue_ms: float = 0.0
+    ttft_ms: Optional[float] = None
+    model_ms: float = 0.0
+
+    def usage(self) -> dict:
+        """Token usage counts, including prompt cache writes (misses) and reads (hits)."""
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+        }
+
+
+def build_user_prompt_prefix(format_type: ContentFormat) -> str:
+    """Build the static, cacheable part of the user message."""
+
+    format_instructions = get_format_instructions(format_type)
+
+    return f"""Please write content in the following format:
+
+{format_instructions}"""
+
+
+def build_user_prompt_suffix(topic: str, additional_context: str = "") -> str:
+    """Build the per-request part of the user message."""
+
+    return f"""**Topic**: {topic}
+
+{f"**Additional Context/Notes**: {additional_context}" if additional_context else ""}
+
+Write this content now in the authentic voice of Rabbi Moshe Benovitz."""
+
+
+def build_user_prompt(
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str = ""
+) -> str:
+    """Build the full user message sent alongside the system prompt."""
+
+    prefix = get_compiled_prompts().user_prompt_prefixes[format_type]
+    return prefix + "\n\n" + build_user_prompt_suffix(topic, additional_context)
+
+
+def build_message_request(
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str = "",
+    route: Optional[ModelRoute] = None
+) -> dict:
+    """
+    Build the keyword arguments for messages.create / messages.stream.
+
+    The system prompt and format instructions form a static prefix with
+    cache-control breakpoints, so repeat requests read them from Anthropic's
+    prompt cache; only the topic and context are processed fresh. Model,
+    max_tokens, temperature and timeout come from `route` (default: the
+    format's route). `timeout` is a client option, so use batch_params() to
+    turn the request into Message Batches params, and sdk_params() for the
+    SDK's messages calls. The additional context is compacted first (see
+    compact_additional_context).
+    """
+
+    compiled = get_compiled_prompts()
+    route = route or resolve_route(format_type.value)
+    compaction = compact_additional_context(additional_context)
+    if compaction.text != additional_context:
+        record_compaction(compaction)
+        additional_context = compaction.text
+
+    request = {
+        "model": route.model,
+        "max_tokens": route.max_tokens,
+        "timeout": route.timeout,
+        "system": [
+            {"type": "text", "text": compiled.system_prompt, "cache_control": CACHE_CONTROL}
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": compiled.user_prompt_prefixes[format_type], "cache_control": CACHE_CONTROL},
+                    {"type": "text", "text": build_user_prompt_suffix(topic, additional_context)}
+                ]
+            }
+        ]
     }
+    if route.temperature is not None:
+        request["temperature"] = route.temperature
+    return request
+
+
+def compact_additional_context(additional_context: str) -> Compaction:
+    """
+    Additional context as it is sent upstream: whitespace collapsed, repeats
+    dropped and cut to BENOVITZ_CONTEXT_MAX_TOKENS, unless compaction is off.
+    """
+
+    policy = get_compaction_policy()
+    if policy is None or not additional_context:
+        tokens = estimate_tokens(additional_context)
+        return Compaction(additional_context, tokens, tokens)
+    return compact_context(additional_context, policy)
+
+
+def estimated_input_tokens(request: dict, format_type: ContentFormat) -> int:
+    """Offline input-token estimate for a request built by build_message_request."""
+
+    compiled = get_compiled_prompts()
+    return (
+        compiled.system_tokens
+        + compiled.user_prefix_tokens[format_type]
+        + estimate_tokens(request["messages"][0]["content"][1]["text"])
+    )
+
+
+def sdk_params(request: dict) -> dict:
+    """
+    Keyword arguments for messages.create / messages.stream. Some SDK releases
+    in the supported range (1.13 among them) take no `temperature` keyword,
+    so it is sent through `extra_body`, which every release merges into the body.
+    """
+
+    if "temperature" not in request:
+        return request
+    params = {key: value for key, value in request.items() if key != "temperature"}
+    params["extra_body"] = {"temperature": request["temperature"]}
+    return params
+
+
+def batch_params(request: dict) -> dict:
+    """Message Batches params for a request built by build_message_request."""
+
+    return {key: value for key, value in request.items() if key != "timeout"}
+
+
+def _apply_usage(result: GenerationResult, usage) -> GenerationResult:
+    """Copy token counts from an API usage object onto a result."""
+
+    result.input_tokens = usage.input_tokens or 0
+    result.output_tokens = usage.output_tokens or 0
+    result.cache_creation_input_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+    result.cache_read_input_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+    return result
+
+
+def _generation_cache_key(
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str,
+    request: dict,
+    variant: int = 0
+) -> str:
+    """Response-cache key for a request built by build_message_request."""
+
+    return cache_key(
+        topic,
+        format_type.value,
+        additional_context,
+        request["model"],
+        get_compiled_prompts().prompt_hash,
+        request["max_tokens"],
+        variant,
+        request.get("temperature")
+    )
+
+
+def _cached_result(key: str, cache: str) -> Optional[GenerationResult]:
+    """Look up a finished generation unless the cache mode skips reads."""
+
+    generation_cache = get_generation_cache()
+    if generation_cache is None or cache != "use":
+        return None
+    value = generation_cache.get(key)
+    if value is None:
+        return None
+    return GenerationResult(cached=True, **value)
+
+
+def _store_result(key: str, result: GenerationResult, cache: str) -> None:
+    """Store a finished generation unless the cache is bypassed."""
+
+    generation_cache = get_generation_cache()
+    if generation_cache is None or cache == "bypass":
+        return
+    generation_cache.set(key, {"content": result.content, "model": result.model, **result.usage()})
+
+
+async def _off_loop(function, *args):
+    """Run a cache helper in a thread when the response cache blocks on disk I/O."""
+
+    generation_cache = get_generation_cache()
+    if generation_cache is not None and generation_cache.blocking:
+        return await asyncio.to_thread(function, *args)
+    return function(*args)
+
+
+def _similar_generations(
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str,
+    cache: str,
+    reuse_similar: bool = False
+) -> Tuple[Optional[List[dict]], Optional[GenerationResult]]:
+    """
+    Prior generations resembling a request that missed the response cache.
+
+    With `reuse_similar` (and cache "use"), the closest match still in the
+    response cache is also returned as the result, instead of generating.
+    """
+
+    index = get_similarity_index()
+    if index is None or cache == "bypass":
+        return None, None
+
+    matches = index.search(topic, format_type.value, additional_context)
+    similar = [match.to_dict() for match in matches]
+
+    generation_cache = get_generation_cache()
+    if reuse_similar and cache == "use" and generation_cache is not None:
+        for match in matches:
+            value = generation_cache.get(match.key)
+            if value is not None:
+                SIMILAR_REUSED.inc()
+                return similar, GenerationResult(cached=True, similar=similar, reused_from=match.to_dict(), **value)
+    return similar, None
+
 
-    return instructions.get(format_type, instructions[ContentFormat.ARTICLE])
+def _remember_generation(
+    key: str,
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str,
+    cache: str
+) -> None:
+    """Index a generation stored under `key` so paraphrased requests can find it."""
+
+    index = get_similarity_index()
+    if index is None or cache == "bypass":
+        return
+    index.add(key, topic, format_type.value, additional_context)
+
+
+def _record_generation(
+    key: str,
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str,
+    result: GenerationResult,
+    cache: str,
+    variant: int = 0,
+    request: Optional[dict] = None
+) -> None:
+    """
+    Cache a fresh generation, index its request for similarity lookups, queue
+    it for the archive and, given its `request`, fold its usage into the
+    estimator.
+    """
+
+    _store_result(key, result, cache)
+    if variant == 0:
+        _remember_generation(key, topic, format_type, additional_context, cache)
+    if request is not None:
+        get_usage_model().observe(
+            result.model, format_type.value, estimated_input_tokens(request, format_type), result
+        )
+
+    archive = get_archive()
+    if archive is not None:
+        archive.record({
+            "topic": topic,
+            "format": format_type.value,
+            "additional_context": additional_context,
+            "content": result.content,
+            "model": result.model,
+            "variant": variant,
+            "ttft_ms": result.ttft_ms,
+            "model_ms": result.model_ms,
+            **result.usage()
+        })
+
+
+def _record_cancelled(format_type: ContentFormat, request: dict, received: str) -> None:
+    """
+    Count a generation cancelled because every caller went away, with the
+    output tokens it had streamed and the rest of its expected output saved.
+    """
+
+    generated = estimate_tokens(received)
+    expected = get_usage_model().output_tokens(format_type.value, request["max_tokens"])
+    metrics.record_cancelled(
+        format_type.value, "streaming" if received else "waiting", generated, max(0, expected - generated)
+    )
+
+
+def _result_from_message(message) -> GenerationResult:
+    return _apply_usage(GenerationResult(message.content[0].text, model=message.model), message.usage)
+
+
+def _finish_result(result: GenerationResult, message, guard, format_type: ContentFormat) -> GenerationResult:
+    """
+    Fill in content, model and usage from a finished stream's message, or from
+    the partial message of a stream the length guard stopped, whose output
+    tokens are estimated from the text received.
+    """
+
+    result.model = message.model
+    _apply_usage(result, message.usage)
+    if guard is None:
+        result.content = message.content[0].text
+        return result
+
+    result.content = guard.content
+    if guard.stopped:
+        result.output_tokens = max(result.output_tokens, estimate_tokens(guard.received))
+    result.length = guard.report()
+    record_length(format_type.value, result.length)
+    return result
 
 
 def generate_content_with_claude(
     topic: str,
     format_type: ContentFormat,
     api_key: Optional[str] = None,
-    additional_context: str = ""
+    additional_context: str = "",
+    cache: str = "use",
+    route: Optional[ModelRoute] = None,
+    reuse_similar: bool = False
 ) -> str:
-    """Generate content using Claude API."""
+    """
+    Generate content using Claude API.
+
+    `cache` is "use" (read and write the response cache), "refresh" (skip the
+    read, store the new result) or "bypass" (leave the cache untouched). With
+    `reuse_similar`, a cached generation for a paraphrase of the request is
+    returned instead of generating.
+    """
 
-    if anthropic is None:
+    if load_anthropic() is None:
         return "Error: anthropic package not installed. Run: pip install anthropic"
 
     api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
     if not api_key:
         return "Error: No API key provided. Set ANTHROPIC_API_KEY environment variable or pass --api-key"
 
-    client = anthropic.Anthropic(api_key=api_key)
-    voice = BenovitzVoiceProfile()
+    request = build_message_request(topic, format_type, additional_context, route)
+    key = _generation_cache_key(topic, format_type, additional_context, request)
+    cached = _cached_result(key, cache) or _similar_generations(
+        topic, format_type, additional_context, cache, reuse_similar
+    )[1]
+    if cached is not None:
+        return cached.content
+
+    client = get_client(api_key)
+    result = _result_from_message(client.messages.create(**sdk_params(request)))
+    # Already generated in full, so the guard only reports
+    guard = new_length_guard(format_type.value, stop=False)
+    if guard is not None:
+        guard.feed(result.content)
+        guard.close()
+        result.length = guard.report()
+        record_length(format_type.value, result.length)
+    _record_generation(key, topic, format_type, additional_context, result, cache, request=request)
+
+    return result.content
+
+
+async def _attempt_upstream(
+    api_key: str,
+    request: dict,
+    format_type: ContentFormat,
+    result: GenerationResult,
+    limiter=None,
+    priority: int = INTERACTIVE
+) -> AsyncIterator[str]:
+    """
+    Run one upstream streaming attempt, yielding text deltas.
+
+    Waits for the rate-limit scheduler at `priority` and then on `limiter` (an
+    optional async context manager), retrying rejected attempts with backoff as
+    long as no text has been yielded yet. Records the queue, time-to-first-token
+    and model timings on `result`, and fills in the final content and usage once
+    the stream completes. Cancelling the attempt closes the upstream stream,
+    which stops the generation, and returns its unused reservation.
+    """
 
-    system_prompt = get_system_prompt(voice)
-    format_instructions = get_format_instructions(format_type)
+    scheduler = get_scheduler()
+    breaker = get_circuit_breaker()
+    input_estimate = estimated_input_tokens(request, format_type)
+    # Reserve the output the format usually needs rather than the max_tokens ceiling
+    output_estimate = get_usage_model().output_tokens(format_type.value, request["max_tokens"])
+    queued = time.perf_counter()
+    attempt = 0
+    guard = None
+
+    while True:
+        reservation = await scheduler.acquire(priority, input_estimate, output_estimate)
+        sent = False
+        received = []
+        try:
+            async with limiter or contextlib.nullcontext():
+                started = time.perf_counter()
+                result.queue_ms = (started - queued) * 1000
+                client = get_async_client(api_key)
+                guard = new_length_guard(format_type.value)
+
+                try:
+                    sent = True
+                    async with client.messages.stream(**sdk_params(request)) as stream:
+                        async for text in stream.text_stream:
+                            received.append(text)
+                            if result.ttft_ms is None:
+                                result.ttft_ms = (time.perf_counter() - started) * 1000
+                                get_hedge_policy().observe(request["model"], result.ttft_ms / 1000)
+                            if guard is None:
+                                yield text
+                                continue
+                            text = guard.feed(text)
+                            if text:
+                                yield text
+                            if guard.stopped:
+                                # Leaving the stream closes the response, which ends the generation
+                                break
+                        if guard is not None and guard.stopped:
+                            message = stream.current_message_snapshot
+                        else:
+                            message = await stream.get_final_message()
+                            if guard is not None:
+                                tail = guard.close()
+                                if tail:
+                                    yield tail
+                except Exception as exc:
+                    if result.ttft_ms is None:
+                        delay = scheduler.fail(reservation, exc, attempt)
+                    else:
+                        # Text was already yielded, so the attempt cannot be retried: settle what it generated
+                        scheduler.back_off(exc, attempt)
+                        scheduler.cancel(reservation, input_estimate, estimate_tokens("".join(received)))
+                        delay = None
+                    if delay is None:
+                        metrics.record_error(format_type.value, exc)
+                        # A rejected request (bad key, invalid parameters) says nothing about the model's health
+                        if is_upstream_failure(exc):
+                            breaker.record_failure(request["model"])
+                        if is_overloaded(exc):
+                            raise UpstreamOverloaded(f"Upstream overloaded: {exc}", scheduler.retry_after_hint()) from exc
+                        raise
+                else:
+                    result.model_ms = (time.perf_counter() - started) * 1000
+                    break
+        except (asyncio.CancelledError, GeneratorExit):
+            # Closing the stream on the way out aborts the upstream generation
+            scheduler.cancel(reservation, input_estimate if sent else 0, estimate_tokens("".join(received)))
+            raise
+
+        attempt += 1
+        await asyncio.sleep(delay)
+
+    _finish_result(result, message, guard, format_type)
+    scheduler.complete(reservation, result.input_tokens, result.output_tokens)
+    breaker.record_success(request["model"])
+
+
+async def _stream_upstream(
+    api_key: str,
+    request: dict,
+    format_type: ContentFormat,
+    result: GenerationResult,
+    limiter=None,
+    priority: int = INTERACTIVE,
+    fallback_model: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Run one upstream call, yielding text deltas and filling in `result`.
 
-    user_prompt = f"""Please write content on the following topic:
+    While the model's circuit breaker is open the call goes to `fallback_model`
+    instead. With hedging enabled, a call whose first token is later than the
+    hedge deadline races a second attempt (on `fallback_model` if given) and the
+    first to stream wins.
+    """
 
-**Topic**: {topic}
+    if fallback_model and not get_circuit_breaker().allow(request["model"]):
+        FALLBACK_CALLS.inc(model=fallback_model)
+        request = {**request, "model": fallback_model}
 
-{format_instructions}
+    policy = get_hedge_policy()
+    if not policy.enabled:
+        async for text in _attempt_upstream(api_key, request, format_type, result, limiter, priority):
+            yield text
+        return
 
-{f"**Additional Context/Notes**: {additional_context}" if additional_context else ""}
+    results = {}
 
-Write this content now in the authentic voice of Rabbi Moshe Benovitz."""
+    def attempt(name: str, attempt_request: dict):
+        def start() -> AsyncIterator[str]:
+            results[name] = GenerationResult("")
+            return _attempt_upstream(api_key, attempt_request, format_type, results[name], limiter, priority)
+        return start
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2000,
-        messages=[
-            {"role": "user", "content": user_prompt}
-        ],
-        system=system_prompt
+    hedge_request = {**request, "model": fallback_model} if fallback_model else request
+    hedged = HedgedStream(
+        attempt("primary", request),
+        attempt("hedge", hedge_request),
+        policy.deadline(request["model"]),
+        policy.measure_timeout
     )
+    async for text in hedged.stream():
+        yield text
+
+    winner = results[hedged.winner]
+    for field in fields(winner):
+        setattr(result, field.name, getattr(winner, field.name))
+    if hedged.winner == "hedge":
+        # Stage timings are relative to the first attempt, as the caller saw them
+        result.queue_ms += hedged.hedge_delay * 1000
+
+
+# Identical concurrent generations share a single upstream call
+_in_flight = SingleFlight()
 
-    return message.content[0].text
+
+def _upstream_producer(
+    api_key: str,
+    request: dict,
+    format_type: ContentFormat,
+    key: str,
+    cache: str,
+    limiter=None,
+    priority: int = INTERACTIVE,
+    fallback_model: Optional[str] = None,
+    topic: str = "",
+    additional_context: str = "",
+    variant: int = 0
+):
+    """
+    Build the single-flight producer that runs one upstream call and records
+    its result (cache, similarity index and archive).
+    """
+
+    async def produce(emit) -> GenerationResult:
+        result = GenerationResult("")
+        received = []
+        try:
+            async for text in _stream_upstream(api_key, request, format_type, result, limiter, priority, fallback_model):
+                received.append(text)
+                emit(text)
+        except asyncio.CancelledError:
+            _record_cancelled(format_type, request, "".join(received))
+            raise
+        await _off_loop(
+            _record_generation, key, topic, format_type, additional_context, result, cache, variant, request
+        )
+        return result
+
+    return produce
+
+
+async def generate_content_with_claude_async(
+    topic: str,
+    format_type: ContentFormat,
+    api_key: Optional[str] = None,
+    additional_context: str = "",
+    cache: str = "use",
+    variant: int = 0,
+    limiter=None,
+    priority: int = INTERACTIVE,
+    route: Optional[ModelRoute] = None,
+    reuse_similar: bool = False
+) -> GenerationResult:
+    """
+    Generate content using the async Claude client without blocking the event loop.
+
+    `variant` distinguishes otherwise identical requests in the response cache,
+    so each of several alternative drafts is cached on its own. `limiter` is an
+    optional async context manager held around the upstream call only, so cache
+    hits never wait for a slot. `priority` (INTERACTIVE or BATCH) orders the call
+    in the rate-limit scheduler; raises UpstreamOverloaded when shed. `route`
+    overrides the format's model route. On a cache miss, the first variant lists
+    similar prior generations and, with `reuse_similar`, answers with the closest.
+    """
+
+    if load_anthropic() is None:
+        return GenerationResult("Error: anthropic package not installed. Run: pip install anthropic")
+
+    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        return GenerationResult("Error: No API key provided. Set ANTHROPIC_API_KEY environment variable or pass --api-key")
+
+    started = time.perf_counter()
+    route = route or resolve_route(format_type.value)
+    request = build_message_request(topic, format_type, additional_context, route)
+    key = _generation_cache_key(topic, format_type, additional_context, request, variant)
+    prompt_ms = (time.perf_counter() - started) * 1000
+    result = await _off_loop(_cached_result, key, cache)
+    similar = None
+    if result is None and variant == 0:
+        similar, result = await _off_loop(
+            _similar_generations, topic, format_type, additional_context, cache, reuse_similar
+        )
+
+    if result is None:
+        producer = _upstream_producer(
+            api_key, request, format_type, key, cache, limiter, priority, route.fallback_model,
+            topic, additional_context, variant
+        )
+        async with _in_flight.attach(key, producer) as (flight, leader):
+            result = replace(await flight.wait(), coalesced=not leader, similar=similar)
+
+    result.prompt_ms = prompt_ms
+    result.latency_ms = (time.perf_counter() - started) * 1000
+    metrics.observe_generation(format_type.value, result)
+    return result
+
+
+async def generate_variants_async(
+    topic: str,
+    format_type: ContentFormat,
+    api_key: Optional[str] = None,
+    additional_context: str = "",
+    variants: int = 1,
+    cache: str = "use",
+    limiter=None,
+    route: Optional[ModelRoute] = None,
+    reuse_similar: bool = False
+) -> List[GenerationResult]:
+    """
+    Generate several alternative drafts of one request concurrently.
+
+    All variants share the cacheable prompt prefix, so total latency is close to
+    that of a single call. `limiter` is an optional async context manager held
+    around each upstream call. `reuse_similar` applies to the first draft.
+    """
+
+    return list(await asyncio.gather(*(
+        generate_content_with_claude_async(
+            topic, format_type, api_key, additional_context,
+            cache=cache, variant=variant, limiter=limiter, route=route, reuse_similar=reuse_similar
+        )
+        for variant in range(variants)
+    )))
+
+
+def format_variants(results: List[GenerationResult]) -> str:
+    """Render generated variants as the numbered blocks the CLI prints."""
+
+    return "\n\n".join(
+        f"=== Variant {number} ({variant.latency_ms:.0f} ms, {variant.output_tokens} output tokens) ===\n\n{variant.content}"
+        for number, variant in enumerate(results, 1)
+    )
+
+
+def stream_content_with_claude(
+    topic: str,
+    format_type: ContentFormat,
+    api_key: Optional[str] = None,
+    additional_context: str = "",
+    cache: str = "use",
+    route: Optional[ModelRoute] = None,
+    reuse_similar: bool = False
+) -> Iterator[str]:
+    """Generate content using Claude API, yielding text deltas as they arrive."""
+
+    if load_anthropic() is None:
+        yield "Error: anthropic package not installed. Run: pip install anthropic"
+        return
+
+    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        yield "Error: No API key provided. Set ANTHROPIC_API_KEY environment variable or pass --api-key"
+        return
+
+    request = build_message_request(topic, format_type, additional_context, route)
+    key = _generation_cache_key(topic, format_type, additional_context, request)
+    cached = _cached_result(key, cache) or _similar_generations(
+        topic, format_type, additional_context, cache, reuse_similar
+    )[1]
+    if cached is not None:
+        yield cached.content
+        return
+
+    client = get_client(api_key)
+    guard = new_length_guard(format_type.value)
+
+    with client.messages.stream(**sdk_params(request)) as stream:
+        for text in stream.text_stream:
+            if guard is None:
+                yield text
+                continue
+            text = guard.feed(text)
+            if text:
+                yield text
+            if guard.stopped:
+                break
+
+        if guard is not None and guard.stopped:
+            message = stream.current_message_snapshot
+        else:
+            message = stream.get_final_message()
+            if guard is not None:
+                tail = guard.close()
+                if tail:
+                    yield tail
+        result = _finish_result(GenerationResult(""), message, guard, format_type)
+
+    _record_generation(key, topic, format_type, additional_context, result, cache, request=request)
+
+
+async def stream_content_with_claude_async(
+    topic: str,
+    format_type: ContentFormat,
+    api_key: Optional[str] = None,
+    additional_context: str = "",
+    result: Optional[GenerationResult] = None,
+    cache: str = "use",
+    limiter=None,
+    route: Optional[ModelRoute] = None,
+    reuse_similar: bool = False
+) -> AsyncIterator[str]:
+    """
+    Async variant of stream_content_with_claude for use inside the API.
+
+    If `result` is given, it is filled in with the final content, model, token
+    usage, stage timings and similar prior generations once the stream
+    completes. `limiter` is held around the upstream call only; `route`
+    overrides the format's model route.
+    """
+
+    if load_anthropic() is None:
+        yield "Error: anthropic package not installed. Run: pip install anthropic"
+        return
+
+    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        yield "Error: No API key provided. Set ANTHROPIC_API_KEY environment variable or pass --api-key"
+        return
+
+    started = time.perf_counter()
+    route = route or resolve_route(format_type.value)
+    request = build_message_request(topic, format_type, additional_context, route)
+    key = _generation_cache_key(topic, format_type, additional_context, request)
+    prompt_ms = (time.perf_counter() - started) * 1000
+    final = await _off_loop(_cached_result, key, cache)
+    similar = None
+    if final is None:
+        similar, final = await _off_loop(
+            _similar_generations, topic, format_type, additional_context, cache, reuse_similar
+        )
+
+    if final is not None:
+        yield final.content
+    else:
+        producer = _upstream_producer(
+            api_key, request, format_type, key, cache, limiter, fallback_model=route.fallback_model,
+            topic=topic, additional_context=additional_context
+        )
+        async with _in_flight.attach(key, producer) as (flight, leader):
+            async for text in flight.stream():
+                yield text
+            final = replace(flight.value, coalesced=not leader, similar=similar)
+
+    final.prompt_ms = prompt_ms
+    final.latency_ms = (time.perf_counter() - started) * 1000
+    metrics.observe_generation(format_type.value, final)
+
+    if result is not None:
+        for field in fields(final):
+            setattr(result, field.name, getattr(final, field.name))
 
 
 def generate_content_prompt_only(
@@ -352,26 +1395,262 @@ def generate_content_prompt_only(
 ) -> str:
     """Generate a complete prompt that can be used with any AI system."""
 
-    voice = BenovitzVoiceProfile()
-    system_prompt = get_system_prompt(voice)
-    format_instructions = get_format_instructions(format_type)
+    return get_compiled_prompts().prompt_templates[format_type].render(topic, additional_context)
 
-    full_prompt = f"""=== SYSTEM INSTRUCTIONS ===
-{system_prompt}
 
-=== FORMAT INSTRUCTIONS ===
-{format_instructions}
+def estimate_generation(
+    topic: str,
+    format_type: ContentFormat,
+    additional_context: str = "",
+    route: Optional[ModelRoute] = None
+) -> dict:
+    """
+    Estimate a generation's input and output tokens, cost and latency without
+    calling the API or loading a tokenizer.
 
-=== USER REQUEST ===
-Please write content on the following topic:
+    The context is compacted exactly as build_message_request would, and
+    `prompt_tokens` breaks the (unscaled) input estimate down by part.
+    Compaction is memoized, so repeat calls with the same context, such as one
+    per keystroke in the topic field, cost microseconds.
+    """
 
-**Topic**: {topic}
+    started = time.perf_counter()
+    compiled = get_compiled_prompts()
+    route = route or resolve_route(format_type.value)
+    compaction = compact_additional_context(additional_context)
+    format_tokens = compiled.user_prefix_tokens[format_type]
+    request_tokens = estimate_tokens(build_user_prompt_suffix(topic, compaction.text))
+    policy = get_compaction_policy()
 
-{f"**Additional Context/Notes**: {additional_context}" if additional_context else ""}
+    estimate = get_usage_model().estimate(
+        route.model, format_type.value, route.max_tokens, compiled.system_tokens + format_tokens, request_tokens
+    )
+    estimate["format"] = format_type.value
+    estimate["prompt_tokens"] = {
+        "system": compiled.system_tokens,
+        "format_instructions": format_tokens,
+        "topic": estimate_tokens(topic),
+        "additional_context": compaction.tokens
+    }
+    estimate["context"] = {
+        **compaction.to_dict(),
+        "max_tokens": policy.max_tokens if policy is not None else None
+    }
+    estimate["estimate_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return estimate
 
-Write this content now in the authentic voice of Rabbi Moshe Benovitz."""
 
-    return full_prompt
+def item_route(item: dict, format_type: ContentFormat) -> ModelRoute:
+    """The format's route with any `model`, `max_tokens`, `temperature` or `timeout` an item overrides."""
+
+    return resolve_route(
+        format_type.value,
+        model=item.get("model"),
+        max_tokens=item.get("max_tokens"),
+        temperature=item.get("temperature"),
+        timeout=item.get("timeout")
+    )
+
+
+async def generate_item_async(
+    item: dict,
+    index: int,
+    api_key: Optional[str] = None,
+    limiter=None
+) -> dict:
+    """
+    Generate one batch item and describe the outcome as a result record.
+
+    Items carry `topic`, optional `format`, `additional_context` (or `context`),
+    `prompt_only`, `cache`, `reuse_similar`, `id` and route overrides (`model`, `max_tokens`,
+    `temperature`, `timeout`). Failures are reported in the record with
+    status "error" rather than raised, so one bad item never aborts a batch.
+    """
+
+    if not isinstance(item, dict):
+        return {"index": index, "id": None, "status": "error", "error": "Invalid item: expected a JSON object"}
+
+    record = {"index": index, "id": item.get("id"), "topic": item.get("topic"), "format": item.get("format", "article")}
+
+    try:
+        if not item.get("topic"):
+            raise ValueError("Missing topic")
+        format_type = ContentFormat(record["format"])
+        additional_context = item.get("additional_context") or item.get("context") or ""
+
+        if item.get("prompt_only"):
+            content = generate_content_prompt_only(item["topic"], format_type, additional_context)
+            record.update(status="ok", content=content)
+            return record
+
+        route = item_route(item, format_type)
+        result = await generate_content_with_claude_async(
+            item["topic"], format_type, api_key, additional_context,
+            cache=item.get("cache", "use"), limiter=limiter, priority=BATCH, route=route,
+            reuse_similar=bool(item.get("reuse_similar"))
+        )
+
+        if result.content.startswith("Error:"):
+            record.update(status="error", error=result.content)
+        else:
+            record.update(
+                status="ok", content=result.content, usage=result.usage(), cached=result.cached, route=route.to_dict()
+            )
+            if result.reused_from is not None:
+                record["reused_from"] = result.reused_from
+            if result.length is not None:
+                record["length"] = result.length
+    except Exception as exc:
+        record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+
+    return record
+
+
+async def generate_batch_async(
+    items: Union[Iterable[dict], AsyncIterable[dict]],
+    api_key: Optional[str] = None,
+    concurrency: int = 8,
+    limiter=None
+) -> AsyncIterator[dict]:
+    """
+    Generate many items concurrently, yielding result records as each completes.
+
+    `items` may be a plain or async iterable and is pulled lazily. At most
+    `concurrency` items are in flight and at most `concurrency` finished records
+    wait for the consumer, so memory stays flat however long the input is.
+    `limiter` is an optional async context manager (such as a shared semaphore)
+    held around each upstream call.
+    """
+
+    workers = max(1, concurrency)
+    pending = asyncio.Queue(maxsize=workers)
+    results = asyncio.Queue(maxsize=workers)
+    workers_left = workers
+    feed_error = None
+
+    async def feed():
+        nonlocal feed_error
+        index = 0
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await pending.put((index, item))
+                    index += 1
+            else:
+                for item in items:
+                    await pending.put((index, item))
+                    index += 1
+        except Exception as exc:
+            # Reported once the items already queued have finished
+            feed_error = exc
+        for _ in range(workers):
+            await pending.put(None)
+
+    async def worker():
+        nonlocal workers_left
+        while (entry := await pending.get()) is not None:
+            index, item = entry
+            await results.put(await generate_item_async(item, index, api_key, limiter))
+        workers_left -= 1
+        if workers_left == 0:
+            await results.put(None)
+
+    tasks = [asyncio.create_task(feed())] + [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        while True:
+            record = await results.get()
+            if record is None:
+                break
+            yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if feed_error is not None:
+        raise feed_error
+
+
+def read_batch_file(path: str) -> Iterator[dict]:
+    """Read batch items from a JSONL file, skipping blank lines."""
+
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def read_jsonl_async(fd: int, chunk_size: int = 65536) -> AsyncIterator:
+    """
+    Parse JSON lines from a file descriptor (such as stdin) without blocking
+    the event loop, skipping blank lines. Reads return as soon as any input is
+    available, so slow producers are served line by line. A line that is not
+    valid JSON is passed on as its raw text, which batch items report as an error.
+    """
+
+    remainder = b""
+    while True:
+        chunk = await asyncio.to_thread(os.read, fd, chunk_size)
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop() if chunk else b""
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield line.decode("utf-8", "replace")
+        if not chunk:
+            return
+
+
+async def write_batch_results(
+    items: Union[Iterable[dict], AsyncIterable[dict]],
+    output,
+    api_key: Optional[str] = None,
+    concurrency: int = 8
+) -> int:
+    """Generate `items`, writing NDJSON result records as they complete; returns the error count."""
+
+    errors = 0
+    try:
+        async for record in generate_batch_async(items, api_key, concurrency):
+            if record["status"] != "ok":
+                errors += 1
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    finally:
+        await aclose_clients()
+    return errors
+
+
+async def run_batch(
+    path: str,
+    output,
+    api_key: Optional[str] = None,
+    concurrency: int = 8
+) -> int:
+    """Run a JSONL batch file, writing NDJSON results as they complete; returns the error count."""
+
+    return await write_batch_results(read_batch_file(path), output, api_key, concurrency)
+
+
+async def run_jsonl(
+    input_fd: int,
+    output,
+    api_key: Optional[str] = None,
+    concurrency: int = 8,
+    defaults: Optional[dict] = None
+) -> int:
+    """
+    Pipeline mode: read request objects line by line from `input_fd`, fill in
+    any keys they leave out from `defaults`, and write NDJSON results to
+    `output` as each finishes. Returns the error count.
+    """
+
+    async def items():
+        async for item in read_jsonl_async(input_fd):
+            yield {**defaults, **item} if defaults and isinstance(item, dict) else item
+
+    return await write_batch_results(items(), output, api_key, concurrency)
 
 
 def interactive_mode():
@@ -420,8 +1699,9 @@ def interactive_mode():
 
     if api_key:
         print("Generating content with Claude...\n")
-        result = generate_content_with_claude(topic, format_type, api_key, additional_context)
-        print(result)
+        for chunk in stream_content_with_claude(topic, format_type, api_key, additional_context):
+            print(chunk, end="", flush=True)
+        print()
     else:
         print("No ANTHROPIC_API_KEY found. Generating prompt template...\n")
         result = generate_content_prompt_only(topic, format_type, additional_context)
@@ -443,6 +1723,14 @@ Examples:
   %(prog)s "The power of mentorship" --format shiur_outline
   %(prog)s --interactive
   %(prog)s --prompt-only "Building lasting relationships with students"
+  %(prog)s --estimate "The power of mentorship" --format shiur_outline -c "$(cat notes.txt)"
+  %(prog)s --batch topics.jsonl --concurrency 16 -o results.jsonl
+  cat topics.jsonl | %(prog)s --jsonl --prompt-only > prompts.jsonl
+  %(prog)s --submit-job topics.jsonl
+  %(prog)s --job-status JOB_ID
+  %(prog)s --search "tefillah teens" --search-format shiur_outline
+  %(prog)s --serve &
+  %(prog)s --socket /tmp/benovitz-$(id -u).sock "Chesed in everyday life" -f social_media
         """
     )
 
@@ -470,12 +1758,56 @@ Examples:
         help="Anthropic API key (or set ANTHROPIC_API_KEY env var)"
     )
 
+    parser.add_argument(
+        "--cache",
+        choices=["use", "bypass", "refresh"],
+        default="use",
+        help="Response cache mode (default: use). Only applies when BENOVITZ_CACHE_BACKEND is memory or "
+             "sqlite (persists across runs); a hit then returns a generation up to BENOVITZ_CACHE_TTL old"
+    )
+
+    parser.add_argument(
+        "--reuse-similar",
+        action="store_true",
+        help="Answer with a cached generation for a paraphrase of the topic, if one is close enough "
+             "(BENOVITZ_SIMILARITY_THRESHOLD); most useful with --serve, which keeps the index warm"
+    )
+
+    parser.add_argument(
+        "--model",
+        help="Override the format's routed model (see BENOVITZ_MODEL_ROUTES)"
+    )
+
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        help="Override the format's routed output token cap"
+    )
+
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        help="Override the format's routed sampling temperature"
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Override the format's routed upstream timeout in seconds"
+    )
+
     parser.add_argument(
         "-p", "--prompt-only",
         action="store_true",
         help="Output the prompt template instead of generating content"
     )
 
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Print estimated input and output tokens, cost and latency as JSON instead of generating"
+    )
+
     parser.add_argument(
         "-i", "--interactive",
         action="store_true",
@@ -487,6 +1819,93 @@ Examples:
         help="Output file path (default: print to stdout)"
     )
 
+    parser.add_argument(
+        "-n", "--variants",
+        type=int,
+        default=1,
+        help="Generate this many alternative drafts concurrently (default: 1)"
+    )
+
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Generate every item in a JSONL file ({\"topic\", \"format\", \"context\", \"id\"} per line), "
+             "writing NDJSON results as they complete"
+    )
+
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Pipeline mode: read request objects ({\"topic\", \"format\", \"context\", \"id\"}) line by line "
+             "from stdin and write NDJSON results to stdout as each finishes; other flags set per-item defaults"
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum concurrent generations in --batch and --jsonl modes (default: 8)"
+    )
+
+    parser.add_argument(
+        "--submit-job",
+        metavar="FILE",
+        help="Submit a JSONL file as an offline Message Batches job (half price, results within 24h)"
+    )
+
+    parser.add_argument(
+        "--job-status",
+        metavar="JOB_ID",
+        help="Check an offline job's progress; completed jobs report their JSONL results path"
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a warm daemon on a Unix socket (--socket, default $BENOVITZ_SOCKET or a per-user temp path) "
+             "that later runs with --socket forward to"
+    )
+
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        default=os.environ.get("BENOVITZ_SOCKET"),
+        help="Forward generation to the --serve daemon at this socket, falling back to a local run "
+             "if none is listening (default: $BENOVITZ_SOCKET)"
+    )
+
+    parser.add_argument(
+        "--search",
+        metavar="QUERY",
+        help="Search the archive of past generations (BENOVITZ_ARCHIVE_PATH) and print ranked snippets"
+    )
+
+    parser.add_argument(
+        "--search-format",
+        choices=["article", "social_media", "shiur_outline", "short_reflection", "advisor_training"],
+        help="Only search or export generations of this format"
+    )
+
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=10,
+        help="Search results per page (default: 10)"
+    )
+
+    parser.add_argument(
+        "--offset",
+        type=int,
+        default=0,
+        help="Search results to skip, for later pages (default: 0)"
+    )
+
+    parser.add_argument(
+        "--export-archive",
+        action="store_true",
+        help="Write archived generations as NDJSON to -o or stdout (narrowed by --search and --search-format)"
+    )
+
     parser.add_argument(
         "--show-voice-profile",
         action="store_true",
@@ -508,11 +1927,105 @@ Examples:
         print(f"\nCommon Transitions:{voice.transitions}")
         return
 
+    # Warm daemon for scripted bulk use
+    if args.serve:
+        from cli_daemon import default_socket_path, serve
+
+        try:
+            asyncio.run(serve(args.socket or default_socket_path(), args.api_key))
+        except RuntimeError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            sys.exit(1)
+        return
+
     # Interactive mode
     if args.interactive:
         interactive_mode()
         return
 
+    # Batch mode
+    if args.batch:
+        if args.output:
+            with open(args.output, "w") as f:
+                errors = asyncio.run(run_batch(args.batch, f, args.api_key, args.concurrency))
+            print(f"Results written to {args.output}")
+        else:
+            errors = asyncio.run(run_batch(args.batch, sys.stdout, args.api_key, args.concurrency))
+        if errors:
+            print(f"{errors} item(s) failed", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    # Stdin-to-stdout pipeline
+    if args.jsonl:
+        defaults = {
+            "format": args.format,
+            "context": args.context,
+            "cache": args.cache,
+            "prompt_only": args.prompt_only,
+            "reuse_similar": args.reuse_similar,
+            "model": args.model,
+            "max_tokens": args.max_tokens,
+            "temperature": args.temperature,
+            "timeout": args.timeout
+        }
+        defaults = {key: value for key, value in defaults.items() if value not in (None, "")}
+        errors = asyncio.run(run_jsonl(sys.stdin.fileno(), sys.stdout, args.api_key, args.concurrency, defaults))
+        if errors:
+            print(f"{errors} item(s) failed", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    # Offline jobs
+    if args.submit_job or args.job_status:
+        from batch_jobs import get_job_manager
+
+        try:
+            manager = get_job_manager(args.api_key)
+            if args.submit_job:
+                job = manager.submit(list(read_batch_file(args.submit_job)))
+            else:
+                job = manager.refresh(args.job_status)
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            sys.exit(1)
+
+        if job is None:
+            print(f"Error: No job with id {args.job_status}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(job, indent=2))
+        return
+
+    # Archive search and export
+    if args.search or args.export_archive:
+        from generation_archive import export_lines, get_archive
+
+        archive = get_archive()
+        if archive is None:
+            print("Error: The archive is off (set BENOVITZ_ARCHIVE_PATH to enable it)", file=sys.stderr)
+            sys.exit(1)
+
+        if args.export_archive:
+            documents = archive.export(args.search, args.search_format)
+            if args.output:
+                with open(args.output, "w") as f:
+                    f.writelines(export_lines(documents))
+                print(f"Archive written to {args.output}")
+            else:
+                sys.stdout.writelines(export_lines(documents))
+            return
+
+        results = archive.search(args.search, args.search_format, args.limit, args.offset)
+        if not results:
+            print("No matching generations")
+        for hit in results:
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["created_at"]))
+            print(f"#{hit['id']}  {hit['topic']}  ({hit['format']}, {created})")
+            print(f"    {hit['snippet']}")
+        if len(results) == args.limit:
+            print(f"\nMore results: --offset {args.offset + args.limit}")
+        return
+
     # Require topic if not interactive
     if not args.topic:
         parser.print_help()
@@ -521,24 +2034,78 @@ Examples:
 
     format_type = ContentFormat(args.format)
 
+    # Offline token, cost and latency estimate
+    if args.estimate:
+        route = resolve_route(args.format, args.model, args.max_tokens, args.temperature, args.timeout)
+        print(json.dumps(estimate_generation(args.topic, format_type, args.context, route), indent=2))
+        return
+
     # Generate content
     if args.prompt_only:
         result = generate_content_prompt_only(args.topic, format_type, args.context)
-    else:
-        result = generate_content_with_claude(
-            args.topic,
-            format_type,
-            args.api_key,
-            args.context
-        )
 
-    # Output
+        # Output
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(result)
+            print(f"Content written to {args.output}")
+        else:
+            print(result)
+        return
+
+    # Hand the generation to a running daemon when one is configured
+    if args.socket:
+        from cli_daemon import request_from_args, run_remote
+
+        status = run_remote(args.socket, request_from_args(args), args.output)
+        if status is not None:
+            sys.exit(status)
+        print(f"Note: No daemon listening on {args.socket}; generating locally", file=sys.stderr)
+
+    route = resolve_route(args.format, args.model, args.max_tokens, args.temperature, args.timeout)
+
+    # Several drafts are generated concurrently and printed together
+    if args.variants > 1:
+        async def run_variants():
+            try:
+                return await generate_variants_async(
+                    args.topic, format_type, args.api_key, args.context, args.variants, args.cache, route=route,
+                    reuse_similar=args.reuse_similar
+                )
+            finally:
+                await aclose_clients()
+
+        result = format_variants(asyncio.run(run_variants()))
+
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(result)
+            print(f"Content written to {args.output}")
+        else:
+            print(result)
+        return
+
+    # Stream generated content as it arrives
+    chunks = stream_content_with_claude(
+        args.topic,
+        format_type,
+        args.api_key,
+        args.context,
+        cache=args.cache,
+        route=route,
+        reuse_similar=args.reuse_similar
+    )
+
     if args.output:
         with open(args.output, "w") as f:
-            f.write(result)
+            for chunk in chunks:
+                f.write(chunk)
+                f.flush()
         print(f"Content written to {args.output}")
     else:
-        print(result)
+        for chunk in chunks:
+            print(chunk, end="", flush=True)
+        print()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+"""
+Warm CLI daemon for scripted bulk use of the Rabbi Moshe Benovitz Content Generator.
+
+`benovitz_content_generator.py --serve` keeps one process running on a local
+Unix socket, holding the upstream connection pool, compiled prompts and
+response cache across requests. Any later CLI run given `--socket` (or with
+BENOVITZ_SOCKET set) forwards its topic, format, context and generation
+flags to the daemon and prints or writes the streamed text exactly as a
+local run would.
+
+The protocol is newline-delimited JSON: the client sends one request object,
+the daemon answers with `{"chunk": ...}` lines and then `{"done": true}`, or
+`{"error": ...}` if the request could not be served.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Optional
+
+# Largest request line the daemon accepts
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+def default_socket_path() -> str:
+    """BENOVITZ_SOCKET, else a per-user socket in the temp directory."""
+
+    return os.environ.get("BENOVITZ_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"benovitz-{os.getuid()}.sock"
+    )
+
+
+def request_from_args(args) -> dict:
+    """The forwardable part of parsed CLI arguments."""
+
+    request = {
+        "topic": args.topic,
+        "format": args.format,
+        "context": args.context,
+        "cache": args.cache,
+        "reuse_similar": args.reuse_similar,
+        "model": args.model,
+        "max_tokens": args.max_tokens,
+        "temperature": args.temperature,
+        "timeout": args.timeout,
+        "variants": args.variants
+    }
+    if args.api_key:
+        request["api_key"] = args.api_key
+    return request
+
+
+def run_remote(path: str, request: dict, output: Optional[str] = None) -> Optional[int]:
+    """
+    Send `request` to the daemon at `path` and print the result to stdout, or
+    write it to `output`. Returns the exit status, or None if no daemon is
+    listening (so the caller can generate locally instead).
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock, sock.makefile("r", encoding="utf-8") as lines:
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        out = open(output, "w") if output else sys.stdout
+        try:
+            for line in lines:
+                message = json.loads(line)
+                if "chunk" in message:
+                    out.write(message["chunk"])
+                    out.flush()
+                elif message.get("done"):
+                    break
+                else:
+                    print(f"Error: {message.get('error', 'unexpected daemon response')}", file=sys.stderr)
+                    return 1
+            else:
+                print("Error: Daemon closed the connection before finishing", file=sys.stderr)
+                return 1
+        finally:
+            if output:
+                out.close()
+
+    if output:
+        print(f"Content written to {output}")
+    else:
+        print()
+    return 0
+
+
+async def _generate(request: dict, api_key: Optional[str]):
+    """Yield the text a local CLI run with the same flags would print."""
+
+    from benovitz_content_generator import (
+        ContentFormat,
+        format_variants,
+        generate_content_prompt_only,
+        generate_variants_async,
+        stream_content_with_claude_async,
+    )
+    from model_routing import resolve_route
+
+    topic = request["topic"]
+    format_value = request.get("format", "article")
+    format_type = ContentFormat(format_value)
+    context = request.get("context", "")
+    cache = request.get("cache", "use")
+    reuse_similar = bool(request.get("reuse_similar"))
+    api_key = request.get("api_key") or api_key
+
+    if request.get("prompt_only"):
+        yield generate_content_prompt_only(topic, format_type, context)
+        return
+
+    route = resolve_route(
+        format_value, request.get("model"), request.get("max_tokens"),
+        request.get("temperature"), request.get("timeout")
+    )
+
+    variants = int(request.get("variants") or 1)
+    if variants > 1:
+        results = await generate_variants_async(
+            topic, format_type, api_key, context, variants, cache, route=route, reuse_similar=reuse_similar
+        )
+        yield format_variants(results)
+        return
+
+    chunks = stream_content_with_claude_async(
+        topic, format_type, api_key, context, cache=cache, route=route, reuse_similar=reuse_similar
+    )
+    async with contextlib.aclosing(chunks):
+        async for chunk in chunks:
+            yield chunk
+
+
+async def _handle(reader, writer, api_key: Optional[str]) -> None:
+    def send(message: dict):
+        writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        return writer.drain()
+
+    try:
+        try:
+            request = json.loads(await reader.readline())
+            if not isinstance(request, dict) or not request.get("topic"):
+                raise ValueError("Request needs a topic")
+            # Closing the generator when the client goes away cancels the upstream call
+            async with contextlib.aclosing(_generate(request, api_key)) as chunks:
+                async for chunk in chunks:
+                    await send({"chunk": chunk})
+        except (ValueError, KeyError) as exc:
+            await send({"error": str(exc)})
+        except ConnectionError:
+            return
+        except Exception as exc:
+            await send({"error": f"{type(exc).__name__}: {exc}"})
+        else:
+            await send({"done": True})
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def _daemon_running(path: str) -> bool:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+async def serve(path: str, api_key: Optional[str] = None) -> None:
+    """Serve CLI requests on the Unix socket at `path` until SIGINT or SIGTERM."""
+
+    import asyncio
+    import signal
+
+    from benovitz_content_generator import aclose_clients, get_compiled_prompts, warm_clients
+
+    if os.path.exists(path):
+        if _daemon_running(path):
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        os.unlink(path)
+
+    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+    get_compiled_prompts()
+    if api_key:
+        await warm_clients(api_key)
+
+    # Only this user may submit requests (and spend the API key): the socket is
+    # created 0600, so no other user can connect between bind and listen
+    umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(
+            lambda reader, writer: _handle(reader, writer, api_key), path, limit=MAX_REQUEST_BYTES
+        )
+    finally:
+        os.umask(umask)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"Serving on {path} (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+        await aclose_clients()
@@ -5,7 +5,7 @@
  */
 
 import React, { useState } from 'react';
-import { useBenovitzContent, ContentFormat } from './benovitz-content-client';
+import { useBenovitzContent, useEstimate, ContentFormat } from './benovitz-content-client';
 
 // Configuration - Production API URL on Render
 const API_URL = process.env.REACT_APP_BENOVITZ_API_URL || 'https://moshe-benovitz-content-generator-api.onrender.com';
@@ -20,7 +20,8 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
   const [additionalContext, setAdditionalContext] = useState('');
 
   const {
-    generate,
+    generateStream,
+    cancel,
     isLoading,
     error,
     content,
@@ -30,12 +31,16 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
     baseUrl: API_URL,
   });
 
+  // Refreshed as the user types
+  const estimate = useEstimate(topic, format, additionalContext, { baseUrl: API_URL });
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!topic.trim()) return;
 
+    // Re-submitting while a generation streams replaces it; the old one is aborted
     try {
-      await generate(topic, format, additionalContext);
+      await generateStream(topic, format, additionalContext);
     } catch (err) {
       // Error is already captured in the hook
       console.error('Generation failed:', err);
@@ -63,7 +68,6 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
             value={topic}
             onChange={(e) => setTopic(e.target.value)}
             placeholder="e.g., Making tefillah meaningful for teens"
-            disabled={isLoading}
             required
           />
         </div>
@@ -74,7 +78,6 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
             id="format"
             value={format}
             onChange={(e) => setFormat(e.target.value as ContentFormat)}
-            disabled={isLoading}
           >
             {formatOptions.map((opt) => (
               <option key={opt.value} value={opt.value}>
@@ -91,14 +94,27 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
             value={additionalContext}
             onChange={(e) => setAdditionalContext(e.target.value)}
             placeholder="e.g., For NCSY summer program staff training"
-            disabled={isLoading}
             rows={3}
           />
         </div>
 
-        <button type="submit" disabled={isLoading || !topic.trim()}>
-          {isLoading ? 'Generating...' : 'Generate Content'}
+        {estimate && (
+          <p className="estimate">
+            ~{estimate.input_tokens.toLocaleString()} input + {estimate.output_tokens.toLocaleString()} output tokens
+            {estimate.cost_usd !== null && <> &middot; ~${estimate.cost_usd.toFixed(4)}</>}
+            {' '}&middot; ~{(estimate.latency_ms / 1000).toFixed(1)}s
+            {estimate.context.truncated && <> &middot; context will be shortened</>}
+          </p>
+        )}
+
+        <button type="submit" disabled={!topic.trim()}>
+          {isLoading ? 'Restart with Changes' : 'Generate Content'}
         </button>
+        {isLoading && (
+          <button type="button" onClick={cancel} className="stop-button">
+            Stop
+          </button>
+        )}
       </form>
 
       {error && (
@@ -158,6 +174,12 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
           resize: vertical;
         }
 
+        .estimate {
+          margin: 0 0 12px;
+          color: #6b7280;
+          font-size: 14px;
+        }
+
         button {
           padding: 10px 20px;
           background: #1a365d;
@@ -177,6 +199,11 @@ export const ContentGenerator: React.FC<ContentGeneratorProps> = ({ className })
           cursor: not-allowed;
         }
 
+        .stop-button {
+          margin-left: 8px;
+          background: #6b7280;
+        }
+
         .error {
           margin-top: 16px;
           padding: 12px;
@@ -52,9 +52,17 @@ class BenovitzContentClient {
    * @param {string} [request.format='article'] - Content format
    * @param {string} [request.additional_context] - Additional context
    * @param {boolean} [request.prompt_only=false] - Return prompt only
-   * @returns {Promise<{content: string, format: string, topic: string}>}
+   * @param {string} [request.cache='use'] - Response cache mode: use, bypass or refresh
+   * @param {boolean} [request.reuse_similar=false] - Answer with a cached generation for a paraphrased request
+   * @param {number} [request.variants=1] - Number of alternative drafts to generate
+   * @param {string} [request.model] - Override the format's routed model
+   * @param {number} [request.max_tokens] - Override the format's routed output token cap
+   * @param {number} [request.temperature] - Override the format's routed temperature
+   * @param {number} [request.timeout] - Override the format's routed upstream timeout (seconds)
+   * @param {AbortSignal} [signal] - Cancels the request; the server then stops the generation
+   * @returns {Promise<{content: string, format: string, topic: string, route?: Object, variants?: Array, similar?: Array, reused_from?: Object, length?: Object}>}
    */
-  async generate(request) {
+  async generate(request, signal) {
     return this.request('/generate', {
       method: 'POST',
       body: JSON.stringify({
@@ -62,8 +70,98 @@ class BenovitzContentClient {
         format: request.format || 'article',
         additional_context: request.additional_context || '',
         prompt_only: request.prompt_only || false,
+        cache: request.cache || 'use',
+        reuse_similar: request.reuse_similar || false,
+        variants: request.variants || 1,
+        model: request.model,
+        max_tokens: request.max_tokens,
+        temperature: request.temperature,
+        timeout: request.timeout,
+      }),
+      signal,
+    });
+  }
+
+  /**
+   * Stream content in Rabbi Benovitz's voice, yielding text deltas as they arrive
+   * @param {Object} request - Generation request (same fields as generate)
+   * @param {AbortSignal} [signal] - Cancels the stream; the server then stops the generation
+   * @returns {AsyncGenerator<string>} Text deltas
+   */
+  async *streamGenerate(request, signal) {
+    const headers = {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    };
+
+    if (this.apiKey) {
+      headers['Authorization'] = `Bearer ${this.apiKey}`;
+    }
+
+    const response = await fetch(`${this.baseUrl}/generate/stream`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({
+        topic: request.topic,
+        format: request.format || 'article',
+        additional_context: request.additional_context || '',
+        prompt_only: request.prompt_only || false,
+        cache: request.cache || 'use',
+        reuse_similar: request.reuse_similar || false,
+        model: request.model,
+        max_tokens: request.max_tokens,
+        temperature: request.temperature,
+        timeout: request.timeout,
       }),
+      signal,
     });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new Error(error.detail || `HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const event = parseStreamEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        if (!event) continue;
+        if (event.event === 'error') {
+          throw new Error(event.data.detail || 'Stream error');
+        }
+        if (event.event === 'done') {
+          return;
+        }
+        yield event.data.text;
+      }
+    }
+  }
+
+  /**
+   * Stream content, invoking onDelta for each chunk
+   * @param {Object} request - Generation request (same fields as generate)
+   * @param {function(string, string): void} [onDelta] - Called with (delta, contentSoFar)
+   * @param {AbortSignal} [signal] - Cancels the stream; the server then stops the generation
+   * @returns {Promise<{content: string, format: string, topic: string}>}
+   */
+  async generateStream(request, onDelta, signal) {
+    let content = '';
+    for await (const text of this.streamGenerate(request, signal)) {
+      content += text;
+      if (onDelta) onDelta(text, content);
+    }
+    return { content, format: request.format || 'article', topic: request.topic };
   }
 
   /**
@@ -121,6 +219,32 @@ class BenovitzContentClient {
     return response.content;
   }
 
+  /**
+   * Estimate input and output tokens, cost and latency without generating.
+   * Cheap enough to call as the user types; pass an AbortSignal to drop stale calls.
+   * @param {Object} request - Request being composed
+   * @param {string} [request.topic] - The topic (may be partial)
+   * @param {string} [request.format='article'] - Content format
+   * @param {string} [request.additional_context] - Additional context
+   * @param {string} [request.model] - Override the format's routed model
+   * @param {number} [request.max_tokens] - Override the format's routed output token cap
+   * @param {AbortSignal} [signal] - Cancels the request
+   * @returns {Promise<{input_tokens: number, output_tokens: number, cost_usd: ?number, latency_ms: number, context: Object}>}
+   */
+  async estimate(request, signal) {
+    return this.request('/estimate', {
+      method: 'POST',
+      body: JSON.stringify({
+        topic: request.topic || '',
+        format: request.format || 'article',
+        additional_context: request.additional_context || '',
+        model: request.model,
+        max_tokens: request.max_tokens,
+      }),
+      signal,
+    });
+  }
+
   /**
    * Get available content formats
    * @returns {Promise<Array<{name: string, value: string, description: string}>>}
@@ -156,6 +280,26 @@ class BenovitzContentClient {
   }
 }
 
+/**
+ * Parse one Server-Sent Event block into {event, data}
+ * @private
+ */
+function parseStreamEvent(raw) {
+  let event = 'message';
+  const dataLines = [];
+
+  for (const line of raw.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart());
+    }
+  }
+
+  if (dataLines.length === 0) return null;
+  return { event, data: JSON.parse(dataLines.join('\n')) };
+}
+
 // Export for different module systems
 if (typeof module !== 'undefined' && module.exports) {
   module.exports = BenovitzContentClient;
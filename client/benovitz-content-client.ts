@@ -11,12 +11,113 @@ export interface GenerateRequest {
   format?: ContentFormat;
   additional_context?: string;
   prompt_only?: boolean;
+  cache?: 'use' | 'bypass' | 'refresh';
+  // Answer with a cached generation for a paraphrase of this request, if one is close enough
+  reuse_similar?: boolean;
+  variants?: number;
+  // Overrides of the format's model route
+  model?: string;
+  max_tokens?: number;
+  temperature?: number;
+  timeout?: number;
+}
+
+export interface Usage {
+  input_tokens: number;
+  output_tokens: number;
+  cache_creation_input_tokens: number;
+  cache_read_input_tokens: number;
+}
+
+export interface Variant {
+  content: string;
+  usage: Usage;
+  cached: boolean;
+  latency_ms: number;
+}
+
+export interface Route {
+  model: string;
+  max_tokens: number;
+  temperature?: number | null;
+  timeout: number;
+  fallback_model?: string | null;
+}
+
+export interface SimilarGeneration {
+  topic: string;
+  format: string;
+  additional_context: string;
+  score: number;
+  created_at: number;
+}
+
+export interface LengthReport {
+  words: number;
+  min_words?: number | null;
+  max_words?: number | null;
+  overrun_words: number;
+  // Set when the length guard stopped the generation early
+  stopped?: 'over_length' | 'complete' | null;
+  missing_sections: string[];
+  hashtags?: number | null;
 }
 
 export interface GenerateResponse {
   content: string;
   format: string;
   topic: string;
+  usage?: Usage | null;
+  cached?: boolean;
+  coalesced?: boolean;
+  route?: Route | null;
+  variants?: Variant[] | null;
+  similar?: SimilarGeneration[] | null;
+  reused_from?: SimilarGeneration | null;
+  length?: LengthReport | null;
+}
+
+export interface EstimateRequest {
+  topic?: string;
+  format?: ContentFormat;
+  additional_context?: string;
+  model?: string;
+  max_tokens?: number;
+}
+
+export interface Estimate {
+  format: string;
+  model: string;
+  input_tokens: number;
+  cached_prefix_tokens: number;
+  uncached_input_tokens: number;
+  output_tokens: number;
+  max_tokens: number;
+  // USD; null for models without a known price
+  cost_usd: number | null;
+  cold_cost_usd: number | null;
+  max_cost_usd: number | null;
+  ttft_ms: number;
+  latency_ms: number;
+  prompt_tokens: {
+    system: number;
+    format_instructions: number;
+    topic: number;
+    additional_context: number;
+  };
+  context: {
+    original_tokens: number;
+    tokens: number;
+    duplicates_removed: number;
+    truncated: boolean;
+    max_tokens: number | null;
+  };
+  estimate_ms: number;
+}
+
+export interface StreamEvent {
+  event: 'delta' | 'done' | 'error';
+  data: any;
 }
 
 export interface FormatInfo {
@@ -75,9 +176,10 @@ export class BenovitzContentClient {
   }
 
   /**
-   * Generate content in Rabbi Benovitz's voice
+   * Generate content in Rabbi Benovitz's voice. Aborting `signal` cancels the
+   * request, and the server then stops the generation.
    */
-  async generate(request: GenerateRequest): Promise<GenerateResponse> {
+  async generate(request: GenerateRequest, signal?: AbortSignal): Promise<GenerateResponse> {
     return this.request<GenerateResponse>('/generate', {
       method: 'POST',
       body: JSON.stringify({
@@ -85,8 +187,96 @@ export class BenovitzContentClient {
         format: request.format || 'article',
         additional_context: request.additional_context || '',
         prompt_only: request.prompt_only || false,
+        cache: request.cache || 'use',
+        reuse_similar: request.reuse_similar || false,
+        variants: request.variants || 1,
+        model: request.model,
+        max_tokens: request.max_tokens,
+        temperature: request.temperature,
+        timeout: request.timeout,
+      }),
+      signal,
+    });
+  }
+
+  /**
+   * Stream content in Rabbi Benovitz's voice, yielding text deltas as they arrive.
+   * Aborting `signal` closes the stream, and the server then stops the generation.
+   */
+  async *streamGenerate(request: GenerateRequest, signal?: AbortSignal): AsyncGenerator<string, void, unknown> {
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    };
+
+    if (this.apiKey) {
+      headers['Authorization'] = `Bearer ${this.apiKey}`;
+    }
+
+    const response = await fetch(`${this.baseUrl}/generate/stream`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({
+        topic: request.topic,
+        format: request.format || 'article',
+        additional_context: request.additional_context || '',
+        prompt_only: request.prompt_only || false,
+        cache: request.cache || 'use',
+        reuse_similar: request.reuse_similar || false,
+        model: request.model,
+        max_tokens: request.max_tokens,
+        temperature: request.temperature,
+        timeout: request.timeout,
       }),
+      signal,
     });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new Error(error.detail || `HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const event = parseStreamEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        if (!event) continue;
+        if (event.event === 'error') {
+          throw new Error(event.data.detail || 'Stream error');
+        }
+        if (event.event === 'done') {
+          return;
+        }
+        yield event.data.text;
+      }
+    }
+  }
+
+  /**
+   * Stream content, invoking onDelta for each chunk, and resolve with the full response
+   */
+  async generateStream(
+    request: GenerateRequest,
+    onDelta?: (text: string, content: string) => void,
+    signal?: AbortSignal
+  ): Promise<GenerateResponse> {
+    let content = '';
+    for await (const text of this.streamGenerate(request, signal)) {
+      content += text;
+      onDelta?.(text, content);
+    }
+    return { content, format: request.format || 'article', topic: request.topic };
   }
 
   /**
@@ -129,6 +319,24 @@ export class BenovitzContentClient {
     return response.content;
   }
 
+  /**
+   * Estimate input and output tokens, cost and latency without generating.
+   * Cheap enough to call as the user types; pass an AbortSignal to drop stale calls.
+   */
+  async estimate(request: EstimateRequest, signal?: AbortSignal): Promise<Estimate> {
+    return this.request<Estimate>('/estimate', {
+      method: 'POST',
+      body: JSON.stringify({
+        topic: request.topic || '',
+        format: request.format || 'article',
+        additional_context: request.additional_context || '',
+        model: request.model,
+        max_tokens: request.max_tokens,
+      }),
+      signal,
+    });
+  }
+
   /**
    * Get available content formats
    */
@@ -160,8 +368,24 @@ export class BenovitzContentClient {
   }
 }
 
-// React Hook
-import { useState, useCallback } from 'react';
+function parseStreamEvent(raw: string): StreamEvent | null {
+  let event = 'message';
+  const dataLines: string[] = [];
+
+  for (const line of raw.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart());
+    }
+  }
+
+  if (dataLines.length === 0) return null;
+  return { event: event as StreamEvent['event'], data: JSON.parse(dataLines.join('\n')) };
+}
+
+// React Hooks
+import { useState, useCallback, useEffect, useMemo, useRef } from 'react';
 
 export interface UseBenovitzContentOptions {
   baseUrl?: string;
@@ -170,6 +394,8 @@ export interface UseBenovitzContentOptions {
 
 export interface UseBenovitzContentReturn {
   generate: (topic: string, format?: ContentFormat, context?: string) => Promise<void>;
+  generateStream: (topic: string, format?: ContentFormat, context?: string) => Promise<void>;
+  cancel: () => void;
   isLoading: boolean;
   error: Error | null;
   content: string | null;
@@ -177,42 +403,109 @@ export interface UseBenovitzContentReturn {
   clearError: () => void;
 }
 
+function isAbortError(err: unknown): boolean {
+  return err instanceof Error && err.name === 'AbortError';
+}
+
+/**
+ * Content generation state for a component. Starting a generation aborts the
+ * one in flight, as does `cancel()` or unmounting, so the server stops
+ * generating output nobody will read.
+ */
 export function useBenovitzContent(options: UseBenovitzContentOptions = {}): UseBenovitzContentReturn {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<Error | null>(null);
   const [content, setContent] = useState<string | null>(null);
+  const inFlight = useRef<AbortController | null>(null);
 
   const client = new BenovitzContentClient(options);
 
+  // Supersede the generation in flight, if any
+  const start = useCallback(() => {
+    inFlight.current?.abort();
+    const controller = new AbortController();
+    inFlight.current = controller;
+    setIsLoading(true);
+    setError(null);
+    setContent(null);
+    return controller;
+  }, []);
+
+  const finish = useCallback((controller: AbortController, err?: unknown) => {
+    if (inFlight.current !== controller) {
+      // Superseded; the newer generation owns the state
+      return;
+    }
+    inFlight.current = null;
+    setIsLoading(false);
+    if (err !== undefined && !isAbortError(err)) {
+      setError(err instanceof Error ? err : new Error('Unknown error'));
+      throw err;
+    }
+  }, []);
+
+  const cancel = useCallback(() => {
+    const controller = inFlight.current;
+    if (controller) {
+      controller.abort();
+      finish(controller);
+    }
+  }, [finish]);
+
+  useEffect(() => () => inFlight.current?.abort(), []);
+
   const generate = useCallback(async (
     topic: string,
     format: ContentFormat = 'article',
     context?: string
   ) => {
-    setIsLoading(true);
-    setError(null);
-    setContent(null);
+    const controller = start();
 
     try {
       const response = await client.generate({
         topic,
         format,
         additional_context: context,
-      });
-      setContent(response.content);
+      }, controller.signal);
+      if (inFlight.current === controller) {
+        setContent(response.content);
+      }
     } catch (err) {
-      setError(err instanceof Error ? err : new Error('Unknown error'));
-      throw err;
-    } finally {
-      setIsLoading(false);
+      finish(controller, err);
+      return;
+    }
+    finish(controller);
+  }, [options.baseUrl, options.apiKey, start, finish]);
+
+  const generateStream = useCallback(async (
+    topic: string,
+    format: ContentFormat = 'article',
+    context?: string
+  ) => {
+    const controller = start();
+
+    try {
+      await client.generateStream(
+        { topic, format, additional_context: context },
+        (_text, soFar) => {
+          if (inFlight.current === controller) setContent(soFar);
+        },
+        controller.signal
+      );
+    } catch (err) {
+      finish(controller, err);
+      return;
     }
-  }, [options.baseUrl, options.apiKey]);
+    finish(controller);
+  }, [options.baseUrl, options.apiKey, start, finish]);
 
   const clearContent = useCallback(() => setContent(null), []);
   const clearError = useCallback(() => setError(null), []);
 
   return {
     generate,
+    generateStream,
+    cancel,
     isLoading,
     error,
     content,
@@ -221,4 +514,38 @@ export function useBenovitzContent(options: UseBenovitzContentOptions = {}): Use
   };
 }
 
+/**
+ * Live token, cost and latency estimate for a request being typed. Calls are
+ * debounced by `delayMs` and each new one aborts the previous.
+ */
+export function useEstimate(
+  topic: string,
+  format: ContentFormat = 'article',
+  context?: string,
+  options: UseBenovitzContentOptions = {},
+  delayMs = 150
+): Estimate | null {
+  const [estimate, setEstimate] = useState<Estimate | null>(null);
+  const client = useMemo(() => new BenovitzContentClient(options), [options.baseUrl, options.apiKey]);
+
+  useEffect(() => {
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      client
+        .estimate({ topic, format, additional_context: context }, controller.signal)
+        .then(setEstimate)
+        .catch(() => {
+          // Aborted or unavailable; keep showing the last estimate
+        });
+    }, delayMs);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [client, topic, format, context, delayMs]);
+
+  return estimate;
+}
+
 export default BenovitzContentClient;
@@ -0,0 +1,140 @@
+"""
+Request coalescing (single-flight) for the Rabbi Moshe Benovitz Content Generator.
+
+Concurrent requests with the same key attach to one in-flight upstream call
+instead of each issuing their own. The call runs in its own task and records
+every streamed chunk, so a late joiner replays what it missed and then follows
+live; the final value or exception is delivered to every waiter. If every
+waiter gives up, the upstream call is cancelled.
+"""
+
+import contextlib
+from typing import AsyncIterator, Awaitable, Callable, Tuple
+
+import metrics
+from lazy_imports import lazy_import
+
+asyncio = lazy_import("asyncio")
+
+COALESCED_REQUESTS = metrics.register(metrics.Counter(
+    "benovitz_coalesced_requests_total",
+    "Requests that started (leader) or joined (follower) an in-flight generation",
+    ["role"]
+))
+ABANDONED_WAITERS = metrics.register(metrics.Counter(
+    "benovitz_coalesced_abandoned_total",
+    "Waiters that gave up on an in-flight generation before it finished"
+))
+CANCELLED_FLIGHTS = metrics.register(metrics.Counter(
+    "benovitz_coalesced_cancelled_total",
+    "In-flight generations cancelled because every waiter gave up"
+))
+
+
+class FlightCancelled(Exception):
+    """The in-flight call was cancelled because every waiter gave up."""
+
+
+class Flight:
+    """One in-flight upstream call and everything it has produced so far."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.value = None
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self._updated = asyncio.Event()
+
+    def emit(self, chunk) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def _notify(self) -> None:
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def stream(self) -> AsyncIterator:
+        """Yield every chunk from the start, then live ones; raises the call's error, if any."""
+
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.finished:
+                break
+            await self._updated.wait()
+
+        if self.error is not None:
+            raise self.error
+
+    async def wait(self):
+        """Wait for the call to finish and return its value (or raise its error)."""
+
+        while not self.finished:
+            await self._updated.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key."""
+
+    def __init__(self):
+        self._flights = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def _start(self, key: str, produce: Callable[[Callable], Awaitable]) -> Flight:
+        flight = Flight()
+
+        async def run():
+            try:
+                flight.value = await produce(flight.emit)
+            except asyncio.CancelledError:
+                flight.error = FlightCancelled("Generation cancelled: every waiter gave up")
+            except Exception as exc:
+                flight.error = exc
+            finally:
+                flight.finished = True
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight._notify()
+
+        self._flights[key] = flight
+        flight.task = asyncio.create_task(run())
+        return flight
+
+    @contextlib.asynccontextmanager
+    async def attach(self, key: str, produce: Callable[[Callable], Awaitable]) -> AsyncIterator[Tuple[Flight, bool]]:
+        """
+        Join the in-flight call for `key`, starting it with `produce(emit)` if none exists.
+
+        Yields `(flight, leader)` where `leader` is True for the caller that
+        started the call. `produce` receives an `emit(chunk)` callback for
+        streamed output and returns the final value.
+        """
+
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._start(key, produce)
+        COALESCED_REQUESTS.inc(role="leader" if leader else "follower")
+
+        flight.waiters += 1
+        try:
+            yield flight, leader
+        finally:
+            flight.waiters -= 1
+            if not flight.finished:
+                ABANDONED_WAITERS.inc()
+                if flight.waiters == 0:
+                    # Detach first so new requests start a fresh call
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    CANCELLED_FLIGHTS.inc()
+                    flight.task.cancel()
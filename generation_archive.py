@@ -0,0 +1,385 @@
+"""
+Generation archive for the Rabbi Moshe Benovitz Content Generator.
+
+With BENOVITZ_ARCHIVE_PATH set, every fresh generation (not cache hits) is
+appended to that SQLite file with its topic, format, context, model, token usage and timings, and indexed with
+FTS5 so past articles, outlines and posts can be found again instead of paid
+for twice. Writes go through a queue to a background thread that commits them
+in batches, so archiving never blocks a request; searches see a document once
+its batch is committed, typically well under a second later.
+"""
+
+import atexit
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+ARCHIVE_WRITES = metrics.register(metrics.Counter(
+    "benovitz_archive_documents_total",
+    "Generations handed to the archive, by outcome (written, dropped when the queue is full, failed)",
+    ["result"]
+))
+
+# Columns of the documents table, in insert order
+COLUMNS = (
+    "topic", "format", "additional_context", "content", "model", "variant",
+    "input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens",
+    "ttft_ms", "model_ms", "created_at"
+)
+
+# Values stored when a document leaves a column out (or sets it to None)
+_DEFAULTS = {
+    "additional_context": "", "variant": 0, "input_tokens": 0, "output_tokens": 0,
+    "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0
+}
+
+# bm25 weights for topic, additional_context, content and format: a topic match
+# counts most, and format is only indexed for filtering
+RANK = "bm25(10.0, 2.0, 1.0, 0.0)"
+
+# Query terms whose document counts are remembered between searches
+MAX_TERM_COUNTS = 10000
+
+_QUERY_TERM = re.compile(r"\w+\*?")
+
+_STOP = object()
+
+
+def query_terms(text: str) -> List[str]:
+    """The words of free text as quoted FTS5 terms; a trailing * matches prefixes."""
+
+    quoted = []
+    for term in _QUERY_TERM.findall(text):
+        prefix = term.endswith("*")
+        quoted.append('"' + term.rstrip("*") + '"' + ("*" if prefix else ""))
+    return quoted
+
+
+def match_expression(terms: List[str], format_value: Optional[str] = None) -> str:
+    """FTS5 query for documents (of `format_value`, if given) whose topic, context or content has every term."""
+
+    expression = "{topic additional_context content} : (" + " ".join(terms) + ")"
+    if format_value:
+        expression = f'format : "{format_value}" AND ' + expression
+    return expression
+
+
+def match_query(text: str, format_value: Optional[str] = None) -> Optional[str]:
+    """match_expression() for free text, or None if it has no words."""
+
+    terms = query_terms(text)
+    return match_expression(terms, format_value) if terms else None
+
+
+class GenerationArchive:
+    """Append-only SQLite archive of generations with an FTS5 index over topic, context and content."""
+
+    def __init__(self, path: str, batch_size: int = 256, max_pending: int = 10000, rank_window: int = 1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.rank_window = rank_window
+        # Quoted term -> (archive size when counted, documents containing it)
+        self._term_counts: Dict[str, Tuple[int, int]] = {}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                format TEXT NOT NULL,
+                additional_context TEXT NOT NULL DEFAULT '',
+                content TEXT NOT NULL,
+                model TEXT,
+                variant INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_creation_input_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_read_input_tokens INTEGER NOT NULL DEFAULT 0,
+                ttft_ms REAL,
+                model_ms REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_format ON documents (format, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                topic, additional_context, content, format,
+                content='documents', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2', prefix='3'
+            );
+            CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, topic, additional_context, content, format)
+                VALUES (new.id, new.topic, new.additional_context, new.content, new.format);
+            END;
+            INSERT INTO documents_fts (documents_fts, rank) VALUES ('rank', '{RANK}');
+            """
+        )
+        self._writer = threading.Thread(target=self._write_loop, name="generation-archive", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, document: dict) -> bool:
+        """
+        Queue a generation for writing without blocking. Returns False (and
+        counts a drop) if the writer has fallen `max_pending` documents behind.
+        """
+
+        for column, default in _DEFAULTS.items():
+            if document.get(column) is None:
+                document[column] = default
+        document.setdefault("created_at", time.time())
+        try:
+            self._queue.put_nowait(document)
+        except queue.Full:
+            ARCHIVE_WRITES.inc(result="dropped")
+            return False
+        return True
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = []
+            waiters = []
+            item = self._queue.get()
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(conn, batch)
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[dict]) -> None:
+        rows = [tuple(document.get(column) for column in COLUMNS) for document in batch]
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT INTO documents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            ARCHIVE_WRITES.inc(len(batch), result="failed")
+            print(f"Error: Could not archive {len(batch)} generation(s): {exc}", file=sys.stderr)
+        else:
+            ARCHIVE_WRITES.inc(len(batch), result="written")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything recorded so far is committed; False on timeout."""
+
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Commit pending documents and stop the writer."""
+
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout)
+
+    def search(
+        self,
+        query: str,
+        format_value: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Documents matching every word of `query`, best first, each with a
+        highlighted `snippet` of its content (matches wrapped in [ and ]).
+
+        Ranking cost grows with how many documents each word appears in, so
+        two shortcuts keep searches in the milliseconds on large archives:
+        words found in more than half the archive, which bm25 gives no weight,
+        are ignored like stopwords (if every word is that common, results come
+        newest first with a null `score`); and when more than `rank_window`
+        documents match, only the newest `rank_window` (or `offset + limit`)
+        are ranked.
+        """
+
+        terms = query_terms(query)
+        if not terms:
+            return []
+        window = max(self.rank_window, offset + limit)
+        select = (
+            "SELECT d.id, d.topic, d.format, d.additional_context, d.model, d.created_at, "
+            "snippet(documents_fts, 2, '[', ']', '...', 24) AS snippet, {score} AS score "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+        )
+
+        with self._lock:
+            (documents,) = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM documents").fetchone()
+            selective = [term for term in terms if not self._common(term, documents)]
+            expression = match_expression(selective or terms, format_value)
+
+            if not selective:
+                rows = self._conn.execute(
+                    select.format(score="NULL") + "WHERE documents_fts MATCH ? "
+                    "ORDER BY documents_fts.rowid DESC LIMIT ? OFFSET ?",
+                    (expression, limit, offset)
+                ).fetchall()
+            else:
+                # Walking matches newest first in rowid order is cheap; scoring them is not
+                cutoff = self._conn.execute(
+                    "SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                    (expression, window - 1)
+                ).fetchone()
+                rows = self._conn.execute(
+                    select.format(score="-documents_fts.rank") + "WHERE documents_fts MATCH ? "
+                    "AND documents_fts.rowid >= ? ORDER BY documents_fts.rank LIMIT ? OFFSET ?",
+                    (expression, cutoff[0] if cutoff else 0, limit, offset)
+                ).fetchall()
+
+        return [
+            {**dict(row), "score": round(row["score"], 4) if row["score"] is not None else None}
+            for row in rows
+        ]
+
+    def _common(self, term: str, documents: int) -> bool:
+        """
+        Whether a quoted query term appears in more than half of the archive's
+        `documents`, where bm25 clamps its weight to nearly zero. Counts are
+        remembered until the archive grows by a tenth.
+        """
+
+        if term.endswith("*") or documents < 2 * self.rank_window:
+            return False
+        counted = self._term_counts.get(term)
+        if counted is None or documents > counted[0] * 1.1:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM documents_fts WHERE documents_fts MATCH ?",
+                (match_expression([term]),)
+            ).fetchone()
+            if len(self._term_counts) >= MAX_TERM_COUNTS:
+                self._term_counts.clear()
+            counted = self._term_counts[term] = (documents, count)
+        return counted[1] > documents / 2
+
+    def export(
+        self,
+        query: Optional[str] = None,
+        format_value: Optional[str] = None,
+        after_id: int = 0,
+        page_size: int = 500
+    ) -> Iterator[dict]:
+        """
+        Yield full documents in id order, optionally only those matching
+        `query` or of one format. Reads a page at a time, so exports of any
+        size run in constant memory; `after_id` resumes an interrupted export.
+        """
+
+        sql = f"SELECT d.id, {', '.join('d.' + column for column in COLUMNS)} FROM documents d"
+        conditions = ["d.id > ?"]
+        params = []
+        if query:
+            expression = match_query(query, format_value)
+            if expression is None:
+                return
+            conditions.append("d.id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)")
+            params.append(expression)
+        elif format_value:
+            conditions.append("d.format = ?")
+            params.append(format_value)
+        sql += " WHERE " + " AND ".join(conditions) + " ORDER BY d.id LIMIT ?"
+
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, [after_id, *params, page_size]).fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1]["id"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            (page_count,) = self._conn.execute("PRAGMA page_count").fetchone()
+            (page_size,) = self._conn.execute("PRAGMA page_size").fetchone()
+        return {
+            "path": self.path,
+            "documents": count,
+            "pending": self._queue.qsize(),
+            "bytes": page_count * page_size
+        }
+
+
+def export_lines(documents: Iterator[dict]) -> Iterator[str]:
+    """NDJSON lines for exported documents."""
+
+    for document in documents:
+        yield json.dumps(document, ensure_ascii=False) + "\n"
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def create_archive_from_env() -> Optional[GenerationArchive]:
+    """
+    Build the archive at BENOVITZ_ARCHIVE_PATH, or None (archiving off) if it
+    is unset. Opening creates the schema and FTS5 index, so servers open it
+    at startup rather than on a request.
+    """
+
+    path = os.environ.get("BENOVITZ_ARCHIVE_PATH")
+    if not path:
+        return None
+    return GenerationArchive(path)
+
+
+def get_archive() -> Optional[GenerationArchive]:
+    """Return the process-wide archive, or None if archiving is off."""
+
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = create_archive_from_env() or False
+                # One-shot CLI runs exit right after printing; commit their documents first
+                atexit.register(close_archive)
+    return _archive or None
+
+
+def set_archive(archive: Optional[GenerationArchive]) -> None:
+    """Replace the process-wide archive (None disables archiving)."""
+
+    global _archive
+    with _archive_lock:
+        _archive = archive if archive is not None else False
+
+
+def close_archive() -> None:
+    """Commit pending documents of the process-wide archive, if one was opened."""
+
+    if _archive:
+        _archive.close()
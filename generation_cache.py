@@ -0,0 +1,254 @@
+"""
+Generation response cache for the Rabbi Moshe Benovitz Content Generator.
+
+Caches finished generations keyed by the normalized request plus everything
+that shapes the model output (model, prompt hash, max_tokens, temperature), so
+repeat requests skip the paid upstream call. Two backends are provided: an
+in-memory LRU with TTL, and an SQLite file that survives restarts and works
+offline. Caching is off unless BENOVITZ_CACHE_BACKEND selects a backend, since
+a cache hit answers with an earlier generation instead of a fresh sample.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+CACHE_MODES = ("use", "bypass", "refresh")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different requests share a key."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(
+    topic: str,
+    format_value: str,
+    additional_context: str,
+    model: str,
+    prompt_hash: str,
+    max_tokens: int,
+    variant: int = 0,
+    temperature: Optional[float] = None
+) -> str:
+    """Build the cache key for a generation request; each variant index caches separately."""
+
+    payload = json.dumps([
+        normalize_text(topic),
+        format_value,
+        normalize_text(additional_context),
+        model,
+        prompt_hash,
+        max_tokens,
+        variant,
+        temperature
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """In-memory LRU cache with a per-entry TTL."""
+
+    backend = "memory"
+    # Lookups are cheap enough to run on the event loop
+    blocking = False
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(key: str, value: dict) -> int:
+        return sys.getsizeof(key) + sum(sys.getsizeof(v) for v in value.values())
+
+    def _remove(self, key: str) -> None:
+        expires_at, value = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, value)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._bytes += self._entry_size(key, value)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._bytes
+            }
+
+
+class SQLiteCache:
+    """
+    On-disk cache backed by a local SQLite file; evicts least recently used
+    entries. Calls block on disk I/O, so async callers run them in a thread.
+    """
+
+    backend = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl_seconds: float = 7 * 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_accessed ON generations (accessed_at)")
+        # Kept in memory so set() need not count the table
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._entries -= self._conn.execute("DELETE FROM generations WHERE key = ?", (key,)).rowcount
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE generations SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE generations SET value = ?, expires_at = ?, accessed_at = ? WHERE key = ?",
+                (json.dumps(value), now + self.ttl_seconds, now, key)
+            ).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT INTO generations (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + self.ttl_seconds, now)
+                )
+                self._entries += 1
+            if self._entries > self.max_entries:
+                self._entries -= self._conn.execute(
+                    "DELETE FROM generations WHERE key IN "
+                    "(SELECT key FROM generations ORDER BY accessed_at LIMIT ?)",
+                    (self._entries - self.max_entries,)
+                ).rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM generations")
+            self._entries = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            (page_count,) = self._conn.execute("PRAGMA page_count").fetchone()
+            (page_size,) = self._conn.execute("PRAGMA page_size").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "path": self.path,
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": page_count * page_size
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def create_cache_from_env():
+    """
+    Build the cache described by the environment.
+
+    BENOVITZ_CACHE_BACKEND selects "memory", "sqlite" or "off" (the default);
+    BENOVITZ_CACHE_TTL, BENOVITZ_CACHE_MAX_ENTRIES and BENOVITZ_CACHE_PATH tune it.
+    """
+
+    backend = os.environ.get("BENOVITZ_CACHE_BACKEND", "off").lower()
+    ttl = os.environ.get("BENOVITZ_CACHE_TTL")
+    max_entries = os.environ.get("BENOVITZ_CACHE_MAX_ENTRIES")
+
+    kwargs = {}
+    if ttl:
+        kwargs["ttl_seconds"] = float(ttl)
+    if max_entries:
+        kwargs["max_entries"] = int(max_entries)
+
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        path = os.environ.get("BENOVITZ_CACHE_PATH", "benovitz_cache.sqlite3")
+        return SQLiteCache(path, **kwargs)
+    return MemoryCache(**kwargs)
+
+
+def get_generation_cache():
+    """Return the process-wide generation cache, or None if caching is off."""
+
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache_from_env() or False
+    return _cache or None
+
+
+def set_generation_cache(cache) -> None:
+    """Replace the process-wide generation cache (None disables caching)."""
+
+    global _cache
+    with _cache_lock:
+        _cache = cache if cache is not None else False
@@ -0,0 +1,308 @@
+"""
+Hedged upstream requests for the Rabbi Moshe Benovitz Content Generator.
+
+When hedging is on, a generation that has not produced its first token by a
+deadline (a percentile of recently observed time-to-first-token for the model)
+gets a second attempt, optionally on a fallback model. Whichever attempt
+streams first wins and the other is cancelled. A losing primary is kept only
+until its own first token, which costs nothing beyond the input tokens it has
+already consumed, so the latency the hedge saved is measured rather than guessed.
+
+A per-model circuit breaker counts consecutive failures; while it is open,
+calls go straight to the route's fallback model.
+"""
+
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import metrics
+from lazy_imports import lazy_import
+
+asyncio = lazy_import("asyncio")
+
+HEDGE_ELIGIBLE = metrics.register(metrics.Counter(
+    "benovitz_hedge_eligible_total", "Upstream calls made with hedging enabled"
+))
+HEDGES = metrics.register(metrics.Counter(
+    "benovitz_hedges_total", "Hedge attempts started because the first token was late"
+))
+HEDGE_WINS = metrics.register(metrics.Counter(
+    "benovitz_hedge_wins_total", "Hedged calls by the attempt that streamed first", ["winner"]
+))
+HEDGE_SAVED_SECONDS = metrics.register(metrics.Histogram(
+    "benovitz_hedge_saved_seconds", "Time to first token saved when the hedge beat the primary"
+))
+BREAKER_OPEN = metrics.register(metrics.Gauge(
+    "benovitz_circuit_breaker_open", "1 while a model's circuit breaker is open", ["model"]
+))
+FALLBACK_CALLS = metrics.register(metrics.Counter(
+    "benovitz_fallback_calls_total", "Calls routed to a fallback model because the breaker was open", ["model"]
+))
+
+
+class HedgePolicy:
+    """Per-model time-to-first-token window and the hedge deadline derived from it."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 95,
+        min_delay: float = 0.5,
+        initial_delay: float = 3.0,
+        window: int = 200,
+        min_samples: int = 20,
+        measure_timeout: float = 30.0
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.measure_timeout = measure_timeout
+        self._samples: Dict[str, deque] = {}
+
+    def observe(self, model: str, ttft_seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(ttft_seconds)
+
+    def deadline(self, model: str) -> float:
+        """Seconds to wait for a first token before hedging a call to `model`."""
+
+        samples = self._samples.get(model)
+        if samples is None or len(samples) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+
+class CircuitBreaker:
+    """
+    Opens for a model after `threshold` consecutive failures. After `cooldown`
+    seconds one trial call is let through; its outcome closes or reopens it.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+
+    def allow(self, model: str) -> bool:
+        open_until = self._open_until.get(model)
+        if open_until is None:
+            return True
+        if time.monotonic() < open_until:
+            return False
+        # Half-open: let one trial through and hold the rest until it reports back
+        self._open_until[model] = time.monotonic() + self.cooldown
+        return True
+
+    def record_success(self, model: str) -> None:
+        self._failures[model] = 0
+        if self._open_until.pop(model, None) is not None:
+            BREAKER_OPEN.set(0, model=model)
+
+    def record_failure(self, model: str) -> None:
+        failures = self._failures[model] = self._failures.get(model, 0) + 1
+        if failures >= self.threshold:
+            self._open_until[model] = time.monotonic() + self.cooldown
+            BREAKER_OPEN.set(1, model=model)
+
+    def is_open(self, model: str) -> bool:
+        return model in self._open_until
+
+
+# Strong references to running _measure_loser tasks
+_measuring = set()
+
+
+class _Attempt:
+    """One upstream attempt, drained into a queue by its own task."""
+
+    def __init__(self, start: Callable[[], AsyncIterator[str]], notify: Callable[[], None]):
+        self.started_at = time.perf_counter()
+        self.first_at: Optional[float] = None
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.chunks = asyncio.Queue()
+        self.ready = asyncio.Event()
+        self._notify = notify
+        self.task = asyncio.create_task(self._run(start()))
+
+    def _mark_ready(self) -> None:
+        self.ready.set()
+        self._notify()
+
+    async def _run(self, stream: AsyncIterator[str]) -> None:
+        try:
+            async for text in stream:
+                if self.first_at is None:
+                    self.first_at = time.perf_counter()
+                    self._mark_ready()
+                self.chunks.put_nowait(text)
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self.chunks.put_nowait(None)
+            self._mark_ready()
+
+
+class HedgedStream:
+    """
+    Race a primary attempt against a hedge started after `deadline` seconds
+    without a first token. `winner` is "primary" or "hedge" once streaming starts,
+    and `hedge_delay` is how long after the primary the hedge was started.
+    """
+
+    def __init__(
+        self,
+        primary: Callable[[], AsyncIterator[str]],
+        hedge: Callable[[], AsyncIterator[str]],
+        deadline: float,
+        measure_timeout: float = 30.0
+    ):
+        self.primary = primary
+        self.hedge = hedge
+        self.deadline = deadline
+        self.measure_timeout = measure_timeout
+        self.winner: Optional[str] = None
+        self.hedge_delay = 0.0
+        self._updated = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def stream(self) -> AsyncIterator[str]:
+        HEDGE_ELIGIBLE.inc()
+        primary = _Attempt(self.primary, self._notify)
+        attempts = {"primary": primary}
+        hedge_at = primary.started_at + self.deadline
+        finished = False
+
+        try:
+            while True:
+                winner = next((name for name, a in attempts.items() if a.ready.is_set() and a.error is None), None)
+                if winner is not None:
+                    break
+                if all(a.done for a in attempts.values()):
+                    raise primary.error
+
+                updated = self._updated
+                timeout = None if "hedge" in attempts else max(0.0, hedge_at - time.perf_counter())
+                try:
+                    await asyncio.wait_for(updated.wait(), timeout)
+                except asyncio.TimeoutError:
+                    HEDGES.inc()
+                    attempts["hedge"] = _Attempt(self.hedge, self._notify)
+                    self.hedge_delay = attempts["hedge"].started_at - primary.started_at
+
+            self.winner = winner
+            if "hedge" in attempts:
+                HEDGE_WINS.inc(winner=winner)
+                if winner == "hedge":
+                    task = asyncio.create_task(self._measure_loser(primary, attempts["hedge"]))
+                    _measuring.add(task)
+                    task.add_done_callback(_measuring.discard)
+                else:
+                    attempts["hedge"].task.cancel()
+
+            chosen = attempts[winner]
+            while True:
+                text = await chosen.chunks.get()
+                if text is None:
+                    break
+                yield text
+            finished = True
+            if chosen.error is not None:
+                raise chosen.error
+        finally:
+            for name, attempt in attempts.items():
+                # A primary that lost to the hedge is cancelled by _measure_loser,
+                # unless the caller went away first
+                if not attempt.done and not (name == "primary" and self.winner == "hedge" and finished):
+                    attempt.task.cancel()
+
+    async def _measure_loser(self, primary: _Attempt, hedge: _Attempt) -> None:
+        """Let a slow primary reach its first token to measure the hedge's saving, then cancel it."""
+
+        try:
+            await asyncio.wait_for(primary.ready.wait(), self.measure_timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            primary.task.cancel()
+        if primary.error is not None:
+            return
+        # Without a first token by the timeout, the saving is a lower bound
+        reached = primary.first_at or time.perf_counter()
+        HEDGE_SAVED_SECONDS.observe(max(0.0, reached - hedge.first_at))
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+_policy = None
+_breaker = None
+
+
+def create_hedge_policy_from_env() -> HedgePolicy:
+    """
+    Build the hedge policy from the environment: BENOVITZ_HEDGE=1 enables it;
+    BENOVITZ_HEDGE_PERCENTILE, BENOVITZ_HEDGE_MIN_DELAY and
+    BENOVITZ_HEDGE_INITIAL_DELAY shape the deadline.
+    """
+
+    return HedgePolicy(
+        enabled=os.environ.get("BENOVITZ_HEDGE", "").lower() in ("1", "true", "yes", "on"),
+        percentile=_env_float("BENOVITZ_HEDGE_PERCENTILE", 95),
+        min_delay=_env_float("BENOVITZ_HEDGE_MIN_DELAY", 0.5),
+        initial_delay=_env_float("BENOVITZ_HEDGE_INITIAL_DELAY", 3.0)
+    )
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Return the process-wide hedge policy, creating it on first use."""
+
+    global _policy
+    if _policy is None:
+        _policy = create_hedge_policy_from_env()
+    return _policy
+
+
+def set_hedge_policy(policy: Optional[HedgePolicy]) -> None:
+    """Replace the process-wide hedge policy (None rebuilds it from the environment on next use)."""
+
+    global _policy
+    _policy = policy
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker, configured by BENOVITZ_BREAKER_THRESHOLD
+    and BENOVITZ_BREAKER_COOLDOWN on first use.
+    """
+
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            threshold=int(_env_float("BENOVITZ_BREAKER_THRESHOLD", 5)),
+            cooldown=_env_float("BENOVITZ_BREAKER_COOLDOWN", 30.0)
+        )
+    return _breaker
+
+
+def set_circuit_breaker(breaker: Optional[CircuitBreaker]) -> None:
+    """Replace the process-wide circuit breaker (None rebuilds it from the environment on next use)."""
+
+    global _breaker
+    _breaker = breaker
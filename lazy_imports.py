@@ -0,0 +1,31 @@
+"""
+Deferred imports for start-up sensitive code.
+
+The CLI is run thousands of times from shell scripts, and most runs
+(--prompt-only, --show-voice-profile, --help) never touch the event loop or
+the network. `lazy_import` hands back a module whose code only runs on first
+attribute access, so those runs skip the import cost entirely.
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return module `name`, deferring its execution until an attribute is used.
+    A module that is already imported is returned as is.
+    """
+
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
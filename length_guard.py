@@ -0,0 +1,457 @@
+"""
+Format-aware output length guard for the Rabbi Moshe Benovitz Content Generator.
+
+Each ContentFormat's instructions set a target length (a short reflection is
+75-150 words, an article 800-1200) and a structure, but max_tokens only caps
+the worst case, so a model that runs long is paid for in full. A LengthGuard
+watches a generation as it streams, counting words, the sections it labels
+and hashtags, and stops it:
+
+- at the first paragraph break once the word count is past the format's
+  maximum plus a slack (for structured formats, only once the final section
+  has begun), or at any line break past a hard limit; a line still running
+  past the hard limit is cut at its next sentence end, or at a word if no
+  sentence ends soon after;
+- once the piece is complete: after the hashtag line of a social post, or
+  after the final section of an outline when a new heading or rule starts
+  (typically "Notes for the presenter" or sign-offs nobody asked for).
+
+Nothing past the stop point reaches the caller: text is released as it
+arrives, except for the start of a line while the guard is deciding whether
+that line is where the piece ends, and the words past the hard limit while
+it looks for a sentence end. Every finished generation gets a length
+report (words, target, stop reason, missing sections), and LengthStats keeps
+per-format totals for GET /length/stats.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+LENGTH_STOPS = metrics.register(metrics.Counter(
+    "benovitz_length_guard_stops_total",
+    "Generations stopped early by the length guard, by reason (over_length or complete)",
+    ["format", "reason"]
+))
+OVERRUN_WORDS = metrics.register(metrics.Counter(
+    "benovitz_length_overrun_words_total",
+    "Words delivered past a format's maximum length",
+    ["format"]
+))
+MISSING_SECTIONS = metrics.register(metrics.Counter(
+    "benovitz_missing_sections_total",
+    "Generations missing a section (or hashtags) their format calls for",
+    ["format", "section"]
+))
+WORD_BUCKETS = (50, 75, 100, 150, 200, 300, 500, 800, 1000, 1200, 1500, 2000)
+OUTPUT_WORDS = metrics.register(metrics.Histogram(
+    "benovitz_output_words", "Words per fresh generation", ["format"], WORD_BUCKETS
+))
+
+
+@dataclass(frozen=True)
+class FormatSpec:
+    """Length and structure a format's instructions ask for."""
+
+    min_words: Optional[int] = None
+    max_words: Optional[int] = None
+    # Section labels in order; the last one ends the piece
+    sections: Tuple[str, ...] = ()
+    # False when the format is usually written as unlabeled prose: sections
+    # are then only checked if the piece labels at least two of them
+    labeled: bool = True
+    min_hashtags: int = 0
+
+
+# Keyed by ContentFormat value, from FORMAT_INSTRUCTIONS
+FORMAT_SPECS: Dict[str, FormatSpec] = {
+    "article": FormatSpec(
+        min_words=800,
+        max_words=1200,
+        sections=("Opening Hook", "The Challenge", "Torah Perspective", "Practical Application", "Call to Growth"),
+        labeled=False
+    ),
+    # A hook, 2-4 sentences, 1-2 more and a question, then hashtags
+    "social_media": FormatSpec(max_words=150, min_hashtags=3),
+    "shiur_outline": FormatSpec(
+        sections=(
+            "Title", "Big Question", "Opening Hook", "Main Teaching Points", "Discussion Questions",
+            "Real-World Application", "Takeaway"
+        )
+    ),
+    "short_reflection": FormatSpec(min_words=75, max_words=150),
+    "advisor_training": FormatSpec(
+        sections=("Why This Matters", "Key Principles", "Scenarios", "The Bigger Picture", "Your Challenge")
+    ),
+}
+
+
+@dataclass(frozen=True)
+class LengthPolicy:
+    """How the guard treats generations that run past their format's target."""
+
+    # False only reports (flags and stats); generations always run to the end
+    stop: bool = True
+    # Stop at a paragraph break this fraction past max_words...
+    slack: float = 0.1
+    # ...or at any line break this fraction past it, or within a line at the
+    # next sentence end (at a word if none ends within sentence_reach words)
+    hard_slack: float = 0.3
+    sentence_reach: int = 30
+
+
+# "## Label", "**Label**", "1. **Label**", "- **Label**" or "Label:" at the start of a line
+_LABEL = re.compile(
+    r"^\s*(?P<marker>#{1,6}\s+|(?:\d+\.\s+|[-*]\s+)?(?:\*\*|__))?(?P<label>[^*_:\n]{1,80})(?P<colon>:)?"
+)
+_RULE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+_HASHTAG = re.compile(r"(?<![\w#])#[^\W\d_]\w*")
+_WORD = re.compile(r"\S+")
+_SENTENCE_END = re.compile(r"[.!?\u2026][\"'\u201d\u2019)\]*_]*$")
+
+
+def _is_heading(line: str) -> bool:
+    """A markdown heading or a line that is only bold text (optionally ending in a colon)."""
+
+    stripped = line.strip()
+    if stripped.startswith("#") and not _HASHTAG.match(stripped):
+        return True
+    return (
+        (stripped.startswith("**") and stripped.rstrip(":").endswith("**"))
+        or (stripped.startswith("__") and stripped.rstrip(":").endswith("__"))
+    )
+
+
+class LengthGuard:
+    """
+    Watches one streaming generation. feed() each text delta and emit what it
+    returns; once `stopped` is set, stop reading the stream. close() returns
+    any text still held back when the stream ends, and report() describes
+    the result.
+    """
+
+    def __init__(self, spec: FormatSpec, policy: LengthPolicy = LengthPolicy()):
+        self.spec = spec
+        self.policy = policy
+        self.received = ""
+        self.words = 0
+        self.hashtags = 0
+        self.found: List[str] = []
+        self.stopped: Optional[str] = None
+        self._released = 0
+        # Start of the first line not yet counted
+        self._line = 0
+        self._cut: Optional[int] = None
+        # Scan position, words and hard limit position within the current line
+        self._scan = -1
+        self._scan_words = 0
+        self._limit_end: Optional[int] = None
+        self._paragraph_start = True
+        self._final_started = False
+        self._final_content = False
+        self._after_hashtags = False
+
+        max_words = spec.max_words if policy.stop else None
+        self._soft_limit = max_words * (1 + policy.slack) if max_words else None
+        self._hard_limit = max_words * (1 + policy.hard_slack) if max_words else None
+
+    @property
+    def content(self) -> str:
+        """Text up to the stop point (everything received if the guard never stopped)."""
+
+        return self.received[:self._cut].rstrip() if self._cut is not None else self.received
+
+    def feed(self, text: str) -> str:
+        """Take a text delta and return the part that may be emitted now."""
+
+        if self.stopped:
+            return ""
+        self.received += text
+
+        while True:
+            newline = self.received.find("\n", self._line)
+            line = self.received[self._line:] if newline < 0 else self.received[self._line:newline]
+            decision = self._decide(line, complete=newline >= 0)
+            if decision == "wait":
+                release = max(self._line, self._released)
+                break
+            if decision is not None:
+                self._stop(decision)
+                release = self._cut
+                break
+            cut, final = self._overrun(line, complete=newline >= 0)
+            if final:
+                self._count(line[:cut])
+                self._stop("over_length", self._line + cut)
+                release = self._cut
+                break
+            if cut is not None:
+                release = max(self._line + cut, self._released)
+                break
+            if newline < 0:
+                release = len(self.received)
+                break
+            self._count(line)
+            self._line = newline + 1
+
+        emitted = self.received[self._released:release]
+        self._released = release
+        return emitted
+
+    def close(self) -> str:
+        """Count the last line and return anything still held back, once the stream has ended."""
+
+        if self.stopped:
+            return ""
+        self._count(self.received[self._line:])
+        self._line = len(self.received)
+        emitted = self.received[self._released:]
+        self._released = len(self.received)
+        return emitted
+
+    def _decide(self, line: str, complete: bool) -> Optional[str]:
+        """Stop reason if the piece should end before `line`, "wait" if that isn't known yet, else None."""
+
+        stripped = line.lstrip()
+        if not stripped:
+            return None if complete or not line else "wait"
+
+        if self._hard_limit and self.words >= self._hard_limit:
+            return "over_length"
+        if self._soft_limit and self._paragraph_start and self.words >= self._soft_limit:
+            if not self.spec.sections or self._final_started or not self._labeled():
+                return "over_length"
+        if not self.policy.stop:
+            return None
+
+        if self._after_hashtags and not stripped.startswith("#"):
+            return "complete"
+        if self._final_content and stripped[0] in "#*_-":
+            if not complete:
+                # Held until the line shows whether it is a new heading or rule
+                return "wait"
+            if _RULE.match(line) or (_is_heading(line) and self._section(line) is None):
+                return "complete"
+        return None
+
+    def _overrun(self, line: str, complete: bool) -> Tuple[Optional[int], bool]:
+        """
+        Where to end a line that runs past the hard limit: (offset, True) to
+        cut it there, (offset, False) to hold back from offset while the
+        sentence end is not known yet, or (None, False) if the line can stand.
+        """
+
+        if not self._hard_limit or not self.policy.stop:
+            return None, False
+        if self._scan < self._line:
+            # A new line: words before the limit are only counted once
+            self._scan = self._line
+            self._scan_words = self.words
+            self._limit_end = None
+        line_end = self._line + len(line)
+        reach = 0
+        for match in _WORD.finditer(self.received, self._scan, line_end):
+            # A word at the end of an unfinished line may still be growing
+            growing = match.end() == line_end and not complete
+            if self._limit_end is None:
+                if growing:
+                    break
+                if not _HASHTAG.match(match.group()):
+                    self._scan_words += 1
+                self._scan = match.end()
+                if self._scan_words < self._hard_limit:
+                    continue
+                self._limit_end = match.end()
+            else:
+                if growing:
+                    break
+                reach += 1
+            if _SENTENCE_END.search(match.group()):
+                return match.end() - self._line, True
+            if reach >= self.policy.sentence_reach:
+                return self._limit_end - self._line, True
+        if self._limit_end is None or complete:
+            # A complete line ends at a line break, where the next line stops
+            return None, False
+        return self._limit_end - self._line, False
+
+    def _labeled(self) -> bool:
+        return self.spec.labeled or len(self.found) >= 2
+
+    def _section(self, line: str) -> Optional[str]:
+        match = _LABEL.match(line)
+        if match is None or not (match.group("marker") or match.group("colon")):
+            return None
+        label = match.group("label").casefold()
+        for section in self.spec.sections:
+            if section.casefold() in label:
+                return section
+        return None
+
+    def _count(self, line: str) -> None:
+        words = line.split()
+        if not words:
+            self._paragraph_start = True
+            return
+        self._paragraph_start = False
+        hashtags = len(_HASHTAG.findall(line))
+        self.hashtags += hashtags
+        if self.spec.min_hashtags and hashtags and hashtags * 2 >= len(words):
+            self._after_hashtags = True
+        self.words += len(words) - hashtags
+
+        section = self._section(line) if self.spec.sections else None
+        if section is not None:
+            if section not in self.found:
+                self.found.append(section)
+            if section == self.spec.sections[-1]:
+                self._final_started = True
+                # A label with its text on the same line ("**Takeaway**: ...") already has content
+                self._final_content = len(line.split(":", 1)[-1].split()) > 2 if ":" in line else False
+                return
+        if self._final_started and not _is_heading(line):
+            self._final_content = True
+
+    def _stop(self, reason: str, cut: Optional[int] = None) -> None:
+        self.stopped = reason
+        self._cut = self._line if cut is None else cut
+
+    def report(self) -> dict:
+        """Words, target, stop reason and missing sections of the generation so far."""
+
+        spec = self.spec
+        missing = [section for section in spec.sections if section not in self.found] if self._labeled() else []
+        if spec.min_hashtags and self.hashtags < spec.min_hashtags:
+            missing.append("hashtags")
+        return {
+            "words": self.words,
+            "min_words": spec.min_words,
+            "max_words": spec.max_words,
+            "overrun_words": max(0, self.words - spec.max_words) if spec.max_words else 0,
+            "stopped": self.stopped,
+            "missing_sections": missing,
+            "hashtags": self.hashtags if spec.min_hashtags else None
+        }
+
+
+class LengthStats:
+    """Per-format totals of length reports, for GET /length/stats."""
+
+    def __init__(self):
+        self._formats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, format_value: str, report: dict) -> None:
+        with self._lock:
+            totals = self._formats.setdefault(format_value, {
+                "generations": 0, "words": 0, "over_max": 0, "under_min": 0, "overrun_words": 0,
+                "stopped": {}, "missing_sections": {}
+            })
+            totals["generations"] += 1
+            totals["words"] += report["words"]
+            totals["overrun_words"] += report["overrun_words"]
+            if report["overrun_words"]:
+                totals["over_max"] += 1
+            if report["min_words"] and report["words"] < report["min_words"]:
+                totals["under_min"] += 1
+            if report["stopped"]:
+                totals["stopped"][report["stopped"]] = totals["stopped"].get(report["stopped"], 0) + 1
+            for section in report["missing_sections"]:
+                totals["missing_sections"][section] = totals["missing_sections"].get(section, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for format_value, totals in self._formats.items():
+                spec = FORMAT_SPECS.get(format_value, FormatSpec())
+                count = totals["generations"]
+                result[format_value] = {
+                    "generations": count,
+                    "min_words": spec.min_words,
+                    "max_words": spec.max_words,
+                    "mean_words": round(totals["words"] / count, 1),
+                    "over_max": totals["over_max"],
+                    "under_min": totals["under_min"],
+                    "mean_overrun_words": round(totals["overrun_words"] / count, 1),
+                    "stopped": dict(totals["stopped"]),
+                    "missing_sections": dict(totals["missing_sections"])
+                }
+            return result
+
+
+_stats = LengthStats()
+
+
+def get_length_stats() -> LengthStats:
+    return _stats
+
+
+def record_length(format_value: str, report: dict) -> None:
+    """Count a fresh generation's length report in the stats and metrics."""
+
+    _stats.record(format_value, report)
+    OUTPUT_WORDS.observe(report["words"], format=format_value)
+    if report["overrun_words"]:
+        OVERRUN_WORDS.inc(report["overrun_words"], format=format_value)
+    if report["stopped"]:
+        LENGTH_STOPS.inc(format=format_value, reason=report["stopped"])
+    for section in report["missing_sections"]:
+        MISSING_SECTIONS.inc(format=format_value, section=section)
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def create_policy_from_env() -> Optional[LengthPolicy]:
+    """
+    Build the guard policy described by the environment: BENOVITZ_LENGTH_GUARD
+    ("stop", the default, stops generations early; "flag" only reports;
+    "off" disables the guard) and BENOVITZ_LENGTH_SLACK (fraction past a
+    format's maximum before stopping at a paragraph break, default 0.1).
+    """
+
+    mode = os.environ.get("BENOVITZ_LENGTH_GUARD", "stop").lower()
+    if mode in ("off", "0", "false"):
+        return None
+    if mode not in ("stop", "flag"):
+        raise ValueError(f"Invalid BENOVITZ_LENGTH_GUARD '{mode}'; use stop, flag or off")
+    slack = float(os.environ.get("BENOVITZ_LENGTH_SLACK", "0.1"))
+    return LengthPolicy(stop=mode == "stop", slack=slack, hard_slack=max(slack, 0.3))
+
+
+def get_length_policy() -> Optional[LengthPolicy]:
+    """Return the process-wide guard policy, or None if the guard is off."""
+
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = create_policy_from_env() or False
+    return _policy or None
+
+
+def set_length_policy(policy: Optional[LengthPolicy]) -> None:
+    """Replace the process-wide guard policy (None turns the guard off)."""
+
+    global _policy
+    with _policy_lock:
+        _policy = policy if policy is not None else False
+
+
+def new_length_guard(format_value: str, stop: bool = True) -> Optional[LengthGuard]:
+    """
+    A guard for one generation of `format_value`, or None if the guard is off.
+    With `stop` False (as for non-streaming calls, already paid for) it only reports.
+    """
+
+    policy = get_length_policy()
+    if policy is None:
+        return None
+    if not stop and policy.stop:
+        policy = replace(policy, stop=False)
+    return LengthGuard(FORMAT_SPECS.get(format_value, FormatSpec()), policy)
@@ -0,0 +1,297 @@
+"""
+Latency and token instrumentation for the Rabbi Moshe Benovitz Content Generator.
+
+A small, dependency-free metrics registry that renders the Prometheus text
+exposition format. Generation stages (queue wait, prompt build, time to first
+token, model time) and token counts are recorded per ContentFormat; HTTP request
+durations are recorded per route and surfaced in Server-Timing headers.
+
+Metrics are per process: with several workers, each exposes its own series.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 1500, 2000, 3000, 5000, 10000, 25000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    """Value that can go up and down, with labels."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum and count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[2] if series else 0
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return "\n".join(lines)
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Generation stages, by content format
+QUEUE_SECONDS = register(Histogram(
+    "benovitz_generation_queue_seconds", "Time spent waiting for a generation slot", ["format"]
+))
+PROMPT_BUILD_SECONDS = register(Histogram(
+    "benovitz_prompt_build_seconds", "Time spent assembling the upstream request", ["format"]
+))
+TIME_TO_FIRST_TOKEN_SECONDS = register(Histogram(
+    "benovitz_time_to_first_token_seconds", "Time from sending the upstream request to the first text delta", ["format"]
+))
+MODEL_SECONDS = register(Histogram(
+    "benovitz_model_seconds", "Total upstream model time per generation", ["format"]
+))
+GENERATION_SECONDS = register(Histogram(
+    "benovitz_generation_seconds", "End-to-end generation time, including cache hits", ["format", "cached"]
+))
+
+# Token usage, by content format
+INPUT_TOKENS = register(Histogram(
+    "benovitz_input_tokens", "Uncached input tokens per generation", ["format"], TOKEN_BUCKETS
+))
+OUTPUT_TOKENS = register(Histogram(
+    "benovitz_output_tokens", "Output tokens per generation", ["format"], TOKEN_BUCKETS
+))
+CACHED_TOKENS = register(Histogram(
+    "benovitz_cached_input_tokens", "Input tokens read from the prompt cache per generation", ["format"], TOKEN_BUCKETS
+))
+CACHE_WRITE_TOKENS = register(Histogram(
+    "benovitz_cache_write_input_tokens", "Input tokens written to the prompt cache per generation", ["format"], TOKEN_BUCKETS
+))
+
+GENERATION_ERRORS = register(Counter(
+    "benovitz_generation_errors_total", "Failed upstream generations by error class", ["format", "error"]
+))
+
+# Upstream generations cancelled because every caller went away
+CANCELLED_GENERATIONS = register(Counter(
+    "benovitz_cancelled_generations_total",
+    "Upstream generations cancelled because every caller disconnected, by how far they got",
+    ["format", "stage"]
+))
+CANCELLED_OUTPUT_TOKENS = register(Counter(
+    "benovitz_cancelled_output_tokens_total",
+    "Estimated output tokens generated by cancelled generations before they stopped",
+    ["format"]
+))
+CANCELLED_TOKENS_SAVED = register(Counter(
+    "benovitz_cancelled_tokens_saved_total",
+    "Expected output tokens never generated because the upstream call was cancelled",
+    ["format"]
+))
+
+# HTTP layer
+HTTP_REQUEST_SECONDS = register(Histogram(
+    "benovitz_http_request_seconds", "HTTP request duration", ["method", "route", "status"]
+))
+CLIENT_DISCONNECTS = register(Counter(
+    "benovitz_client_disconnects_total", "Requests abandoned by a client disconnect before the response finished", ["route"]
+))
+
+
+def observe_generation(format_value: str, result) -> None:
+    """Record the stage timings and token usage of a finished GenerationResult."""
+
+    GENERATION_SECONDS.observe(result.latency_ms / 1000, format=format_value, cached=str(result.cached).lower())
+    PROMPT_BUILD_SECONDS.observe(result.prompt_ms / 1000, format=format_value)
+    if result.cached:
+        return
+
+    QUEUE_SECONDS.observe(result.queue_ms / 1000, format=format_value)
+    if result.ttft_ms is not None:
+        TIME_TO_FIRST_TOKEN_SECONDS.observe(result.ttft_ms / 1000, format=format_value)
+    MODEL_SECONDS.observe(result.model_ms / 1000, format=format_value)
+    INPUT_TOKENS.observe(result.input_tokens, format=format_value)
+    OUTPUT_TOKENS.observe(result.output_tokens, format=format_value)
+    CACHED_TOKENS.observe(result.cache_read_input_tokens, format=format_value)
+    CACHE_WRITE_TOKENS.observe(result.cache_creation_input_tokens, format=format_value)
+
+
+def record_error(format_value: str, exc: BaseException) -> None:
+    """Count a failed generation under its exception class."""
+    GENERATION_ERRORS.inc(format=format_value, error=type(exc).__name__)
+
+
+def record_cancelled(format_value: str, stage: str, generated_tokens: int, saved_tokens: int) -> None:
+    """Count a cancelled generation with the output tokens it spent and those it saved."""
+
+    CANCELLED_GENERATIONS.inc(format=format_value, stage=stage)
+    CANCELLED_OUTPUT_TOKENS.inc(generated_tokens, format=format_value)
+    CANCELLED_TOKENS_SAVED.inc(saved_tokens, format=format_value)
+
+
+def server_timing(result) -> str:
+    """Server-Timing header value describing a GenerationResult's stages."""
+
+    parts = [f"prompt;dur={result.prompt_ms:.1f}"]
+    if result.cached:
+        parts.append('cache;desc="hit"')
+    else:
+        parts.append(f"queue;dur={result.queue_ms:.1f}")
+        if result.ttft_ms is not None:
+            parts.append(f"ttft;dur={result.ttft_ms:.1f}")
+        parts.append(f"model;dur={result.model_ms:.1f}")
+    parts.append(f"generation;dur={result.latency_ms:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times HTTP requests per route and appends an
+    `app;dur=` entry to the Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                for index, (name, value) in enumerate(headers):
+                    if name.lower() == b"server-timing":
+                        headers[index] = (name, value + f", app;dur={elapsed_ms:.1f}".encode("latin-1"))
+                        break
+                else:
+                    headers.append((b"server-timing", f"app;dur={elapsed_ms:.1f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"]
+            )
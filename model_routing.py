@@ -0,0 +1,141 @@
+"""
+Per-format model routing for the Rabbi Moshe Benovitz Content Generator.
+
+Each ContentFormat maps to a route: the model, output cap, temperature,
+request timeout and optional fallback model used to generate it. Long formats
+stay on the default route's flagship model; short ones go to a faster, cheaper
+model with a tighter output cap. The table can be adjusted with
+BENOVITZ_MODEL_ROUTES (inline JSON or a path to a JSON file), and the model,
+output cap, temperature and timeout can be overridden per request.
+"""
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, Optional
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+DEFAULT_MAX_TOKENS = 2000
+FAST_MODEL = "claude-haiku-4-5-20251001"
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """How one request is sent upstream."""
+
+    model: str = DEFAULT_MODEL
+    max_tokens: int = DEFAULT_MAX_TOKENS
+    # None leaves the API default in place
+    temperature: Optional[float] = None
+    timeout: float = 120.0
+    # Used for hedge attempts and while the primary model's circuit breaker is open
+    fallback_model: Optional[str] = None
+
+    def with_overrides(
+        self,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        timeout: Optional[float] = None
+    ) -> "ModelRoute":
+        """Return this route with every non-None override applied."""
+
+        overrides = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "timeout": timeout
+        }
+        return replace(self, **{name: value for name, value in overrides.items() if value is not None})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# Built-in route settings per ContentFormat value, applied over the default
+# route; formats not listed use the default route as is
+FORMAT_ROUTES: Dict[str, dict] = {
+    # 75-150 words and a single post need far less than 2000 tokens
+    "social_media": {"model": FAST_MODEL, "max_tokens": 600, "timeout": 30.0},
+    "short_reflection": {"model": FAST_MODEL, "max_tokens": 400, "timeout": 30.0},
+}
+
+
+def load_routes(config: Optional[str] = None) -> Dict[str, ModelRoute]:
+    """
+    Build the routing table from the built-in routes plus a JSON config.
+
+    `config` (default: BENOVITZ_MODEL_ROUTES) is either inline JSON or a path to
+    a JSON file mapping format values (or "default") to partial routes, e.g.
+    `{"social_media": {"model": "claude-sonnet-4-20250514", "max_tokens": 800}}`.
+    Each format's route starts from the default route, including its configured
+    fields, then takes the format's built-in and configured fields on top.
+    Raises ValueError for unreadable config or unknown route fields.
+    """
+
+    config = os.environ.get("BENOVITZ_MODEL_ROUTES", "") if config is None else config
+    entries = {}
+    if config.strip():
+        try:
+            if config.lstrip().startswith("{"):
+                entries = json.loads(config)
+            else:
+                with open(config) as f:
+                    entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as exc:
+            raise ValueError(f"Invalid model routes config: {exc}")
+
+    def build(base: ModelRoute, format_value: str, *layers: dict) -> ModelRoute:
+        try:
+            for fields in layers:
+                base = replace(base, **fields)
+        except TypeError as exc:
+            raise ValueError(f"Invalid route for '{format_value}': {exc}")
+        return base
+
+    default = build(ModelRoute(), "default", entries.get("default", {}))
+    routes = {"default": default}
+    for format_value in (*FORMAT_ROUTES, *entries):
+        if format_value != "default":
+            routes[format_value] = build(
+                default, format_value, FORMAT_ROUTES.get(format_value, {}), entries.get(format_value, {})
+            )
+    return routes
+
+
+_routes = None
+_routes_lock = threading.Lock()
+
+
+def get_routes() -> Dict[str, ModelRoute]:
+    """Return the process-wide routing table, loading it on first use."""
+
+    global _routes
+    if _routes is None:
+        with _routes_lock:
+            if _routes is None:
+                _routes = load_routes()
+    return _routes
+
+
+def set_routes(routes: Optional[Dict[str, ModelRoute]]) -> None:
+    """Replace the process-wide routing table (None reloads it from the environment on next use)."""
+
+    global _routes
+    with _routes_lock:
+        _routes = routes
+
+
+def resolve_route(
+    format_value: str,
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    temperature: Optional[float] = None,
+    timeout: Optional[float] = None
+) -> ModelRoute:
+    """Route for a content format, with any per-request overrides applied."""
+
+    routes = get_routes()
+    route = routes.get(format_value, routes["default"])
+    return route.with_overrides(model, max_tokens, temperature, timeout)
@@ -0,0 +1,343 @@
+"""
+Adaptive upstream rate limiting for the Rabbi Moshe Benovitz Content Generator.
+
+An UpstreamScheduler sits in front of every async Anthropic call. It keeps
+token buckets for requests, input tokens and output tokens per minute,
+dispatches waiting calls in priority order (interactive before batch), and
+sheds interactive load once too many calls are queued. Retryable failures are
+retried with jittered exponential backoff that honours `retry-after`; a 429 or
+529 also pauses dispatch and halves the effective rate, which then recovers
+gradually as calls succeed.
+"""
+
+import heapq
+import itertools
+import math
+import os
+import random
+import time
+from typing import Optional
+
+import metrics
+from lazy_imports import lazy_import
+
+asyncio = lazy_import("asyncio")
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+OVERLOAD_STATUS_CODES = {429, 529}
+# Error types of an `error` event, which fails a stream after its 200 response
+OVERLOAD_ERROR_TYPES = {"rate_limit_error", "overloaded_error"}
+
+QUEUE_DEPTH = metrics.register(metrics.Gauge(
+    "benovitz_scheduler_queue_depth", "Upstream calls waiting for rate-limit capacity", ["priority"]
+))
+SHED_REQUESTS = metrics.register(metrics.Counter(
+    "benovitz_scheduler_shed_total", "Interactive calls rejected because the queue was full"
+))
+UPSTREAM_RETRIES = metrics.register(metrics.Counter(
+    "benovitz_upstream_retries_total", "Upstream call retries by error class", ["error"]
+))
+RATE_SCALE = metrics.register(metrics.Gauge(
+    "benovitz_scheduler_rate_scale", "Fraction of the configured rate limits currently in use"
+))
+
+
+class UpstreamOverloaded(Exception):
+    """The upstream is saturated; callers should retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    return getattr(exc, "status_code", None)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds requested by a `retry-after` (or `retry-after-ms`) response header, if any."""
+
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    # Connection failures and timeouts carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return _is_connection_error(exc)
+
+
+def is_overloaded(exc: BaseException) -> bool:
+    """True for a 429/529, whether it rejected the request or ended its stream."""
+
+    return _status_code(exc) in OVERLOAD_STATUS_CODES or getattr(exc, "type", None) in OVERLOAD_ERROR_TYPES
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """
+    True if `exc` says the upstream is unhealthy (overload, a 5xx, a connection
+    failure or timeout) rather than that the request itself was rejected.
+    """
+
+    if is_overloaded(exc) or getattr(exc, "type", None) == "api_error":
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500
+    return _is_connection_error(exc)
+
+
+class TokenBucket:
+    """
+    Refills continuously at `capacity` per minute, scaled by the scheduler's
+    rate scale. A bucket without a capacity never makes a call wait.
+    """
+
+    def __init__(self, per_minute: Optional[float]):
+        self.capacity = per_minute
+        self.tokens = per_minute or 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, scale: float) -> None:
+        if self.capacity is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity * scale / 60)
+        self.updated = now
+
+    def delay(self, amount: float, scale: float) -> float:
+        """Seconds until `amount` tokens are available (amount is capped at capacity)."""
+
+        if self.capacity is None:
+            return 0.0
+        shortfall = min(amount, self.capacity) - self.tokens
+        return 0.0 if shortfall <= 0 else shortfall * 60 / (self.capacity * scale)
+
+
+class Reservation:
+    """Capacity taken from the buckets for one upstream attempt."""
+
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class UpstreamScheduler:
+    """
+    Priority queue plus token buckets in front of the upstream API. Limits left
+    as None are not enforced, but 429/529 pauses and retries still apply.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        input_tokens_per_minute: Optional[float] = None,
+        output_tokens_per_minute: Optional[float] = None,
+        max_queue: int = 100,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_scale = 1.0
+        self.paused_until = 0.0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._updated = asyncio.Event()
+        RATE_SCALE.set(self.rate_scale)
+
+    def _notify(self) -> None:
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def _dispatch_delay(self, entry: list, now: float) -> float:
+        for bucket in (self.requests, self.input_tokens, self.output_tokens):
+            bucket.refill(now, self.rate_scale)
+        return max(
+            self.paused_until - now,
+            self.requests.delay(1, self.rate_scale),
+            self.input_tokens.delay(entry[2], self.rate_scale),
+            self.output_tokens.delay(entry[3], self.rate_scale)
+        )
+
+    def retry_after_hint(self) -> float:
+        """Suggested Retry-After, in seconds, for shed requests."""
+        now = time.monotonic()
+        backlog = self.requests.delay(len(self._heap) + 1, self.rate_scale)
+        return float(max(1, math.ceil(max(self.paused_until - now, backlog))))
+
+    def saturated(self) -> bool:
+        """True when new interactive calls would be shed."""
+        return self._waiting[INTERACTIVE] >= self.max_queue
+
+    async def acquire(self, priority: int, input_tokens: int, output_tokens: int) -> Reservation:
+        """Wait until this call may be dispatched; raises UpstreamOverloaded if shed."""
+
+        if priority == INTERACTIVE and self.saturated():
+            SHED_REQUESTS.inc()
+            raise UpstreamOverloaded("Upstream queue is full", self.retry_after_hint())
+
+        entry = [priority, next(self._sequence), input_tokens, output_tokens]
+        heapq.heappush(self._heap, entry)
+        self._waiting[priority] += 1
+        QUEUE_DEPTH.inc(priority=PRIORITY_NAMES[priority])
+
+        try:
+            while True:
+                if self._heap[0] is entry:
+                    delay = self._dispatch_delay(entry, time.monotonic())
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    updated = self._updated
+                    try:
+                        # Wake early if a higher-priority call jumps the queue
+                        await asyncio.wait_for(updated.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._updated.wait()
+        except BaseException:
+            if entry in self._heap:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+            raise
+        finally:
+            self._waiting[priority] -= 1
+            QUEUE_DEPTH.dec(priority=PRIORITY_NAMES[priority])
+            self._notify()
+
+        self.requests.tokens -= 1
+        self.input_tokens.tokens -= input_tokens
+        self.output_tokens.tokens -= output_tokens
+        return Reservation(input_tokens, output_tokens)
+
+    def complete(self, reservation: Reservation, input_tokens: int, output_tokens: int) -> None:
+        """Replace a reservation's estimates with the tokens actually used."""
+
+        self.input_tokens.tokens += reservation.input_tokens - input_tokens
+        self.output_tokens.tokens += reservation.output_tokens - output_tokens
+        self.rate_scale = min(1.0, self.rate_scale + 0.05)
+        RATE_SCALE.set(self.rate_scale)
+        # Waiters sleep until their computed delay; wake them to use the refund now
+        self._notify()
+
+    def cancel(self, reservation: Reservation, input_tokens: int, output_tokens: int) -> None:
+        """
+        Return what a cancelled attempt did not use: the input estimate unless
+        the request was sent, and the output it never generated.
+        """
+
+        self.input_tokens.tokens += reservation.input_tokens - input_tokens
+        self.output_tokens.tokens += reservation.output_tokens - output_tokens
+        self._notify()
+
+    def back_off(self, exc: BaseException, attempt: int) -> None:
+        """After an overload, pause dispatch for its retry-after (or a backoff) and halve the rate."""
+
+        if not is_overloaded(exc):
+            return
+        retry_after = _retry_after(exc)
+        pause = retry_after if retry_after is not None else self.base_delay * 2 ** attempt
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        self.rate_scale = max(0.1, self.rate_scale / 2)
+        RATE_SCALE.set(self.rate_scale)
+
+    def fail(self, reservation: Reservation, exc: BaseException, attempt: int) -> Optional[float]:
+        """
+        Account for a failed attempt and return the delay before retrying it,
+        or None if it should not be retried.
+        """
+
+        # A rejected call consumed no tokens
+        self.input_tokens.tokens += reservation.input_tokens
+        self.output_tokens.tokens += reservation.output_tokens
+        self.back_off(exc, attempt)
+        self._notify()
+
+        if not _is_retryable(exc) or attempt >= self.max_retries:
+            return None
+
+        UPSTREAM_RETRIES.inc(error=type(exc).__name__)
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_limit(name: str, workers: int) -> Optional[float]:
+    """This worker's share of an account limit, or None if it is not configured."""
+    value = os.environ.get(name)
+    return float(value) / workers if value else None
+
+
+_scheduler = None
+
+
+def create_scheduler_from_env() -> UpstreamScheduler:
+    """
+    Build the scheduler described by the environment: BENOVITZ_RPM,
+    BENOVITZ_INPUT_TPM, BENOVITZ_OUTPUT_TPM (account limits), BENOVITZ_MAX_QUEUE,
+    BENOVITZ_MAX_RETRIES, BENOVITZ_RETRY_BASE_DELAY and BENOVITZ_RETRY_MAX_DELAY.
+
+    Account limits that are not set are not enforced. Those that are set are
+    shared evenly between the BENOVITZ_WORKER_COUNT worker processes the
+    launcher (serve.py) starts.
+    """
+
+    workers = max(1, int(_env_float("BENOVITZ_WORKER_COUNT", 1)))
+    return UpstreamScheduler(
+        requests_per_minute=_env_limit("BENOVITZ_RPM", workers),
+        input_tokens_per_minute=_env_limit("BENOVITZ_INPUT_TPM", workers),
+        output_tokens_per_minute=_env_limit("BENOVITZ_OUTPUT_TPM", workers),
+        max_queue=int(_env_float("BENOVITZ_MAX_QUEUE", 100)),
+        max_retries=int(_env_float("BENOVITZ_MAX_RETRIES", 4)),
+        base_delay=_env_float("BENOVITZ_RETRY_BASE_DELAY", 0.5),
+        max_delay=_env_float("BENOVITZ_RETRY_MAX_DELAY", 30.0)
+    )
+
+
+def get_scheduler() -> UpstreamScheduler:
+    """Return the process-wide scheduler, creating it on first use."""
+
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = create_scheduler_from_env()
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[UpstreamScheduler]) -> None:
+    """Replace the process-wide scheduler (None rebuilds it from the environment on next use)."""
+
+    global _scheduler
+    _scheduler = scheduler
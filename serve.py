@@ -0,0 +1,99 @@
+"""
+Production launcher for the Rabbi Moshe Benovitz Content Generator API.
+
+    python serve.py                 # one worker per available core
+    python serve.py --workers 4 --port 8000
+
+Runs api:app under uvicorn with a worker count sized to the CPUs this process
+may actually use (affinity mask and cgroup quota, not just the host's core
+count). On SIGTERM each worker stops accepting connections, flips /ready to
+503, and lets in-flight and streaming generations finish for up to the grace
+period before exiting.
+
+Environment: PORT, BENOVITZ_WORKERS, BENOVITZ_GRACE_PERIOD (seconds, default
+25), BENOVITZ_MAX_WORKERS (default 8) and BENOVITZ_LOG_LEVEL.
+"""
+
+import argparse
+import math
+import os
+from typing import Optional
+
+# Cap on auto-sized workers; generation is I/O bound, so a few event loops go a long way
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_GRACE_PERIOD = 25.0
+
+
+def _cgroup_cpu_limit(path: str = "/sys/fs/cgroup/cpu.max") -> Optional[float]:
+    """CPU quota of this container (cgroup v2), or None when unlimited or unknown."""
+
+    try:
+        with open(path) as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    try:
+        return int(quota) / int(period)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def available_cpus() -> int:
+    """CPUs this process can run on, honouring the affinity mask and container quota."""
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return max(1, cpus)
+
+
+def worker_count(requested: Optional[int] = None) -> int:
+    """Explicit --workers / BENOVITZ_WORKERS, else one per CPU up to BENOVITZ_MAX_WORKERS."""
+
+    if requested is None and os.environ.get("BENOVITZ_WORKERS"):
+        requested = int(os.environ["BENOVITZ_WORKERS"])
+    if requested is not None:
+        return max(1, requested)
+    max_workers = int(os.environ.get("BENOVITZ_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    return max(1, min(available_cpus(), max_workers))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the content API in production")
+    parser.add_argument("--host", default="0.0.0.0", help="Bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")),
+                        help="Port (default: $PORT or 8000)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per available CPU)")
+    parser.add_argument("--grace-period", type=float,
+                        default=float(os.environ.get("BENOVITZ_GRACE_PERIOD", DEFAULT_GRACE_PERIOD)),
+                        help="Seconds to let in-flight requests finish on SIGTERM (default: %(default)s)")
+    parser.add_argument("--log-level", default=os.environ.get("BENOVITZ_LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    workers = worker_count(args.workers)
+    # Workers inherit this; the upstream scheduler splits account rate limits by it
+    os.environ["BENOVITZ_WORKER_COUNT"] = str(workers)
+    print(f"Starting {workers} worker(s) on {args.host}:{args.port} (grace period {args.grace_period:g}s)")
+
+    uvicorn.run(
+        "api:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_graceful_shutdown=args.grace_period,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Near-duplicate request index for the Rabbi Moshe Benovitz Content Generator.
+
+The response cache only matches requests that are identical after whitespace
+and case folding, so "Making tefillah meaningful for teens" and "making
+davening meaningful to teenagers" both pay for a full generation. This index
+keeps TF-IDF vectors of past (topic, format, context) requests and finds the
+closest prior generations of the same format above a cosine threshold.
+
+Terms are normalized with a small domain alias table (davening -> tefillah,
+teenagers -> teen, ...) and light suffix stripping. Entries are indexed by
+prefix: only their highest-weighted (rarest) terms go into posting lists, up
+to the point where the remaining terms could not lift a match over the
+threshold on their own. Common words therefore rarely appear in posting lists,
+which keeps lookups well under a millisecond at 100k entries. Everything is in
+memory and per process.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+SIMILAR_LOOKUPS = metrics.register(metrics.Counter(
+    "benovitz_similar_lookups_total",
+    "Near-duplicate index lookups, by whether a prior generation cleared the threshold",
+    ["result"]
+))
+SIMILAR_REUSED = metrics.register(metrics.Counter(
+    "benovitz_similar_reused_total",
+    "Generations answered with a similar prior generation instead of an upstream call"
+))
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+    a about an and are as at be by can do does for from how i in into is it its
+    my of on or our so that the their them these this those to we what when
+    why will with you your
+""".split())
+
+# Spelling variants and near-synonyms common in requests, mapped to one term
+TERM_ALIASES = {
+    "davening": "tefillah", "daven": "tefillah", "tefila": "tefillah", "tefilla": "tefillah",
+    "tfila": "tefillah", "tefilos": "tefillah", "tefillot": "tefillah", "prayer": "tefillah",
+    "prayers": "tefillah", "praying": "tefillah", "pray": "tefillah",
+    "teens": "teen", "teenager": "teen", "teenagers": "teen", "adolescent": "teen", "adolescents": "teen",
+    "shabbos": "shabbat", "shabbas": "shabbat", "sabbath": "shabbat",
+    "mitzvos": "mitzvah", "mitzvot": "mitzvah", "mitzvahs": "mitzvah", "mitzva": "mitzvah",
+    "chessed": "chesed", "kindness": "chesed",
+    "emuna": "emunah", "faith": "emunah",
+    "teshuvah": "teshuva", "repentance": "teshuva",
+    "yiddishkeit": "judaism", "jewish": "judaism",
+    "mentoring": "mentor", "mentorship": "mentor", "mentors": "mentor",
+}
+
+_SUFFIXES = ("ing", "ers", "er", "es", "ed", "ly", "s", "e")
+
+# Weight of context terms relative to topic terms
+CONTEXT_WEIGHT = 0.5
+
+# Newest ids scanned per posting list; bounds lookups for very generic topics
+MAX_POSTINGS_SCANNED = 2000
+
+
+def _term(word: str) -> str:
+    alias = TERM_ALIASES.get(word)
+    if alias is not None:
+        return alias
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    """Normalized content terms of `text`."""
+
+    return [_term(word) for word in _WORD.findall(text.casefold()) if word not in STOPWORDS]
+
+
+@dataclass(frozen=True)
+class SimilarMatch:
+    """A prior generation whose request resembles the one being looked up."""
+
+    key: str
+    topic: str
+    format: str
+    additional_context: str
+    score: float
+    created_at: float
+
+    def to_dict(self) -> dict:
+        return {
+            "topic": self.topic,
+            "format": self.format,
+            "additional_context": self.additional_context,
+            "score": round(self.score, 4),
+            "created_at": self.created_at
+        }
+
+
+class _Entry:
+    __slots__ = ("key", "topic", "format", "context", "terms", "weights", "indexed", "created_at")
+
+    def __init__(self, key, topic, format_value, context, terms, weights, indexed, created_at):
+        self.key = key
+        self.topic = topic
+        self.format = format_value
+        self.context = context
+        # Terms by descending weight; the first `indexed` are in posting lists
+        self.terms = terms
+        self.weights = weights
+        self.indexed = indexed
+        self.created_at = created_at
+
+
+class SimilarityIndex:
+    """
+    In-memory TF-IDF index of past requests, searched per format by cosine
+    similarity. Entries are indexed for `threshold`; searching with a lower
+    threshold works but may miss some matches.
+    """
+
+    def __init__(self, threshold: float = 0.75, max_entries: int = 100000, limit: int = 3):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.limit = limit
+        self._entries: Dict[int, _Entry] = {}
+        self._by_key: Dict[str, int] = {}
+        # Keyed by (format, term); posting lists may hold ids of evicted entries
+        self._postings: Dict[Tuple[str, str], List[int]] = {}
+        self._df: Dict[Tuple[str, str], int] = {}
+        self._counts: Dict[str, int] = {}
+        self._next_id = 0
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, format_value: str, topic: str, context: str) -> Dict[str, float]:
+        """Unit-length TF-IDF vector using the format's current document frequencies."""
+
+        counts: Dict[str, float] = {}
+        for term in terms(topic):
+            counts[term] = counts.get(term, 0.0) + 1.0
+        if context:
+            for term in terms(context):
+                counts[term] = counts.get(term, 0.0) + CONTEXT_WEIGHT
+
+        documents = self._counts.get(format_value, 0)
+        vector = {
+            term: count * (math.log((documents + 1) / (self._df.get((format_value, term), 0) + 1)) + 1)
+            for term, count in counts.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+    def add(self, key: str, topic: str, format_value: str, additional_context: str = "") -> None:
+        """Index a finished generation stored under response-cache `key`."""
+
+        with self._lock:
+            if key in self._by_key:
+                self._remove(self._by_key[key])
+
+            vector = self._vector(format_value, topic, additional_context)
+            if not vector:
+                return
+
+            ordered = sorted(vector.items(), key=lambda item: item[1], reverse=True)
+            # Index terms until the rest, whose score is at most their norm, can't reach the threshold
+            indexed = 0
+            remaining = 1.0
+            while indexed < len(ordered) and remaining >= self.threshold * self.threshold:
+                remaining -= ordered[indexed][1] ** 2
+                indexed += 1
+
+            entry_id = self._next_id
+            self._next_id += 1
+            entry = _Entry(
+                key, topic, format_value, additional_context,
+                tuple(term for term, _ in ordered), tuple(weight for _, weight in ordered), indexed, time.time()
+            )
+            self._entries[entry_id] = entry
+            self._by_key[key] = entry_id
+            self._counts[format_value] = self._counts.get(format_value, 0) + 1
+            for term in entry.terms:
+                self._df[(format_value, term)] = self._df.get((format_value, term), 0) + 1
+            for term in entry.terms[:indexed]:
+                self._postings.setdefault((format_value, term), []).append(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            if self._stale > max(1000, len(self._entries)):
+                self._compact()
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        del self._by_key[entry.key]
+        self._counts[entry.format] -= 1
+        for term in entry.terms:
+            self._df[(entry.format, term)] -= 1
+        self._stale += entry.indexed
+
+    def _compact(self) -> None:
+        """Drop evicted ids from the posting lists."""
+
+        self._postings = {}
+        for entry_id, entry in self._entries.items():
+            for term in entry.terms[:entry.indexed]:
+                self._postings.setdefault((entry.format, term), []).append(entry_id)
+        self._df = {key: count for key, count in self._df.items() if count > 0}
+        self._stale = 0
+
+    def search(
+        self,
+        topic: str,
+        format_value: str,
+        additional_context: str = "",
+        threshold: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[SimilarMatch]:
+        """Prior generations of the same format scoring at least `threshold`, best first."""
+
+        threshold = self.threshold if threshold is None else threshold
+        limit = self.limit if limit is None else limit
+
+        with self._lock:
+            query = self._vector(format_value, topic, additional_context)
+
+            # An entry sharing none of its indexed terms with the query scores
+            # at most the norm of its other terms, which is below the threshold
+            candidates = set()
+            for term in query:
+                postings = self._postings.get((format_value, term))
+                if postings:
+                    candidates.update(postings[-MAX_POSTINGS_SCANNED:])
+
+            scored = []
+            for entry_id in candidates:
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    continue
+                score = sum(weight * query.get(term, 0.0) for term, weight in zip(entry.terms, entry.weights))
+                if score >= threshold:
+                    scored.append((score, entry_id))
+            scored.sort(reverse=True)
+
+            matches = []
+            for score, entry_id in scored[:limit]:
+                entry = self._entries[entry_id]
+                matches.append(SimilarMatch(
+                    entry.key, entry.topic, entry.format, entry.context, min(score, 1.0), entry.created_at
+                ))
+
+        SIMILAR_LOOKUPS.inc(result="match" if matches else "miss")
+        return matches
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+            self._postings.clear()
+            self._df.clear()
+            self._counts.clear()
+            self._stale = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "terms": len(self._postings)
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def create_index_from_env() -> Optional[SimilarityIndex]:
+    """
+    Build the index described by the environment: BENOVITZ_SIMILARITY ("off"
+    disables it), BENOVITZ_SIMILARITY_THRESHOLD (cosine, default 0.75) and
+    BENOVITZ_SIMILARITY_MAX_ENTRIES (default 100000).
+    """
+
+    if os.environ.get("BENOVITZ_SIMILARITY", "on").lower() in ("off", "0", "false"):
+        return None
+    return SimilarityIndex(
+        threshold=float(os.environ.get("BENOVITZ_SIMILARITY_THRESHOLD", "0.75")),
+        max_entries=int(os.environ.get("BENOVITZ_SIMILARITY_MAX_ENTRIES", "100000"))
+    )
+
+
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Return the process-wide similarity index, or None if it is disabled."""
+
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = create_index_from_env() or False
+    return _index or None
+
+
+def set_similarity_index(index: Optional[SimilarityIndex]) -> None:
+    """Replace the process-wide similarity index (None disables it)."""
+
+    global _index
+    with _index_lock:
+        _index = index if index is not None else False
@@ -0,0 +1,91 @@
+"""
+Shared fixtures: a fake Messages API served from a background thread, and
+process-wide singletons reset between tests so no state leaks across them.
+"""
+
+import asyncio
+import json
+import socket
+import time
+import urllib.request
+
+import pytest
+
+import hedging
+import length_guard
+import rate_limiter
+from benchmarks.fake_anthropic import FakeConfig, create_app
+from benchmarks.load_test import ServerThread
+from benovitz_content_generator import aclose_clients
+from generation_archive import set_archive
+from generation_cache import set_generation_cache
+from similarity_index import set_similarity_index
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeUpstream:
+    """A running fake upstream; `config` may be changed between calls."""
+
+    def __init__(self, config: FakeConfig, port: int):
+        self.config = config
+        self.url = f"http://127.0.0.1:{port}"
+
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/_stats") as response:
+            return json.loads(response.read())
+
+
+def run(coro):
+    """Run a coroutine on a fresh event loop, closing the pooled clients bound to it."""
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await aclose_clients()
+
+    return asyncio.run(main())
+
+
+def wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.delenv("BENOVITZ_RPM", raising=False)
+    monkeypatch.delenv("BENOVITZ_INPUT_TPM", raising=False)
+    monkeypatch.delenv("BENOVITZ_OUTPUT_TPM", raising=False)
+    monkeypatch.delenv("BENOVITZ_HEDGE", raising=False)
+    set_archive(None)
+    set_generation_cache(None)
+    set_similarity_index(None)
+    length_guard.set_length_policy(None)
+    rate_limiter.set_scheduler(None)
+    hedging.set_hedge_policy(None)
+    hedging.set_circuit_breaker(None)
+    yield
+    rate_limiter.set_scheduler(None)
+    hedging.set_hedge_policy(None)
+    hedging.set_circuit_breaker(None)
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    config = FakeConfig(first_token_latency=0.02, tokens_per_second=0, output_tokens=20, jitter=0.0, retry_after=0.1)
+    port = free_port()
+    server = ServerThread(create_app(config), port)
+    server.start_and_wait()
+    upstream = FakeUpstream(config, port)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", upstream.url)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    yield upstream
+    server.stop()
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch_jobs import BatchBackend, FakeBatchBackend, JobManager, JobStore, set_job_manager
+from benchmarks.load_test import ServerThread
+from tests.conftest import free_port
+
+
+def test_backends_must_implement_the_whole_interface():
+    class SubmitOnly(BatchBackend):
+        def submit(self, requests):
+            return "batch"
+
+    with pytest.raises(TypeError):
+        BatchBackend()
+    with pytest.raises(TypeError):
+        SubmitOnly()
+
+
+def test_fake_backend_finishes_its_batches():
+    backend = FakeBatchBackend()
+    params = {"model": "fake-model", "messages": [{"content": [{"type": "text", "text": "Topic"}]}]}
+    batch_id = backend.submit([{"custom_id": "item-0", "params": params}])
+
+    assert backend.status(batch_id)["processing_status"] == "ended"
+    assert [result["content"] for result in backend.results(batch_id)] == ["Topic"]
+
+
+class RacingBackend(FakeBatchBackend):
+    """Holds every results download until `parties` callers are downloading at once."""
+
+    def __init__(self, parties: int):
+        super().__init__()
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def results(self, batch_id):
+        self.barrier.wait()
+        return super().results(batch_id)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return JobManager(JobStore(str(tmp_path / "jobs.sqlite3")), RacingBackend(2), str(tmp_path / "results"))
+
+
+def test_concurrent_refreshes_write_results_once(manager):
+    job = manager.submit([{"topic": "First"}, {"topic": "Second", "id": "second"}])
+    written = []
+    write_results = manager.write_results
+    manager.write_results = lambda *args: written.append(write_results(*args))
+
+    with ThreadPoolExecutor(2) as pool:
+        refreshed = list(pool.map(manager.refresh, [job["id"]] * 2))
+
+    # Both downloaded the results, but only one completed the job with its file
+    assert sorted(written) == [False, True]
+    assert [job["status"] for job in refreshed] == ["completed", "completed"]
+    assert len({job["results_path"] for job in refreshed}) == 1
+    assert os.listdir(manager.results_dir) == [os.path.basename(refreshed[0]["results_path"])]
+    records = [json.loads(line) for line in manager.results(job["id"])]
+    assert [record["id"] for record in records] == [None, "second"]
+    assert manager.store.get(job["id"])["succeeded"] == 2
+
+
+def test_job_items_with_unsupported_fields_are_rejected(manager):
+    with pytest.raises(ValueError, match="cache, variants"):
+        manager.submit([{"topic": "Cached", "cache": "bypass", "variants": 2}])
+
+
+def test_jobs_endpoint_rejects_generation_options(manager):
+    from api import app
+
+    set_job_manager(manager)
+    port = free_port()
+    server = ServerThread(app, port)
+    server.start_and_wait()
+    try:
+        def post(item: dict) -> int:
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{port}/jobs", json.dumps({"items": [item]}).encode(),
+                {"Content-Type": "application/json"}
+            )
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return response.status
+            except urllib.error.HTTPError as error:
+                return error.code
+
+        assert post({"topic": "Drafts", "variants": 3}) == 422
+        assert post({"topic": "Outline", "prompt_only": True}) == 422
+        assert post({"topic": "Routed", "model": "m", "temperature": 0.2}) == 200
+    finally:
+        server.stop()
+        set_job_manager(None)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+import metrics
+from benchmarks.load_test import ServerThread
+from rate_limiter import UpstreamScheduler, set_scheduler
+from tests.conftest import free_port, wait_until
+
+CAPACITY = 1_000_000
+
+
+@pytest.fixture
+def api_server(fake_upstream):
+    # Slow enough that every client hangs up long before the generation ends
+    fake_upstream.config.output_tokens = 1000
+    fake_upstream.config.tokens_per_second = 50
+    from api import app
+
+    port = free_port()
+    server = ServerThread(app, port)
+    server.start_and_wait()
+    yield port
+    server.stop()
+
+
+async def hang_up(port: int, path: str, after_deltas: int = 0, after_seconds: float = 0.0) -> None:
+    """POST a generation and close the connection after some text events or seconds."""
+
+    body = json.dumps({"topic": f"Hang up on {path}", "format": "article", "cache": "bypass"}).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    deltas = 0
+    while deltas < after_deltas:
+        line = await reader.readline()
+        assert line, "stream ended before the client hung up"
+        deltas += line.startswith(b"event: delta")
+    await asyncio.sleep(after_seconds)
+    writer.close()
+    await writer.wait_closed()
+
+
+@pytest.mark.parametrize("path, hang_up_at", [
+    ("/generate", {"after_seconds": 0.3}),
+    ("/generate/stream", {"after_deltas": 5}),
+])
+def test_client_disconnect_aborts_the_upstream_stream(fake_upstream, api_server, path, hang_up_at):
+    scheduler = UpstreamScheduler(output_tokens_per_minute=CAPACITY)
+    set_scheduler(scheduler)
+    cancelled = metrics.CANCELLED_GENERATIONS.total()
+    saved = metrics.CANCELLED_TOKENS_SAVED.total()
+
+    asyncio.run(hang_up(api_server, path, **hang_up_at))
+
+    wait_until(lambda: fake_upstream.stats()["aborted_streams"] == 1)
+    stats = fake_upstream.stats()
+    assert stats["open_streams"] == 0
+    assert stats["streamed_tokens"] < 1000
+    wait_until(lambda: metrics.CANCELLED_GENERATIONS.total() == cancelled + 1)
+    assert metrics.CANCELLED_TOKENS_SAVED.total() > saved
+    # The reservation was returned, less the output streamed before the abort
+    charged = CAPACITY - scheduler.output_tokens.tokens
+    assert 0 < charged <= stats["streamed_tokens"] * 2
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import stat
+import tempfile
+
+from cli_daemon import serve
+
+
+def test_socket_is_created_private(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    chmods = []
+    monkeypatch.setattr(os, "chmod", lambda *args, **kwargs: chmods.append(args))
+    umask = os.umask(0o022)
+    os.umask(umask)
+
+    with tempfile.TemporaryDirectory(dir="/tmp") as directory:
+        path = os.path.join(directory, "daemon.sock")
+
+        async def main():
+            server = asyncio.create_task(serve(path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+            return mode
+
+        mode = asyncio.run(main())
+
+    # Private from the moment it is bound, not chmod-ed afterwards
+    assert mode == 0o600
+    assert chmods == []
+    assert os.umask(umask) == umask
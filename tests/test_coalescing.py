@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from benovitz_content_generator import ContentFormat, generate_content_with_claude_async
+from coalescing import CANCELLED_FLIGHTS, FlightCancelled, SingleFlight
+from tests.conftest import run
+
+
+def test_concurrent_identical_requests_share_one_upstream_call(fake_upstream):
+    fake_upstream.config.tokens_per_second = 200
+
+    async def main():
+        return await asyncio.gather(*(
+            generate_content_with_claude_async("Shared topic", ContentFormat.SOCIAL_MEDIA) for _ in range(5)
+        ))
+
+    results = run(main())
+
+    assert fake_upstream.stats()["calls"] == 1
+    assert len({result.content for result in results}) == 1
+    assert results[0].content.startswith("word")
+    assert sorted(result.coalesced for result in results) == [False, True, True, True, True]
+
+
+def test_upstream_error_reaches_every_waiter():
+    flights = SingleFlight()
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def produce(emit):
+            await gate.wait()
+            raise RuntimeError("upstream failed")
+
+        async def waiter():
+            async with flights.attach("key", produce) as (flight, leader):
+                return await flight.wait()
+
+        waiters = [asyncio.create_task(waiter()) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    errors = asyncio.run(main())
+
+    assert [str(error) for error in errors] == ["upstream failed"] * 3
+    assert flights.in_flight() == 0
+
+
+def test_late_joiner_replays_streamed_chunks():
+    flights = SingleFlight()
+
+    async def main():
+        streamed = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def produce(emit):
+            emit("one")
+            emit("two")
+            streamed.set()
+            await finish.wait()
+            emit("three")
+            return "one two three"
+
+        async def leader():
+            async with flights.attach("key", produce) as (flight, _):
+                return [chunk async for chunk in flight.stream()]
+
+        first = asyncio.create_task(leader())
+        await streamed.wait()
+        async with flights.attach("key", produce) as (flight, is_leader):
+            assert not is_leader
+            assert flight.chunks == ["one", "two"]
+            finish.set()
+            late = [chunk async for chunk in flight.stream()]
+            value = flight.value
+        return await first, late, value
+
+    first, late, value = asyncio.run(main())
+
+    assert first == late == ["one", "two", "three"]
+    assert value == "one two three"
+
+
+def test_flight_is_cancelled_when_every_waiter_leaves():
+    flights = SingleFlight()
+    cancelled = CANCELLED_FLIGHTS.total()
+
+    async def main():
+        running = asyncio.Event()
+        upstream_cancelled = asyncio.Event()
+        attached = []
+
+        async def produce(emit):
+            running.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+
+        async def waiter():
+            async with flights.attach("key", produce) as (flight, _):
+                attached.append(flight)
+                await flight.wait()
+
+        waiters = [asyncio.create_task(waiter()) for _ in range(2)]
+        await running.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        # One waiter is still attached, so the call keeps running
+        assert not upstream_cancelled.is_set()
+
+        waiters[1].cancel()
+        await asyncio.wait_for(upstream_cancelled.wait(), 1)
+        with pytest.raises(FlightCancelled):
+            await attached[0].wait()
+
+    asyncio.run(main())
+
+    assert flights.in_flight() == 0
+    assert CANCELLED_FLIGHTS.total() == cancelled + 1
@@ -0,0 +1,27 @@
+import os
+
+from benovitz_content_generator import ContentFormat, generate_content_with_claude_async
+from generation_archive import GenerationArchive, create_archive_from_env, set_archive
+from tests.conftest import run
+
+
+def test_archive_is_off_without_a_path(monkeypatch, tmp_path):
+    monkeypatch.delenv("BENOVITZ_ARCHIVE_PATH", raising=False)
+    monkeypatch.chdir(tmp_path)
+
+    assert create_archive_from_env() is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_fresh_generations_are_archived_at_the_configured_path(fake_upstream, monkeypatch, tmp_path):
+    path = tmp_path / "archive.sqlite3"
+    monkeypatch.setenv("BENOVITZ_ARCHIVE_PATH", str(path))
+    archive = create_archive_from_env()
+    assert isinstance(archive, GenerationArchive)
+    set_archive(archive)
+
+    run(generate_content_with_claude_async("Archived topic", ContentFormat.SOCIAL_MEDIA))
+
+    assert archive.flush()
+    assert [result["topic"] for result in archive.search("archived")] == ["Archived topic"]
+    archive.close()
@@ -0,0 +1,73 @@
+import threading
+
+from benovitz_content_generator import ContentFormat, generate_content_with_claude_async
+from generation_cache import SQLiteCache, create_cache_from_env, set_generation_cache
+from tests.conftest import run
+
+
+def test_cache_is_off_unless_configured(monkeypatch, tmp_path):
+    monkeypatch.delenv("BENOVITZ_CACHE_BACKEND", raising=False)
+    assert create_cache_from_env() is None
+
+    monkeypatch.setenv("BENOVITZ_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("BENOVITZ_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    assert isinstance(create_cache_from_env(), SQLiteCache)
+
+
+def test_sqlite_cache_counts_entries_without_scanning(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path, max_entries=3)
+    for index in range(5):
+        cache.set(f"key{index}", {"content": str(index)})
+    cache.set("key4", {"content": "replaced"})
+
+    assert cache.stats()["entries"] == 3
+    assert cache.get("key0") is None
+    assert cache.get("key4") == {"content": "replaced"}
+    # The count is read back from the file on reopening
+    assert SQLiteCache(path, max_entries=3).stats()["entries"] == 3
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_leave_the_count(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=-1)
+    cache.set("key", {"content": "old"})
+
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+class RecordingCache(SQLiteCache):
+    """Records the threads its blocking calls run on."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value):
+        self.threads.append(threading.current_thread())
+        super().set(key, value)
+
+
+def test_async_generations_keep_sqlite_off_the_event_loop(fake_upstream, tmp_path):
+    cache = RecordingCache(str(tmp_path / "cache.sqlite3"))
+    set_generation_cache(cache)
+
+    async def main():
+        loop_thread = threading.current_thread()
+        first = await generate_content_with_claude_async("Cached topic", ContentFormat.SOCIAL_MEDIA)
+        second = await generate_content_with_claude_async("Cached topic", ContentFormat.SOCIAL_MEDIA)
+        return loop_thread, first, second
+
+    loop_thread, first, second = run(main())
+
+    assert not first.cached
+    assert second.cached and second.content == first.content
+    assert fake_upstream.stats()["calls"] == 1
+    assert cache.threads and loop_thread not in cache.threads
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import pytest
+
+from benovitz_content_generator import ContentFormat, generate_content_with_claude_async
+from hedging import (
+    FALLBACK_CALLS,
+    HEDGE_SAVED_SECONDS,
+    HEDGE_WINS,
+    HEDGES,
+    CircuitBreaker,
+    HedgePolicy,
+    set_circuit_breaker,
+    set_hedge_policy,
+)
+from model_routing import ModelRoute
+from rate_limiter import UpstreamScheduler, set_scheduler
+from tests.conftest import run, wait_until
+
+ROUTE = ModelRoute(model="primary-model", fallback_model="fallback-model", max_tokens=100)
+
+
+def hedge_after(deadline: float) -> None:
+    set_hedge_policy(HedgePolicy(enabled=True, initial_delay=deadline, min_delay=deadline, measure_timeout=2.0))
+
+
+async def generate(topic: str):
+    return await generate_content_with_claude_async(topic, ContentFormat.ARTICLE, cache="bypass", route=ROUTE)
+
+
+def test_fast_primary_is_not_hedged(fake_upstream):
+    hedge_after(0.5)
+    hedges = HEDGES.total()
+
+    result = run(generate("Fast primary"))
+
+    assert result.model == "primary-model"
+    assert HEDGES.total() == hedges
+    assert fake_upstream.stats()["calls"] == 1
+
+
+def test_hedge_wins_over_slow_primary(fake_upstream):
+    fake_upstream.config.slow_first = 1
+    fake_upstream.config.slow_latency = 0.5
+    fake_upstream.config.tokens_per_second = 50
+    hedge_after(0.05)
+    wins = HEDGE_WINS.value(winner="hedge")
+    measured = HEDGE_SAVED_SECONDS.count()
+
+    async def main():
+        result = await generate("Slow primary")
+        # The losing primary is kept until its first token to measure the saving
+        while HEDGE_SAVED_SECONDS.count() == measured:
+            await asyncio.sleep(0.01)
+        return result
+
+    started = time.perf_counter()
+    result = run(main())
+
+    assert result.model == "fallback-model"
+    assert result.content.startswith("word")
+    assert time.perf_counter() - started < 1.5
+    assert HEDGE_WINS.value(winner="hedge") == wins + 1
+    assert fake_upstream.stats()["models"] == {"primary-model": 1, "fallback-model": 1}
+    # ...and then cancelled mid-stream
+    wait_until(lambda: fake_upstream.stats()["aborted_streams"] == 1)
+
+
+def test_primary_wins_and_hedge_is_cancelled(fake_upstream):
+    fake_upstream.config.first_token_latency = 0.15
+    fake_upstream.config.tokens_per_second = 50
+    hedge_after(0.05)
+    wins = HEDGE_WINS.value(winner="primary")
+
+    result = run(generate("Primary wins"))
+
+    assert result.model == "primary-model"
+    assert HEDGE_WINS.value(winner="primary") == wins + 1
+    assert fake_upstream.stats()["calls"] == 2
+    wait_until(lambda: fake_upstream.stats()["aborted_streams"] == 1)
+    assert fake_upstream.stats()["open_streams"] == 0
+
+
+@pytest.fixture
+def breaker(fake_upstream):
+    set_scheduler(UpstreamScheduler(max_retries=0))
+    breaker = CircuitBreaker(threshold=2, cooldown=0.3)
+    set_circuit_breaker(breaker)
+    return breaker
+
+
+def test_breaker_trips_and_falls_back(fake_upstream, breaker):
+    fake_upstream.config.error_first = 2
+    fallbacks = FALLBACK_CALLS.value(model="fallback-model")
+
+    for attempt in range(2):
+        with pytest.raises(Exception) as failure:
+            run(generate(f"Failing {attempt}"))
+        assert getattr(failure.value, "status_code", None) == 500
+    assert breaker.is_open("primary-model")
+
+    result = run(generate("While open"))
+
+    assert result.model == "fallback-model"
+    assert FALLBACK_CALLS.value(model="fallback-model") == fallbacks + 1
+    assert fake_upstream.stats()["models"] == {"primary-model": 2, "fallback-model": 1}
+
+
+def test_rejected_requests_do_not_trip_breaker(fake_upstream, breaker):
+    fake_upstream.config.error_first = 5
+    fake_upstream.config.error_status = 400
+
+    for attempt in range(5):
+        with pytest.raises(Exception) as failure:
+            run(generate(f"Invalid {attempt}"))
+        assert getattr(failure.value, "status_code", None) == 400
+
+    assert not breaker.is_open("primary-model")
+    assert run(generate("Valid")).model == "primary-model"
+
+
+def test_half_open_trial_success_closes_breaker(fake_upstream, breaker):
+    fake_upstream.config.error_first = 2
+    for attempt in range(2):
+        with pytest.raises(Exception):
+            run(generate(f"Failing {attempt}"))
+    assert breaker.is_open("primary-model")
+
+    time.sleep(0.35)
+    result = run(generate("Trial"))
+
+    assert result.model == "primary-model"
+    assert not breaker.is_open("primary-model")
+    assert run(generate("Closed")).model == "primary-model"
+
+
+def test_half_open_trial_failure_reopens_breaker(fake_upstream, breaker):
+    fake_upstream.config.error_first = 3
+    for attempt in range(2):
+        with pytest.raises(Exception):
+            run(generate(f"Failing {attempt}"))
+
+    time.sleep(0.35)
+    with pytest.raises(Exception):
+        run(generate("Failing trial"))
+
+    assert breaker.is_open("primary-model")
+    assert run(generate("Reopened")).model == "fallback-model"
+    assert fake_upstream.stats()["models"] == {"primary-model": 3, "fallback-model": 1}
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.1)
+    breaker.record_failure("m")
+    assert not breaker.allow("m")
+
+    time.sleep(0.15)
+    assert breaker.allow("m")
+    assert not breaker.allow("m")
+    breaker.record_success("m")
+    assert breaker.allow("m")
+    assert not breaker.is_open("m")
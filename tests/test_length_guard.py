@@ -0,0 +1,73 @@
+from benovitz_content_generator import ContentFormat, GenerationResult, stream_content_with_claude_async
+from length_guard import FORMAT_SPECS, LengthGuard, LengthPolicy, set_length_policy
+from tests.conftest import run
+
+REFLECTION = FORMAT_SPECS["short_reflection"]
+
+
+def paragraph(words: int, sentence: int = 0) -> str:
+    """One line of numbered words, with a period after every `sentence` words."""
+    return " ".join(
+        f"w{index}." if sentence and index % sentence == sentence - 1 else f"w{index}" for index in range(words)
+    )
+
+
+def stream(guard: LengthGuard, text: str, chunk: int) -> str:
+    emitted = ""
+    for start in range(0, len(text), chunk):
+        emitted += guard.feed(text[start:start + chunk])
+        if guard.stopped:
+            return emitted
+    return emitted + guard.close()
+
+
+def test_single_paragraph_stops_at_sentence_end_past_hard_limit():
+    for chunk in (1, 5, 1000, 10000):
+        guard = LengthGuard(REFLECTION)
+        emitted = stream(guard, paragraph(300, sentence=12), chunk)
+
+        report = guard.report()
+        assert report["stopped"] == "over_length"
+        # Hard limit is 195 words; the sentence it falls in ends at word 204
+        assert report["words"] == 204
+        assert emitted.rstrip() == guard.content
+        assert guard.content.endswith("w203.")
+
+
+def test_single_paragraph_without_sentence_ends_stops_at_a_word():
+    guard = LengthGuard(REFLECTION)
+    emitted = stream(guard, paragraph(300), 7)
+
+    assert guard.stopped == "over_length"
+    assert guard.report()["words"] == 195
+    assert emitted.rstrip() == guard.content
+    assert guard.content.endswith(" w194")
+
+
+def test_flag_policy_reports_without_stopping():
+    guard = LengthGuard(REFLECTION, LengthPolicy(stop=False))
+    emitted = stream(guard, paragraph(300, sentence=12), 7)
+
+    assert guard.stopped is None
+    assert emitted == guard.content
+    assert guard.report()["overrun_words"] == 150
+
+
+def test_streamed_generation_without_line_breaks_is_stopped(fake_upstream):
+    fake_upstream.config.output_tokens = 300
+    set_length_policy(LengthPolicy())
+
+    async def main():
+        result = GenerationResult("")
+        chunks = [
+            text async for text in stream_content_with_claude_async(
+                "One long paragraph", ContentFormat.SHORT_REFLECTION, cache="bypass", result=result
+            )
+        ]
+        return "".join(chunks), result
+
+    text, result = run(main())
+
+    assert result.length["stopped"] == "over_length"
+    assert result.length["words"] == 195
+    assert text.rstrip() == result.content
@@ -0,0 +1,53 @@
+import pytest
+
+from benovitz_content_generator import (
+    ContentFormat,
+    batch_params,
+    build_message_request,
+    generate_content_with_claude_async,
+    sdk_params,
+)
+from model_routing import FAST_MODEL, ModelRoute, load_routes
+from tests.conftest import run
+
+
+def test_builtin_routes():
+    routes = load_routes("")
+    assert routes["default"] == ModelRoute()
+    assert routes["social_media"].model == FAST_MODEL
+    assert routes["short_reflection"].max_tokens == 400
+
+
+def test_default_entry_applies_to_every_format():
+    routes = load_routes('{"default": {"model": "m", "temperature": 0.5, "fallback_model": "f"}}')
+    assert routes["default"].model == "m"
+    assert routes["social_media"].temperature == 0.5
+    assert routes["social_media"].fallback_model == "f"
+    # A format's own fields win over the default's
+    assert routes["social_media"].model == FAST_MODEL
+
+
+def test_format_entry_layers_over_default():
+    routes = load_routes('{"default": {"timeout": 60}, "short_reflection": {"max_tokens": 300}, "article": {"model": "a"}}')
+    assert routes["short_reflection"] == ModelRoute(model=FAST_MODEL, max_tokens=300, timeout=30.0)
+    assert routes["article"] == ModelRoute(model="a", timeout=60)
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(ValueError):
+        load_routes('{"default": {"bogus": 1}}')
+
+
+def test_temperature_is_a_plain_request_parameter(fake_upstream):
+    route = ModelRoute(temperature=0.3, timeout=20.0)
+    request = build_message_request("Temperature", ContentFormat.SOCIAL_MEDIA, route=route)
+
+    assert request["temperature"] == 0.3
+    assert "extra_body" not in request
+    assert batch_params(request)["temperature"] == 0.3
+    assert "timeout" not in batch_params(request)
+    # The one place it is wrapped, for SDK releases without the keyword
+    assert sdk_params(request)["extra_body"] == {"temperature": 0.3}
+
+    result = run(generate_content_with_claude_async("Temperature", ContentFormat.SOCIAL_MEDIA, route=route))
+    assert result.content.startswith("word")
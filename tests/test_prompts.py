@@ -0,0 +1,21 @@
+import benovitz_content_generator as generator
+from benovitz_content_generator import BenovitzVoiceProfile, ContentFormat, compile_prompts
+
+
+def test_etag_changes_with_format_instructions(monkeypatch):
+    voice = BenovitzVoiceProfile()
+    before = compile_prompts(voice)
+    instructions = generator.get_format_instructions
+
+    def edited(format_type: ContentFormat) -> str:
+        return instructions(format_type) + "\n- Keep it under 100 words"
+
+    monkeypatch.setattr(generator, "get_format_instructions", edited)
+    after = compile_prompts(voice)
+
+    assert after.profile_hash == before.profile_hash
+    assert after.etag != before.etag
+
+
+def test_etag_changes_with_voice_profile():
+    assert compile_prompts(BenovitzVoiceProfile()).etag != compile_prompts(BenovitzVoiceProfile(name="Guest")).etag
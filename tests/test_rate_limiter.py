@@ -0,0 +1,170 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from benovitz_content_generator import ContentFormat, generate_content_with_claude_async
+from rate_limiter import (
+    BATCH,
+    INTERACTIVE,
+    UPSTREAM_RETRIES,
+    UpstreamOverloaded,
+    UpstreamScheduler,
+    set_scheduler,
+)
+from token_budget import estimate_tokens
+from tests.conftest import run
+
+
+def overloaded(retry_after: float):
+    """An exception shaped like the SDK's 429 error."""
+    return SimpleNamespace(status_code=429, response=SimpleNamespace(headers={"retry-after": str(retry_after)}))
+
+
+def test_refunded_tokens_wake_queued_calls():
+    async def main():
+        scheduler = UpstreamScheduler(output_tokens_per_minute=8000)
+        started = time.perf_counter()
+
+        async def call():
+            reservation = await scheduler.acquire(INTERACTIVE, 10, 2000)
+            dispatched = time.perf_counter() - started
+            await asyncio.sleep(0.1)
+            scheduler.complete(reservation, 10, 100)
+            return dispatched
+
+        return await asyncio.gather(*(call() for _ in range(6)))
+
+    dispatched = run(main())
+    # Four fit at once; the rest start as soon as the first calls settle
+    assert max(dispatched[:4]) < 0.05
+    assert max(dispatched) < 0.5
+
+
+def test_unconfigured_limits_never_wait():
+    async def main():
+        scheduler = UpstreamScheduler()
+        for _ in range(1000):
+            await scheduler.acquire(INTERACTIVE, 100000, 100000)
+
+    started = time.perf_counter()
+    run(main())
+    assert time.perf_counter() - started < 1
+
+
+def test_interactive_calls_dispatch_before_batch():
+    async def main():
+        scheduler = UpstreamScheduler(requests_per_minute=1200)
+        scheduler.requests.tokens = 0
+        order = []
+
+        async def call(priority, name):
+            await scheduler.acquire(priority, 1, 1)
+            order.append(name)
+
+        batch = [asyncio.create_task(call(BATCH, f"batch{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = [asyncio.create_task(call(INTERACTIVE, f"interactive{i}")) for i in range(2)]
+        await asyncio.gather(*batch, *interactive)
+        return order
+
+    assert run(main()) == ["interactive0", "interactive1", "batch0", "batch1", "batch2"]
+
+
+def test_interactive_calls_shed_when_queue_is_full():
+    async def main():
+        scheduler = UpstreamScheduler(requests_per_minute=60, max_queue=2)
+        scheduler.requests.tokens = 0
+        waiting = [asyncio.create_task(scheduler.acquire(INTERACTIVE, 1, 1)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert scheduler.saturated()
+        with pytest.raises(UpstreamOverloaded) as shed:
+            await scheduler.acquire(INTERACTIVE, 1, 1)
+        # Batch calls are never shed
+        batch = asyncio.create_task(scheduler.acquire(BATCH, 1, 1))
+        await asyncio.sleep(0)
+        assert not batch.done()
+        for task in waiting + [batch]:
+            task.cancel()
+        return shed.value
+
+    assert run(main()).retry_after >= 1
+
+
+def test_overload_pauses_dispatch_for_retry_after():
+    async def main():
+        scheduler = UpstreamScheduler(max_retries=3)
+        reservation = await scheduler.acquire(INTERACTIVE, 1, 1)
+        delay = scheduler.fail(reservation, overloaded(0.3), 0)
+        paused = time.perf_counter()
+        await scheduler.acquire(INTERACTIVE, 1, 1)
+        return delay, time.perf_counter() - paused, scheduler.rate_scale
+
+    delay, waited, rate_scale = run(main())
+    assert delay == pytest.approx(0.3)
+    assert waited >= 0.25
+    assert rate_scale == 0.5
+
+
+def test_rate_limited_calls_retry_after_the_upstream_hint(fake_upstream):
+    fake_upstream.config.rate_limit_first = 2
+    fake_upstream.config.retry_after = 0.2
+    retries = UPSTREAM_RETRIES.value(error="RateLimitError")
+    scheduler = UpstreamScheduler(max_retries=3)
+    set_scheduler(scheduler)
+
+    started = time.perf_counter()
+    result = run(generate_content_with_claude_async("Retries", ContentFormat.SOCIAL_MEDIA, cache="bypass"))
+
+    assert result.content.startswith("word")
+    assert time.perf_counter() - started >= 0.4
+    assert fake_upstream.stats()["calls"] == 3
+    assert UPSTREAM_RETRIES.value(error="RateLimitError") - retries == 2
+    # Halved by each 429, then recovering with the success
+    assert scheduler.rate_scale == pytest.approx(0.3)
+
+
+def test_persistent_rate_limits_surface_as_overloaded(fake_upstream):
+    fake_upstream.config.rate_limit_share = 1.0
+    fake_upstream.config.retry_after = 0.05
+    set_scheduler(UpstreamScheduler(max_retries=1))
+
+    with pytest.raises(UpstreamOverloaded):
+        run(generate_content_with_claude_async("Overloaded", ContentFormat.SOCIAL_MEDIA, cache="bypass"))
+    assert fake_upstream.stats()["calls"] == 2
+
+
+def test_stream_failing_mid_way_settles_its_reservation(fake_upstream):
+    fake_upstream.config.error_first = 1
+    fake_upstream.config.error_after = 5
+    scheduler = UpstreamScheduler(output_tokens_per_minute=100000, max_retries=3)
+    set_scheduler(scheduler)
+
+    with pytest.raises(Exception) as failure:
+        run(generate_content_with_claude_async("Fails mid-stream", ContentFormat.SOCIAL_MEDIA, cache="bypass"))
+
+    assert getattr(failure.value, "type", None) == "api_error"
+    # Text was already delivered, so the attempt is not retried...
+    assert fake_upstream.stats()["calls"] == 1
+    # ...and only the output it generated stays charged
+    assert scheduler.output_tokens.tokens == 100000 - estimate_tokens(" ".join(["word"] * 5))
+    assert scheduler.rate_scale == 1.0
+
+
+def test_overload_mid_stream_pauses_dispatch(fake_upstream):
+    fake_upstream.config.error_first = 1
+    fake_upstream.config.error_after = 5
+    fake_upstream.config.error_status = 529
+    scheduler = UpstreamScheduler(max_retries=3, base_delay=0.3)
+    set_scheduler(scheduler)
+
+    with pytest.raises(UpstreamOverloaded):
+        run(generate_content_with_claude_async("Overloaded mid-stream", ContentFormat.SOCIAL_MEDIA, cache="bypass"))
+    assert scheduler.rate_scale == 0.5
+
+    started = time.perf_counter()
+    result = run(generate_content_with_claude_async("After the overload", ContentFormat.SOCIAL_MEDIA, cache="bypass"))
+
+    assert result.content.startswith("word")
+    assert time.perf_counter() - started >= 0.2
@@ -0,0 +1,33 @@
+import token_budget
+from token_budget import COMPACTION_CACHE_MAX_CHARS, COMPACTION_CACHE_SIZE, CompactionPolicy, compact_context
+
+
+def notes(size: int, seed: str = "") -> str:
+    return " ".join(f"{seed}note{index}" for index in range(size // 8))
+
+
+def test_repeated_contexts_are_compacted_once():
+    text = notes(5000)
+    assert compact_context(text) is compact_context(text)
+
+
+def test_large_pastes_are_keyed_by_digest_and_only_kept_compacted():
+    text = notes(200000)
+    compaction = compact_context(text)
+
+    assert compaction is compact_context(text)
+    assert len(compaction.text) <= COMPACTION_CACHE_MAX_CHARS
+    assert all(text not in key for key in token_budget._compactions)
+
+
+def test_compactions_that_stay_large_are_not_kept():
+    text = notes(COMPACTION_CACHE_MAX_CHARS * 2)
+    policy = CompactionPolicy(max_tokens=None)
+
+    assert compact_context(text, policy) is not compact_context(text, policy)
+
+
+def test_memo_is_bounded():
+    for index in range(COMPACTION_CACHE_SIZE + 10):
+        compact_context(notes(100, seed=str(index)))
+    assert len(token_budget._compactions) == COMPACTION_CACHE_SIZE
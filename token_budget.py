@@ -0,0 +1,504 @@
+"""
+Offline token, cost and latency estimates for the Rabbi Moshe Benovitz Content
+Generator, plus additional-context compaction.
+
+estimate_tokens() approximates Claude's tokenizer without loading one: the
+text is mapped to character classes and a few substring counts give words,
+long-word pieces, digit groups, punctuation, non-Latin letters (Hebrew) and
+line breaks. It is only an approximation, so a UsageModel fed with the usage
+the API reports rescales input estimates and learns output lengths and
+speeds per format and model.
+
+compact_context() shrinks pasted notes before they are sent: whitespace is
+collapsed, repeated paragraphs and long lines are dropped, and what remains is
+cut to a token budget at a paragraph or sentence boundary. Results are memoized
+under a digest of the context, so estimating on every keystroke only pays for
+the context once; the pasted text itself is never kept, and only compactions
+that came out small are.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+CONTEXT_COMPACTED = metrics.register(metrics.Counter(
+    "benovitz_context_compacted_total",
+    "Generation requests whose additional context was shortened, by step",
+    ["step"]
+))
+CONTEXT_TOKENS_SAVED = metrics.register(metrics.Counter(
+    "benovitz_context_tokens_saved_total",
+    "Estimated input tokens removed from additional context before generation"
+))
+
+# Token estimation
+
+# Every ASCII character mapped to its class, so runs can be counted with str.count:
+# "a" letter, "0" digit, "." punctuation or symbol, " " blank, "\n" line break
+_CHARACTER_CLASSES = str.maketrans({
+    chr(code): "a" if chr(code).isalpha() else "0" if chr(code).isdigit() else "\n" if code == 10
+    else " " if chr(code).isspace() else "."
+    for code in range(128)
+})
+_OTHER_LETTER = re.compile(r"[^\W\d_A-Za-z]")
+
+# Tokens per character of non-Latin letters, mostly Hebrew
+OTHER_LETTER_TOKENS = 0.6
+# Punctuation often merges with a neighbour ("**", ".\n")
+SYMBOL_TOKENS = 0.7
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate Claude token count of `text`.
+
+    Each run of ASCII letters is a token, plus about one more for every four
+    letters past the fourth; digits group in threes; punctuation, Hebrew
+    letters and line-break runs are counted by rate. Costs a translate and a
+    few substring counts, about 15 ms per megabyte.
+    """
+
+    if not text:
+        return 0
+    classes = text.translate(_CHARACTER_CLASSES)
+    words = (
+        classes.count(" a") + classes.count(".a") + classes.count("0a") + classes.count("\na")
+        + (classes[0] == "a")
+    )
+    # Non-overlapping counts: floor(L/8) + floor(L/12) tracks (L-4)/4 for L >= 8
+    long_word_pieces = classes.count("a" * 8) + classes.count("a" * 12)
+    tokens = (
+        words
+        + long_word_pieces
+        + classes.count("0") / 3
+        + classes.count(".") * SYMBOL_TOKENS
+        + classes.count("\n") - classes.count("\n\n")
+    )
+    if not text.isascii():
+        tokens += len(_OTHER_LETTER.findall(text)) * OTHER_LETTER_TOKENS
+    return int(tokens + 0.999)
+
+
+# Context compaction
+
+TRUNCATION_MARKER = "\n\n[... additional context truncated ...]"
+
+# Upper bound on characters per estimated token once blanks are collapsed
+# (seven-letter words and a space come to eight)
+MAX_CHARS_PER_TOKEN = 10
+
+# Shorter lines ("Notes:", "- teens") repeat legitimately and are never deduped
+MIN_DEDUPE_LINE_CHARS = 40
+
+_SPACES = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES = re.compile(r"\s*\n\s*\n\s*")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?\s")
+
+
+@dataclass(frozen=True)
+class CompactionPolicy:
+    """What compact_context() may do to additional context."""
+
+    collapse_whitespace: bool = True
+    dedupe: bool = True
+    # Token budget for the context; None leaves its length alone
+    max_tokens: Optional[int] = 4000
+
+
+@dataclass(frozen=True)
+class Compaction:
+    """Compacted context and what it cost to get there."""
+
+    text: str
+    original_tokens: int
+    tokens: int
+    duplicates_removed: int = 0
+    truncated: bool = False
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in asdict(self).items() if key != "text"}
+
+
+def _collapse_whitespace(text: str) -> str:
+    lines = (line.strip() for line in _SPACES.sub(" ", text).split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _dedupe(text: str):
+    """Drop repeated paragraphs and long lines, keeping first occurrences."""
+
+    seen_paragraphs = set()
+    seen_lines = set()
+    removed = 0
+    paragraphs = []
+    for paragraph in text.split("\n\n"):
+        key = " ".join(paragraph.split()).casefold()
+        if key in seen_paragraphs:
+            removed += 1
+            continue
+        seen_paragraphs.add(key)
+
+        lines = []
+        for line in paragraph.split("\n"):
+            if len(line) >= MIN_DEDUPE_LINE_CHARS:
+                line_key = " ".join(line.split()).casefold()
+                if line_key in seen_lines:
+                    removed += 1
+                    continue
+                seen_lines.add(line_key)
+            lines.append(line)
+        if lines:
+            paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs), removed
+
+
+def _truncate(text: str, tokens: int, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens` at the last paragraph or sentence break that fits."""
+
+    budget = max(0, max_tokens - estimate_tokens(TRUNCATION_MARKER))
+    cut = int(len(text) * budget / tokens)
+    while cut > 0:
+        head = text[:cut]
+        # Prefer a paragraph break, then a sentence end, in the last 30% of the cut
+        boundary = head.rfind("\n\n")
+        if boundary < cut * 0.7:
+            ends = [match.end() for match in _SENTENCE_END.finditer(head, int(cut * 0.7))]
+            boundary = ends[-1] if ends else cut
+        head = head[:boundary].rstrip()
+        if estimate_tokens(head) <= budget:
+            return head + TRUNCATION_MARKER if head else TRUNCATION_MARKER.strip()
+        cut = int(cut * 0.9)
+    return TRUNCATION_MARKER.strip()
+
+
+# Memoized compactions, keyed by (digest of the context, policy). Only those
+# whose compacted text fits COMPACTION_CACHE_MAX_CHARS are kept, and contexts
+# over COMPACTION_CACHE_MAX_INPUT_CHARS are not even hashed
+COMPACTION_CACHE_SIZE = 256
+COMPACTION_CACHE_MAX_CHARS = 32768
+COMPACTION_CACHE_MAX_INPUT_CHARS = 1_000_000
+_compactions: "OrderedDict[Tuple[bytes, CompactionPolicy], Compaction]" = OrderedDict()
+_compactions_lock = threading.Lock()
+
+
+def compact_context(text: str, policy: CompactionPolicy = CompactionPolicy()) -> Compaction:
+    """
+    Compact additional context according to `policy`. Pure and memoized;
+    callers that send the result upstream should also call record_compaction().
+    """
+
+    if len(text) > COMPACTION_CACHE_MAX_INPUT_CHARS:
+        return _compact(text, policy)
+
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), policy)
+    with _compactions_lock:
+        compaction = _compactions.get(key)
+        if compaction is not None:
+            _compactions.move_to_end(key)
+            return compaction
+    compaction = _compact(text, policy)
+    if len(compaction.text) > COMPACTION_CACHE_MAX_CHARS:
+        return compaction
+    with _compactions_lock:
+        _compactions[key] = compaction
+        while len(_compactions) > COMPACTION_CACHE_SIZE:
+            _compactions.popitem(last=False)
+    return compaction
+
+
+def _compact(text: str, policy: CompactionPolicy) -> Compaction:
+    original_tokens = estimate_tokens(text)
+    if policy.collapse_whitespace:
+        text = _collapse_whitespace(text)
+    removed = 0
+    if policy.dedupe and text:
+        text, removed = _dedupe(text)
+
+    if policy.max_tokens is not None and len(text) > policy.max_tokens * MAX_CHARS_PER_TOKEN:
+        # Everything past this point would be cut anyway
+        text = text[:policy.max_tokens * MAX_CHARS_PER_TOKEN]
+    tokens = estimate_tokens(text)
+    truncated = policy.max_tokens is not None and tokens > policy.max_tokens
+    if truncated:
+        text = _truncate(text, tokens, policy.max_tokens)
+        tokens = estimate_tokens(text)
+    return Compaction(text, original_tokens, tokens, removed, truncated)
+
+
+def record_compaction(compaction: Compaction) -> None:
+    """Count a compaction that is about to be sent upstream."""
+
+    if compaction.duplicates_removed:
+        CONTEXT_COMPACTED.inc(step="dedupe")
+    if compaction.truncated:
+        CONTEXT_COMPACTED.inc(step="truncate")
+    if compaction.tokens < compaction.original_tokens:
+        CONTEXT_TOKENS_SAVED.inc(compaction.original_tokens - compaction.tokens)
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def create_policy_from_env() -> Optional[CompactionPolicy]:
+    """
+    Build the compaction policy described by the environment:
+    BENOVITZ_CONTEXT_COMPACTION ("off" sends context untouched),
+    BENOVITZ_CONTEXT_MAX_TOKENS (default 4000; 0 disables truncation) and
+    BENOVITZ_CONTEXT_DEDUPE (default on).
+    """
+
+    if os.environ.get("BENOVITZ_CONTEXT_COMPACTION", "on").lower() in ("off", "0", "false"):
+        return None
+    max_tokens = int(os.environ.get("BENOVITZ_CONTEXT_MAX_TOKENS", "4000"))
+    return CompactionPolicy(
+        dedupe=os.environ.get("BENOVITZ_CONTEXT_DEDUPE", "on").lower() not in ("off", "0", "false"),
+        max_tokens=max_tokens if max_tokens > 0 else None
+    )
+
+
+def get_compaction_policy() -> Optional[CompactionPolicy]:
+    """Return the process-wide compaction policy, or None if compaction is off."""
+
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = create_policy_from_env() or False
+    return _policy or None
+
+
+def set_compaction_policy(policy: Optional[CompactionPolicy]) -> None:
+    """Replace the process-wide compaction policy (None turns compaction off)."""
+
+    global _policy
+    with _policy_lock:
+        _policy = policy if policy is not None else False
+
+
+# Prices and performance
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """USD per million tokens."""
+
+    input: float
+    output: float
+    cache_write: float
+    cache_read: float
+
+
+# Keyed by model-name prefix; the longest matching prefix wins
+DEFAULT_PRICES: Dict[str, ModelPrice] = {
+    "claude-opus-4": ModelPrice(15.0, 75.0, 18.75, 1.50),
+    "claude-sonnet-4": ModelPrice(3.0, 15.0, 3.75, 0.30),
+    "claude-3-7-sonnet": ModelPrice(3.0, 15.0, 3.75, 0.30),
+    "claude-3-5-sonnet": ModelPrice(3.0, 15.0, 3.75, 0.30),
+    "claude-haiku-4": ModelPrice(1.0, 5.0, 1.25, 0.10),
+    "claude-3-5-haiku": ModelPrice(0.80, 4.0, 1.0, 0.08),
+    "claude-3-haiku": ModelPrice(0.25, 1.25, 0.30, 0.03),
+}
+
+# Shortest prefix, in tokens, the prompt cache will store
+MIN_CACHEABLE_TOKENS = {
+    "claude-haiku-4": 4096,
+    "claude-3-5-haiku": 2048,
+    "claude-3-haiku": 2048,
+}
+FALLBACK_MIN_CACHEABLE_TOKENS = 1024
+
+# (time to first token in seconds for a short request, output tokens per second)
+DEFAULT_SPEEDS = {
+    "claude-opus-4": (1.5, 40.0),
+    "claude-sonnet-4": (1.0, 60.0),
+    "claude-3-7-sonnet": (1.0, 60.0),
+    "claude-3-5-sonnet": (0.9, 70.0),
+    "claude-haiku-4": (0.5, 150.0),
+    "claude-3-5-haiku": (0.6, 120.0),
+    "claude-3-haiku": (0.4, 150.0),
+}
+FALLBACK_SPEED = (1.0, 60.0)
+
+# Uncached input tokens processed per second before the first output token
+PREFILL_TOKENS_PER_SECOND = 10000.0
+
+# Typical output tokens per ContentFormat value, from the format instructions'
+# target lengths; capped at the route's max_tokens when estimating
+DEFAULT_OUTPUT_TOKENS = {
+    "article": 1500,
+    "social_media": 180,
+    "shiur_outline": 900,
+    "short_reflection": 200,
+    "advisor_training": 1000,
+}
+FALLBACK_OUTPUT_TOKENS = 1000
+
+
+def _by_prefix(table: dict, model: str):
+    matches = [prefix for prefix in table if model.startswith(prefix)]
+    return table[max(matches, key=len)] if matches else None
+
+
+def load_prices(config: Optional[str] = None) -> Dict[str, ModelPrice]:
+    """
+    DEFAULT_PRICES plus BENOVITZ_MODEL_PRICES, inline JSON mapping model-name
+    prefixes to {"input", "output", "cache_write", "cache_read"} USD per
+    million tokens. Raises ValueError for malformed config.
+    """
+
+    config = os.environ.get("BENOVITZ_MODEL_PRICES", "") if config is None else config
+    prices = dict(DEFAULT_PRICES)
+    if not config.strip():
+        return prices
+    try:
+        for prefix, values in json.loads(config).items():
+            prices[prefix] = ModelPrice(**values)
+    except (AttributeError, TypeError, json.JSONDecodeError) as exc:
+        raise ValueError(f"Invalid BENOVITZ_MODEL_PRICES: {exc}") from exc
+    return prices
+
+
+class UsageModel:
+    """
+    Running averages of what generations actually used, per format and
+    model, that turn offline token counts into output, cost and latency
+    estimates. Starts from DEFAULT_OUTPUT_TOKENS and DEFAULT_SPEEDS.
+    """
+
+    def __init__(self, prices: Optional[Dict[str, ModelPrice]] = None, alpha: float = 0.1):
+        self.prices = load_prices() if prices is None else prices
+        self.alpha = alpha
+        # Actual input tokens over estimate_tokens() counts
+        self.input_scale = 1.0
+        self._output_tokens: Dict[str, float] = {}
+        self._ttft: Dict[str, float] = {}
+        self._tokens_per_second: Dict[str, float] = {}
+        self._observed = 0
+        self._lock = threading.Lock()
+
+    def _average(self, table: dict, key: str, value: float, default: float) -> None:
+        table[key] = table.get(key, default) * (1 - self.alpha) + value * self.alpha
+
+    def speed(self, model: str):
+        ttft, tokens_per_second = _by_prefix(DEFAULT_SPEEDS, model) or FALLBACK_SPEED
+        return self._ttft.get(model, ttft), self._tokens_per_second.get(model, tokens_per_second)
+
+    def output_tokens(self, format_value: str, max_tokens: int) -> int:
+        """Expected output tokens for a generation of this format."""
+        return min(
+            max_tokens,
+            round(self._output_tokens.get(format_value, DEFAULT_OUTPUT_TOKENS.get(format_value, FALLBACK_OUTPUT_TOKENS)))
+        )
+
+    def observe(self, model: str, format_value: str, estimated_input: int, result) -> None:
+        """Fold a fresh GenerationResult's reported usage and timings into the averages."""
+
+        actual_input = result.input_tokens + result.cache_creation_input_tokens + result.cache_read_input_tokens
+        if not actual_input or not result.output_tokens:
+            return
+
+        ttft, tokens_per_second = self.speed(model)
+        with self._lock:
+            self._observed += 1
+            if estimated_input:
+                self.input_scale = self.input_scale * (1 - self.alpha) + actual_input / estimated_input * self.alpha
+            self._average(
+                self._output_tokens, format_value, result.output_tokens,
+                DEFAULT_OUTPUT_TOKENS.get(format_value, FALLBACK_OUTPUT_TOKENS)
+            )
+            if result.ttft_ms is not None:
+                # Time to first token, less the prefill of the uncached part
+                base = result.ttft_ms / 1000 - result.input_tokens / PREFILL_TOKENS_PER_SECOND
+                self._average(self._ttft, model, max(0.0, base), ttft)
+                decode_seconds = (result.model_ms - result.ttft_ms) / 1000
+                if decode_seconds > 0.05 and result.output_tokens > 1:
+                    self._average(self._tokens_per_second, model, result.output_tokens / decode_seconds, tokens_per_second)
+
+    def estimate(
+        self,
+        model: str,
+        format_value: str,
+        max_tokens: int,
+        prefix_tokens: int,
+        request_tokens: int
+    ) -> dict:
+        """
+        Input, output, cost and latency for one request whose cacheable prefix
+        and per-request part estimate to `prefix_tokens` and `request_tokens`.
+        `cost_usd` assumes the prefix is read from the prompt cache;
+        `cold_cost_usd` assumes it is written there first. Prefixes shorter
+        than the model's cache minimum are billed as ordinary input.
+        """
+
+        prefix = round(prefix_tokens * self.input_scale)
+        uncached = round(request_tokens * self.input_scale)
+        if prefix < (_by_prefix(MIN_CACHEABLE_TOKENS, model) or FALLBACK_MIN_CACHEABLE_TOKENS):
+            prefix, uncached = 0, prefix + uncached
+        output = self.output_tokens(format_value, max_tokens)
+        ttft, tokens_per_second = self.speed(model)
+        ttft += uncached / PREFILL_TOKENS_PER_SECOND
+
+        estimate = {
+            "model": model,
+            "input_tokens": prefix + uncached,
+            "cached_prefix_tokens": prefix,
+            "uncached_input_tokens": uncached,
+            "output_tokens": output,
+            "max_tokens": max_tokens,
+            "cost_usd": None,
+            "cold_cost_usd": None,
+            "max_cost_usd": None,
+            "ttft_ms": round(ttft * 1000),
+            "latency_ms": round((ttft + output / tokens_per_second) * 1000),
+        }
+
+        price = _by_prefix(self.prices, model)
+        if price is not None:
+            fresh = uncached * price.input + output * price.output
+            estimate["cost_usd"] = round((fresh + prefix * price.cache_read) / 1e6, 6)
+            estimate["cold_cost_usd"] = round((fresh + prefix * price.cache_write) / 1e6, 6)
+            estimate["max_cost_usd"] = round(
+                (uncached * price.input + max_tokens * price.output + prefix * price.cache_write) / 1e6, 6
+            )
+        return estimate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "observed": self._observed,
+                "input_scale": round(self.input_scale, 4),
+                "output_tokens": {key: round(value) for key, value in self._output_tokens.items()},
+                "ttft_ms": {key: round(value * 1000) for key, value in self._ttft.items()},
+                "tokens_per_second": {key: round(value, 1) for key, value in self._tokens_per_second.items()},
+            }
+
+
+_usage_model = None
+_usage_model_lock = threading.Lock()
+
+
+def get_usage_model() -> UsageModel:
+    """Return the process-wide usage model, creating it on first use."""
+
+    global _usage_model
+    if _usage_model is None:
+        with _usage_model_lock:
+            if _usage_model is None:
+                _usage_model = UsageModel()
+    return _usage_model
+
+
+def set_usage_model(model: UsageModel) -> None:
+    """Replace the process-wide usage model."""
+
+    global _usage_model
+    with _usage_model_lock:
+        _usage_model = model